@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Compare parsing an API date-time string with
+:func:`lib7shifts.dates.to_datetime` and reading an object's date property,
+which is parsed once and then kept (see
+:meth:`lib7shifts.base.APIObject._parse_date`), with parsing it with
+strptime every time, as was done before.
+
+usage: python benchmarks/date_parse.py [<number>]
+"""
+import sys
+import timeit
+import datetime
+from lib7shifts import dates, TimePunch
+
+VALUE = '2022-07-03 09:03:00'
+
+
+def strptime():
+    return dates.DateTime7Shifts.strptime(
+        VALUE, dates.DEFAULT_DATETIME_FORMAT).replace(
+            tzinfo=datetime.timezone.utc)
+
+
+def main(number=20000):
+    punch = TimePunch(clocked_in=VALUE)
+    candidates = [
+        ('strptime', strptime),
+        ('to_datetime', lambda: dates.to_datetime(VALUE)),
+        ('property', lambda: punch.clocked_in),
+    ]
+    base_time = None
+    for name, func in candidates:
+        best = min(timeit.repeat(func, number=number, repeat=5)) / number
+        if base_time is None:
+            base_time = best
+        print("{:12s} {:8.2f} us  {:5.2f}x".format(
+            name, best * 1e6, base_time / best))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare the JSON decoders in :mod:`lib7shifts.decoders` on synthetic pages
+shaped like real 7shifts responses. The `baseline` row is the decoding path
+the client used before decoders became pluggable (bytes -> str -> json.loads).
+
+usage: python benchmarks/json_decode.py [<repeat>]
+"""
+import sys
+import json
+import timeit
+import random
+from lib7shifts import decoders
+
+
+def receipts_page(rows=100, lines=12):
+    "A page of receipts from the List Receipts endpoint"
+    rnd = random.Random(1)
+    data = []
+    for row in range(rows):
+        data.append({
+            "id": "2811d1f2-de7b-4ed5-9b4b-{:012d}".format(row),
+            "company_id": 165819, "location_id": 210363, "pos_id": 4,
+            "receipt_id": "8ae8f784-4d61-420f-bc6c-{:012d}".format(row),
+            "receipt_date": "2022-12-31T21:00:43+00:00",
+            "net_total": rnd.randint(100, 50000),
+            "gross_total": rnd.randint(100, 50000), "tips": 0,
+            "total_receipt_discounts": 0, "total_item_discounts": 0,
+            "external_user_id": None, "revenue_center": None,
+            "receipt_lines": [{
+                "id": "line-{}-{}".format(row, line),
+                "name": "Menu item number {}".format(line),
+                "quantity": rnd.randint(1, 4),
+                "price": rnd.randint(100, 3000),
+                "category": "Food", "discounts": []
+            } for line in range(lines)],
+            "tip_details": [], "status": "closed",
+            "created_date": "2022-12-31T22:24:19+00:00",
+            "modified_date": "2023-01-01T00:25:28+00:00"})
+    return {"data": data, "meta": {"cursor": {"next": "abc", "prev": None}}}
+
+
+def punches_page(rows=500):
+    "A page of punches from the List Time Punches endpoint"
+    data = [{
+        "id": row, "shift_id": row + 7, "user_id": row % 90,
+        "role_id": 4320, "location_id": 9876, "department_id": 7890,
+        "hourly_wage": 1525, "approved": True,
+        "clocked_in": "2022-07-03 09:03:00",
+        "clocked_out": "2022-07-03 15:06:00",
+        "breaks": [{"id": row, "in": "2022-07-03 12:00:00",
+                    "out": "2022-07-03 12:30:00", "paid": False}],
+        "created": "2022-07-03 09:03:00", "modified": "2022-07-03 15:06:00",
+        "deleted": False} for row in range(rows)]
+    return {"data": data, "meta": {"cursor": {"next": "abc", "prev": None}}}
+
+
+def hours_wages_report(users=200, weeks=4, shifts=5):
+    "An hours and wages report, see :mod:`lib7shifts.hours_wages`"
+    total = {key: 6.05 for key in (
+        "regular_hours", "regular_pay", "overtime_hours", "overtime_pay",
+        "holiday_hours", "holiday_pay", "total_hours", "total_pay",
+        "total_tips", "cash_tips", "earned_tips", "declared_tips")}
+    return {"users": [{
+        "user": {"id": user, "employee_id": "", "first_name": "First",
+                 "last_name": "Last"},
+        "weeks": [{
+            "week": "2022-07-03", "salaried": False,
+            "shifts": [{
+                "user_id": user, "date": "2022-07-03 09:03:00",
+                "label": "9:03AM - 3:06PM", "breaks": [],
+                "location_id": 9876, "role_id": 4320, "wage": 2.13,
+                "total": total} for _ in range(shifts)],
+            "total": total} for _ in range(weeks)],
+        "total": total, "salaried": False} for user in range(users)],
+        "total": total, "start": "2022-07-03", "end": "2022-07-30"}
+
+
+def main(repeat=20):
+    def baseline(data):
+        return json.loads(data.decode('utf8'))
+    candidates = [('baseline', baseline)]
+    for name in decoders.available():
+        candidates.append((name, decoders.get_decoder(name)))
+    pages = [('receipts', receipts_page()), ('punches', punches_page()),
+             ('hours_wages', hours_wages_report())]
+    for page_name, page in pages:
+        body = json.dumps(page).encode('utf8')
+        print("{} page: {:,} bytes".format(page_name, len(body)))
+        base_time = None
+        for name, decode in candidates:
+            assert decode(body) == page
+            best = min(timeit.repeat(
+                lambda: decode(body), number=repeat, repeat=5)) / repeat
+            if base_time is None:
+                base_time = best
+            print("  {:10s} {:8.2f} ms  {:5.2f}x".format(
+                name, best * 1000, base_time / best))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
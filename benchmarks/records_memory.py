@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Compare the memory held by time punches loaded as :class:`lib7shifts.TimePunch`
+(dictionary) objects with the same punches loaded as compact
+:class:`lib7shifts.TimePunchRecord` objects, see :mod:`lib7shifts.records`.
+Rows are decoded from JSON pages, as the client does, so that no strings are
+shared between rows.
+
+usage: python benchmarks/records_memory.py [<rows>]
+"""
+import sys
+import json
+import time
+import tracemalloc
+import lib7shifts
+from json_decode import punches_page
+
+PAGE_ROWS = 1000
+
+
+def load(make, rows, body):
+    "Load `rows` punches with `make`, returning them with the time taken"
+    loaded = []
+    started = time.perf_counter()
+    for _ in range(rows // PAGE_ROWS):
+        loaded.extend(make(item) for item in json.loads(body)['data'])
+    return loaded, time.perf_counter() - started
+
+
+def main(rows=1000000):
+    body = json.dumps(punches_page(PAGE_ROWS))
+    candidates = [
+        ('TimePunch', lambda item: lib7shifts.TimePunch(**item)),
+        ('TimePunchRecord', lib7shifts.TimePunchRecord.from_dict),
+    ]
+    print("{:,} punches".format(rows))
+    base_size = None
+    for name, make in candidates:
+        # tracing slows loading down, so time it separately
+        seconds = load(make, rows, body)[1]
+        tracemalloc.start()
+        loaded = load(make, rows, body)[0]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+        if base_size is None:
+            base_size = size
+        print("  {:16s} {:8,.0f} MB  {:5.0f} bytes/row  {:5.2f}x  "
+              "{:5.1f}s to load".format(
+                  name, size / 1e6, size / rows, base_size / size, seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
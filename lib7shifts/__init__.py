@@ -13,9 +13,12 @@ Note that this code currently only supports access tokens rather than OAUTH.
 
 """
 import os
+import time
 import logging
 import datetime
 import json
+import threading
+import concurrent.futures
 import certifi
 import urllib3
 try:
@@ -23,9 +26,10 @@ try:
 except ImportError:
     from urllib.parse import urlencode
 from .time_punches import (get_punch, list_punches, TimePunch,
-                           TimePunchBreak, TimePunchBreakList)
+                           TimePunchBreak, TimePunchBreakList,
+                           TimePunchRecord, TimePunchBreakRecord)
 from .locations import (get_location, list_locations, Location)
-from .shifts import (get_shift, list_shifts, Shift)
+from .shifts import (get_shift, list_shifts, Shift, ShiftRecord)
 from .companies import (get_company, list_companies, Company)
 from .users import (get_user, list_users, User)
 from .wages import (list_user_wages, Wage, WageList)
@@ -36,24 +40,49 @@ from .departments import (get_department, list_departments,
 from .events import (create_event, get_event, update_event, delete_event,
                      list_events, Event)
 from .receipts import (get_receipt, create_receipt, update_receipt,
-                       list_receipts, Receipt)
-from .hours_wages import get_hours_and_wages_report
+                       upsert_receipt, bulk_upsert_receipts, list_receipts,
+                       Receipt, ReceiptRecord)
+from .hours_wages import (get_hours_and_wages_report,
+                          iter_hours_and_wages_users,
+                          iter_hours_and_wages_shifts)
 from .daily_sales_labor import get_daily_sales_and_labor
 from .whoami import get_whoami
 from . import dates
 from . import exceptions
+from . import ratelimit
+from . import retry
+from . import pagesize
+from . import decoders
+from . import cache
+from . import concurrency
+from . import instrumentation
+from . import transport
+from . import circuitbreaker
+from . import hedging
+from . import manager
+from . import scheduler
+from . import records
+from . import timezones
 
 #: Specify the name of the environment variable where this code expects to
 #: find the 7shifts API key, if not provided by the user directly.
 ACCESS_TOKEN_ENVVAR = 'ACCESS_TOKEN_7SHIFTS'
 
+#: Specify the name of the environment variable that may hold a different
+#: base URL for the API, such as that of a :mod:`mockserver`.
+BASE_URL_ENVVAR = 'API_URL_7SHIFTS'
+
 
 def get_client(access_token=None, **kwargs):
     """Returns an :class:`APIClient7Shifts` object.
     If no access_token is provided, local environment variable
-    defined in :attr:`ACCESS_TOKEN_ENVVAR` above will be used (if present)"""
+    defined in :attr:`ACCESS_TOKEN_ENVVAR` above will be used (if present).
+    Likewise, the environment variable defined in :attr:`BASE_URL_ENVVAR`
+    is used as the `base_url` if present and none was given."""
     if access_token is None:
         access_token = get_access_token_from_env()
+    if os.environ.get(BASE_URL_ENVVAR):
+        kwargs.setdefault('base_url', os.environ[BASE_URL_ENVVAR])
     return APIClient7Shifts(access_token=access_token, **kwargs)
 
 
@@ -74,7 +103,8 @@ class APIClient7Shifts(object):
     7shifts API v2 client.
 
     Natively uses urllib3 connection pooling and includes support for rate
-    limiting with a RateLimiter from the `apiclient` module. This code was
+    limiting, either with a built-in :class:`ratelimit.TokenBucket` or a
+    RateLimiter from the `apiclient` module. This code was
     originally based on the `apiclient` library, but has diverged substantially
     enough to be something all its own. Still, thanks to Andrey Petrov for the
     original design and inspiration.
@@ -85,18 +115,132 @@ class APIClient7Shifts(object):
     KEEP_ALIVE = True
     USER_AGENT = 'py-lib7shifts'
     API_VERSION = '2022-10-01'
+    #: Default number of connections kept open to the API, for reuse by
+    #: concurrent threads
+    POOL_MAXSIZE = 10
 
     def __init__(self, **kwargs):
         """
         Supported kwargs:
 
         - access_token: the api key to use for requests (required)
-        - rate_limit_lock - from apiclient.ratelimiter module
+        - base_url - the URL of the API, including the version, if not
+          :attr:`BASE_URL` (eg. that of a :class:`mockserver.MockServer`)
+        - rate_limit_lock - any object with an `acquire` method, such as a
+          :class:`ratelimit.TokenBucket` or an apiclient.ratelimiter object.
+          If it also has an `update_from_headers` method, that is called with
+          the headers of every response.
+        - rate_limit - a number of requests per second; creates a
+          :class:`ratelimit.TokenBucket` for this client (ignored if
+          `rate_limit_lock` is provided)
+        - retry - a :class:`retry.RetryPolicy` describing how failed requests
+          are retried, or an integer number of retries to allow with the
+          default policy. By default, requests are not retried.
+        - page_sizer - a :class:`pagesize.PageSizer` used to adapt the page
+          size of list calls to each endpoint, or True to create one. By
+          default, each list function uses a fixed page size.
+        - json_decoder - the name of a decoder from :mod:`decoders`, or a
+          function that decodes JSON from bytes. Defaults to the fastest
+          decoder installed.
+        - cache - a :class:`cache.ResponseCache` (such as a
+          :class:`cache.MemoryCache` or :class:`cache.SQLiteCache`) used to
+          cache and revalidate GET responses for reference data. By default,
+          nothing is cached.
+        - coalesce - whether identical GET requests made at the same time by
+          several threads should share one HTTP request (default True), or
+          a :class:`concurrency.SingleFlight` to share between clients. Each
+          waiting thread gets its own copy of the decoded result, and
+          requests are only shared between clients with the same access
+          token and base URL.
+        - hooks - a list of hook objects, such as a
+          :class:`instrumentation.MetricsCollector`, whose `before_request`
+          and `after_request` methods are called with an
+          :class:`instrumentation.RequestEvent` around every HTTP request.
+        - transport - a :class:`transport.RecordingTransport` to record
+          requests and responses to a cassette file, or a
+          :class:`transport.ReplayTransport` to answer requests from one
+          rather than from the API.
+        - circuit_breaker - a :class:`circuitbreaker.CircuitBreaker`, or True
+          to create one, to fail fast on endpoints that keep failing. By
+          default, every request is attempted.
+        - pool_maxsize - the number of connections to the API kept open for
+          reuse (default :attr:`POOL_MAXSIZE`). Size it to the number of
+          threads sharing the client, so that none has to open a new
+          connection for each request.
+        - pool_block - if True, a thread that finds all `pool_maxsize`
+          connections in use waits for one to be free rather than opening an
+          extra connection that is closed after use (default False)
+        - pool_manager - an object whose `connection_from_url` method returns
+          a pool to share with other clients, given the URL and the headers
+          (including authorization) to send with each request, such as a
+          :class:`manager.ClientManager`. `pool_maxsize` and `pool_block`
+          are then up to it.
+        - timeout - seconds to wait for a connection and for each read, or a
+          :class:`urllib3.Timeout`. By default, there is no timeout.
+        - hedge - a :class:`hedging.HedgePolicy`, or True to create one, to
+          send a duplicate of any GET request that is much slower than
+          usual and use whichever response arrives first. By default,
+          requests are never hedged.
+        - concurrency_limiter - a :class:`concurrency.AIMDLimiter`, or True to
+          create one, to limit the number of requests in flight at once to
+          what the API is coping with. By default, there is no limit.
+
+        The client may be shared by any number of threads, and is safe to use
+        in a child process after ``fork()``, such as with multiprocessing: the
+        connection pool, which must not be shared with the parent, is replaced
+        the first time the child makes a request.
         """
         self.log = logging.getLogger(self.__class__.__name__)
         self.access_token = kwargs.pop('access_token')
+        self.BASE_URL = kwargs.pop('base_url', self.BASE_URL)
         self.rate_limit_lock = kwargs.pop('rate_limit_lock', None)
+        rate_limit = kwargs.pop('rate_limit', None)
+        if self.rate_limit_lock is None and rate_limit:
+            self.rate_limit_lock = ratelimit.TokenBucket(rate=rate_limit)
+        self.retry = kwargs.pop('retry', None)
+        if isinstance(self.retry, int):
+            self.retry = retry.RetryPolicy(total=self.retry)
+        self.page_sizer = kwargs.pop('page_sizer', None)
+        if self.page_sizer is True:
+            self.page_sizer = pagesize.PageSizer()
+        self.json_decoder = kwargs.pop('json_decoder', None)
+        if self.json_decoder is None or isinstance(self.json_decoder, str):
+            self.json_decoder = decoders.get_decoder(
+                self.json_decoder, encoding=self.ENCODING)
+        self.cache = kwargs.pop('cache', None)
+        self.single_flight = kwargs.pop('coalesce', True)
+        if self.single_flight is True:
+            self.single_flight = concurrency.SingleFlight()
+        elif not self.single_flight:
+            self.single_flight = None
+        self.hooks = list(kwargs.pop('hooks', ()))
+        self.transport = kwargs.pop('transport', None)
+        self.circuit_breaker = kwargs.pop('circuit_breaker', None)
+        if self.circuit_breaker is True:
+            self.circuit_breaker = circuitbreaker.CircuitBreaker()
+        self.pool_maxsize = kwargs.pop('pool_maxsize', self.POOL_MAXSIZE)
+        self.pool_block = kwargs.pop('pool_block', False)
+        self.pool_manager = kwargs.pop('pool_manager', None)
+        self.timeout = kwargs.pop('timeout', None)
+        self.hedge = kwargs.pop('hedge', None)
+        if self.hedge is True:
+            self.hedge = hedging.HedgePolicy()
+        self.__hedge_executor = None
+        self.concurrency_limiter = kwargs.pop('concurrency_limiter', None)
+        if self.concurrency_limiter is True:
+            self.concurrency_limiter = concurrency.AIMDLimiter()
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
         self.__connection_pool = None
+        #: The process that the lock, pools and threads above belong to
+        self.__pid = os.getpid()
+
+    def add_hook(self, hook):
+        """Add an instrumentation hook (see :mod:`instrumentation`) to be
+        called around every request"""
+        # replace rather than append, so that threads iterating over the
+        # hooks of a request in progress aren't affected
+        self.hooks = self.hooks + [hook]
 
     def get_endpoint(self, endpoint, **urlopen_kw):
         """Directly make a GET call against `endpoint` with the defined
@@ -104,6 +248,25 @@ class APIClient7Shifts(object):
         return self._request(
             'GET', endpoint, **urlopen_kw)
 
+    def stream_endpoint(self, endpoint, chunk_size=2 ** 16, **urlopen_kw):
+        """Make a GET call against `endpoint` like :meth:`get_endpoint`, but
+        rather than decoding the response, yield its body as chunks of bytes
+        while it is being received. Errors are raised just as with other
+        requests, before the first chunk is yielded."""
+        response = self._request('GET', endpoint, stream=True, **urlopen_kw)
+        finished = False
+        try:
+            for chunk in response.stream(chunk_size):
+                yield chunk
+            finished = True
+        finally:
+            if not finished:
+                # the rest of the body is unread, so close the connection
+                # rather than reusing it; releasing it still frees its place
+                # in the pool, for a new connection
+                response.close()
+            response.release_conn()
+
     def read(self, endpoint, item_id, **urlopen_kw):
         """Perform Reads against 7shifts API for the specified endpoint/ID.
         Pass parameters using the `fields` kwarg."""
@@ -126,7 +289,7 @@ class APIClient7Shifts(object):
         """
         body = json.dumps(urlopen_kw.pop('body', dict()))
         return self._request(
-            method.upper(), "{}/{:d}".format(endpoint, item_id),
+            method.upper(), "{}/{}".format(endpoint, item_id),
             body=body, **urlopen_kw)
 
     def delete(self, endpoint, item_id, **urlopen_kw):
@@ -141,9 +304,18 @@ class APIClient7Shifts(object):
         since that's the most common case in the API. If you need a specific
         format, such as full date time, pass in as a string-formatted date.
         """
+        urlopen_kw['fields'] = self._encode_fields(
+            urlopen_kw.get('fields', {}))
+        return self._request(
+            'GET', endpoint, **urlopen_kw)
+
+    @staticmethod
+    def _encode_fields(raw_fields):
+        """Encode a dictionary of list parameters into the string forms the
+        7shifts API expects. Booleans become 'true'/'false' and date-like
+        objects are serialized in YYYY-MM-DD format."""
         fields = {}
-        for key, val in urlopen_kw.get('fields', {}).items():
-            # print('item: {}'.format(key))
+        for key, val in raw_fields.items():
             if isinstance(val, bool):
                 if val:
                     fields[key] = 'true'
@@ -156,9 +328,13 @@ class APIClient7Shifts(object):
                 fields[key] = val.strftime("%Y-%m-%d")
             else:
                 fields[key] = val
-        urlopen_kw['fields'] = fields
-        return self._request(
-            'GET', endpoint, **urlopen_kw)
+        return fields
+
+    @property
+    def last_response_bytes(self):
+        """The size, in bytes, of the last response body received by the
+        current thread, or None if no response has been received."""
+        return getattr(self._local, 'response_bytes', None)
 
     @property
     def _connection_pool(self):
@@ -166,15 +342,35 @@ class APIClient7Shifts(object):
         Returns an initialized connection pool. If the pool becomes broken
         in some way, it can be destroyed with :meth:`_destroy_pool` and a
         subsequent call to this attribute will initialize a new pool.
+        A pool created by another process (before a fork) is never used;
+        a new one is created instead.
         """
-        if self.__connection_pool is None:
-            self._create_pool()
-        return self.__connection_pool
+        self._after_fork()
+        pool = self.__connection_pool
+        if pool is not None:
+            return pool
+        with self._pool_lock:
+            if self.__connection_pool is None:
+                self._create_pool()
+            return self.__connection_pool
+
+    def _after_fork(self):
+        """In a forked child, forget the lock, connection pool and hedging
+        thread pool inherited from the parent, so that new ones are created
+        for the child: the pools' connections and threads belong to the
+        parent, and the lock may have been held by another thread of the
+        parent when it forked."""
+        if self.__pid == os.getpid():
+            return
+        self._pool_lock = threading.Lock()
+        self.__connection_pool = None
+        self.__hedge_executor = None
+        self.__pid = os.getpid()
 
-    def _request(self, method, path, **urlopen_kw):
+    def _request(self, method, path, stream=False, **urlopen_kw):
         """
-        Wrapper around the ConnectionPool request method to add rate limiting
-        and response handling.
+        Wrapper around the ConnectionPool request method to add rate limiting,
+        retries and response handling.
 
         HTTP GET parameters should be passed as 'fields', and will be properly
         encoded by urllib3 and correctly placed into the request uri. For
@@ -186,14 +382,255 @@ class APIClient7Shifts(object):
         are required to make the API function properly, with the headers
         passed here overriding built-ins (such as to override the user_agent
         for a particular request).
+
+        If the client has a :attr:`retry` policy, transient failures (network
+        errors and statuses such as 429 or 502) are retried according to that
+        policy before any error is raised.
+
+        If `stream` is True, a successful response is returned without its
+        body having been read or decoded (see :meth:`stream_endpoint`).
+
+        If the client has a :attr:`cache` that applies to `path`, GET
+        requests are answered or revalidated using the cache. Identical GET
+        requests made at the same time by several threads are coalesced into
+        one, unless the client was created with `coalesce` set to False.
         """
+        method = method.upper()
+        if stream:
+            urlopen_kw['preload_content'] = False
+        elif method == 'GET' and self.single_flight is not None:
+            return self.single_flight.do(
+                self._request_key(path, urlopen_kw), self._get, path,
+                **urlopen_kw)
+        elif method == 'GET':
+            return self._get(path, **urlopen_kw)
+        response = self._fetch(method, path, **urlopen_kw)
+        if stream and response.status < 300:
+            return response
+        return self._handle_response(response)
+
+    def _request_key(self, path, urlopen_kw):
+        """Returns a key identifying a GET request for `path` with
+        `urlopen_kw`, for coalescing identical requests. It includes the
+        base URL and a hash of the access token, so that clients sharing a
+        :class:`concurrency.SingleFlight` never share each other's data."""
+        key = self.BASE_URL + ' ' + cache.ResponseCache.make_key(
+            path, urlopen_kw.get('fields'), self.access_token)
+        headers = urlopen_kw.get('headers')
+        if headers:
+            key += ' ' + repr(sorted(headers.items()))
+        return key
+
+    def _get(self, path, **urlopen_kw):
+        "Make a GET request, through :attr:`cache` if it applies to `path`"
+        if self.cache is not None and self.cache.applies(path):
+            return self._cached_request(path, **urlopen_kw)
+        return self._handle_response(self._fetch('GET', path, **urlopen_kw))
+
+    def _cached_request(self, path, **urlopen_kw):
+        """Make a GET request through :attr:`cache`: fresh entries are
+        returned without a request, and stale ones are revalidated with
+        conditional headers."""
+        key = self.cache.make_key(
+            path, urlopen_kw.get('fields'), self.access_token)
+        entry = self.cache.lookup(key)
+        if entry is not None:
+            if entry.is_fresh():
+                self._local.response_bytes = 0
+                return self.json_decoder(entry.data)
+            headers = self._default_headers()
+            headers.update(urlopen_kw.get('headers') or {})
+            headers.update(entry.conditional_headers())
+            urlopen_kw['headers'] = headers
+        response = self._fetch('GET', path, **urlopen_kw)
+        if response.status == 304 and entry is not None:
+            entry = self.cache.refresh(key, entry, response.headers)
+            return self.json_decoder(entry.data)
+        data = self._handle_response(response)
+        self.cache.store(key, response.headers, response.data)
+        return data
+
+    def _fetch(self, method, path, **urlopen_kw):
+        """Send a request, retrying according to :attr:`retry`, and return
+        the final response (successful or not) without decoding it."""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                if method == 'GET' and self.hedge is not None and \
+                        urlopen_kw.get('preload_content', True):
+                    response = self._send_hedged(path, attempt, **urlopen_kw)
+                else:
+                    response = self._send(method, path, attempt, **urlopen_kw)
+            except urllib3.exceptions.HTTPError as error:
+                delay = self._retry_delay(
+                    method, attempt, started, error=error)
+                if delay is None:
+                    raise
+                self.log.warning(
+                    "%s %s failed (%s), retrying in %.2fs", method, path,
+                    error, delay)
+            else:
+                if response.status < 300:
+                    return response
+                delay = self._retry_delay(
+                    method, attempt, started, status=response.status,
+                    headers=response.headers)
+                if delay is None:
+                    return response
+                if not urlopen_kw.get('preload_content', True):
+                    response.drain_conn()
+                    response.release_conn()
+                self.log.warning(
+                    "%s %s returned %d, retrying in %.2fs", method, path,
+                    response.status, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, method, path, attempt=0, **urlopen_kw):
+        """Make a single attempt at a request, after checking the circuit
+        breaker and waiting for the concurrency and rate limiters, and return
+        the raw response. The attempt is reported to any :attr:`hooks`,
+        `attempt` being the number of retries so far."""
+        self._check_circuit(path)
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            return self._send_attempt(method, path, attempt, **urlopen_kw)
+        with limiter:
+            return self._send_attempt(method, path, attempt, **urlopen_kw)
+
+    def _send_attempt(self, method, path, attempt, **urlopen_kw):
+        "The body of :meth:`_send`, once the request may go ahead"
         try:
             self.rate_limit_lock.acquire()
         except AttributeError:
             pass
-        response = self._connection_pool.request(
-            method.upper(), path, **urlopen_kw)
-        return self._handle_response(response)
+        event = instrumentation.RequestEvent(method, path, attempt)
+        self._call_hooks('before_request', event)
+        started = time.monotonic()
+        try:
+            response = self._connection_pool.request(
+                method, path, **urlopen_kw)
+        except Exception as error:
+            event.error = error
+            raise
+        else:
+            event.status = response.status
+            if urlopen_kw.get('preload_content', True):
+                event.nbytes = len(response.data or b'')
+                self._local.response_bytes = event.nbytes
+            else:
+                length = ratelimit.get_header(
+                    response.headers, 'content-length')
+                event.nbytes = int(length) if length else None
+        finally:
+            event.duration = time.monotonic() - started
+            self._record_circuit(event)
+            if self.hedge is not None:
+                self.hedge.record(event)
+            if self.concurrency_limiter is not None:
+                self.concurrency_limiter.record(event)
+            self._call_hooks('after_request', event)
+        self._update_rate_limit(response)
+        return response
+
+    def _send_hedged(self, path, attempt=0, **urlopen_kw):
+        """Make a GET request like :meth:`_send`, but if :attr:`hedge` says
+        it's taking too long, send a duplicate and return whichever response
+        comes first. Errors are only raised if both requests fail."""
+        delay = self.hedge.get_delay(path)
+        if delay is None:
+            return self._send('GET', path, attempt, **urlopen_kw)
+        executor = self._hedge_executor
+        first = executor.submit(self._send, 'GET', path, attempt, **urlopen_kw)
+        done, _ = concurrent.futures.wait([first], timeout=delay)
+        if done or not self.hedge.allow():
+            response = first.result()
+        else:
+            self.log.debug("hedging GET %s after %.2fs", path, delay)
+            second = executor.submit(
+                self._send, 'GET', path, attempt, **urlopen_kw)
+            response = self._first_response(first, second)
+        # the response was read in a worker thread, so record its size here
+        self._local.response_bytes = len(response.data or b'')
+        return response
+
+    def _first_response(self, first, second):
+        """Returns the result of whichever of the futures `first` and
+        `second` succeeds first, raising the error of `first` if neither
+        does. The other request is left to finish in the background."""
+        pending = {first, second}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self.hedge.count_win()
+                    return future.result()
+        return first.result()
+
+    @property
+    def _hedge_executor(self):
+        """Returns the thread pool that sends hedged requests, creating it
+        on first use (and again in a forked child)"""
+        self._after_fork()
+        with self._pool_lock:
+            if self.__hedge_executor is None:
+                self.__hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                    self.pool_maxsize, thread_name_prefix='7shifts-hedge')
+            return self.__hedge_executor
+
+    def _check_circuit(self, path):
+        """Raise :class:`exceptions.CircuitOpenError` if the circuit breaker
+        won't allow a request to `path`"""
+        if self.circuit_breaker is not None:
+            state = self.circuit_breaker.before_request(path)
+            if state is not None:
+                self._circuit_changed(path, state)
+
+    def _record_circuit(self, event):
+        "Report the outcome of a request to the circuit breaker"
+        if self.circuit_breaker is not None:
+            state = self.circuit_breaker.record(
+                event.path, status=event.status, error=event.error)
+            if state is not None:
+                self._circuit_changed(event.path, state)
+
+    def _circuit_changed(self, path, state):
+        endpoint = pagesize.endpoint_template(path)
+        log = self.log.warning if state == circuitbreaker.OPEN \
+            else self.log.info
+        log("circuit for %s is now %s", endpoint, state)
+        self._call_hooks('circuit_changed', endpoint, state)
+
+    def _call_hooks(self, name, *args):
+        """Call the `name` method of every hook that has one with `args`.
+        Errors in hooks are logged rather than interrupting the request."""
+        for hook in self.hooks:
+            method = getattr(hook, name, None)
+            if method is None:
+                continue
+            try:
+                method(*args)
+            except Exception:
+                self.log.exception("%s hook %r failed", name, hook)
+
+    def _retry_delay(self, method, attempt, started, **outcome):
+        """Consult the retry policy about a failed attempt, returning the
+        number of seconds to wait before retrying, or None to give up.
+        `outcome` is passed through to :meth:`retry.RetryPolicy.get_delay`."""
+        if self.retry is None:
+            return None
+        return self.retry.get_delay(
+            method, attempt, time.monotonic() - started, **outcome)
+
+    def _update_rate_limit(self, response):
+        """Feed the response headers back to the rate limiter, if it knows
+        how to make use of them."""
+        update = getattr(self.rate_limit_lock, 'update_from_headers', None)
+        if update is not None:
+            update(response.headers)
 
     def _destroy_pool(self):
         """
@@ -201,7 +638,8 @@ class APIClient7Shifts(object):
         call to :attr:`_connection_pool` generates a new pool to work with.
         Useful in cases where authentication timeouts occur.
         """
-        self.__connection_pool = None
+        with self._pool_lock:
+            self.__connection_pool = None
 
     def _create_pool(self):
         """Use the handy urllib3 connection_from_url helper to create a
@@ -209,8 +647,43 @@ class APIClient7Shifts(object):
         This also seeds the pool with the base URL so that subsequent requests
         only use the URI portion rather than an absolute URL.
 
+        If the client has a :attr:`pool_manager`, the pool comes from it
+        instead, and if it has a :attr:`transport`, the pool is wrapped by it.
+
         Stores a reference to the pool for use with :attr:`_connection_pool`
         """
+        request_kw = {}
+        if self.timeout is not None:
+            request_kw['timeout'] = self.timeout
+        if self.retry is not None:
+            # the retry policy replaces urllib3's own retries, which would
+            # otherwise sleep through Retry-After responses unseen
+            request_kw['retries'] = False
+        if self.pool_manager is not None:
+            pool = self.pool_manager.connection_from_url(
+                self.BASE_URL, headers=self._default_headers(), **request_kw)
+        else:
+            pool_kw = dict(
+                request_kw, maxsize=self.pool_maxsize, block=self.pool_block)
+            if self.BASE_URL.startswith('https:'):
+                pool_kw.update(
+                    cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+            pool = urllib3.connectionpool.connection_from_url(
+                self.BASE_URL, headers=self._default_headers(), **pool_kw)
+        if self.transport is not None:
+            pool = self.transport.wrap(pool)
+        self._set_pool(pool)
+
+    def _set_pool(self, pool):
+        """Use `pool` (an object with the `request` method of a
+        :class:`urllib3.HTTPConnectionPool`) for the requests of this
+        process"""
+        self._after_fork()
+        self.__connection_pool = pool
+
+    def _default_headers(self):
+        """Returns the dictionary of headers that must accompany every
+        request made to the 7shifts API, including authorization."""
         headers = urllib3.util.make_headers(
             keep_alive=self.KEEP_ALIVE,
             user_agent=self.USER_AGENT)
@@ -218,19 +691,17 @@ class APIClient7Shifts(object):
         headers['x-api-version'] = self.API_VERSION
         headers['accept'] = 'application/json'
         headers['content-type'] = 'application/json'
-        self.__connection_pool = urllib3.connectionpool.connection_from_url(
-            self.BASE_URL, cert_reqs='CERT_REQUIRED', ca_certs=certifi.where(),
-            headers=headers)
+        return headers
 
     def _handle_response(self, response):
         """
         In the case of a normal response, deserializes the response from
-        JSON back into dictionary form and returns it. In case of a response
-        code of 300 or higher, raises an :class:`exceptions.APIError`
-        exception.
+        JSON back into dictionary form (using :attr:`json_decoder`) and
+        returns it. In case of a response code of 300 or higher, raises an
+        :class:`exceptions.APIError` exception.
         Note that if you are seeing weirdness in the API response data, look
         at the :attr:`ENCODING` attribute for this class.
         """
         if response.status > 299:
             raise exceptions.APIError(response.status, response=response)
-        return json.loads(response.data.decode(self.ENCODING))
+        return self.json_decoder(response.data)
@@ -0,0 +1,414 @@
+"""
+asyncio support for the 7shifts API. This module mirrors the synchronous
+client and list functions found in the rest of the package, but every network
+call is awaitable, so a single process can keep many requests in flight
+without needing a thread per request, eg::
+
+    import asyncio
+    from lib7shifts import aio
+
+    async def main():
+        async with aio.get_client(access_token='YOUR_TOKEN') as client:
+            async for punch in aio.list_punches(
+                    client, 1234, **{'clocked_in[gte]': start}):
+                print(punch)
+
+    asyncio.run(main())
+
+Note that this module requires the `aiohttp` package, which is not installed
+as a dependency of lib7shifts. It is not imported into the main package scope
+for that reason; import :mod:`lib7shifts.aio` directly.
+"""
+import ssl
+import time
+import asyncio
+import functools
+import collections
+import certifi
+import urllib3
+import aiohttp
+from . import APIClient7Shifts, get_access_token_from_env
+from . import base
+from . import exceptions
+from . import instrumentation
+from . import (time_punches, shifts, receipts, users, roles, locations,
+               departments, companies, events, wages, assignments)
+
+#: Minimal stand-in for :class:`urllib3.response.HTTPResponse`, carrying the
+#: attributes that :meth:`APIClient7Shifts._handle_response` relies upon.
+Response = collections.namedtuple('Response', ('status', 'data', 'headers'))
+
+
+def get_client(access_token=None, **kwargs):
+    """Returns an :class:`AsyncAPIClient7Shifts` object. Like
+    :func:`lib7shifts.get_client`, the access token will be read from the
+    environment if not provided."""
+    if access_token is None:
+        access_token = get_access_token_from_env()
+    return AsyncAPIClient7Shifts(access_token=access_token, **kwargs)
+
+
+class AsyncAPIClient7Shifts(APIClient7Shifts):
+    """
+    asyncio version of :class:`lib7shifts.APIClient7Shifts`.
+
+    The CRUD methods (:meth:`read`, :meth:`list`, :meth:`create`,
+    :meth:`update`, :meth:`delete` and :meth:`get_endpoint`) take the same
+    arguments as the synchronous client, but return awaitables, and
+    :meth:`stream_endpoint` is an async generator. All requests share a
+    single `aiohttp` session, and thus a single connection pool.
+
+    Close the client with :meth:`close` when finished with it, or use it as
+    an async context manager.
+    """
+
+    #: Kwargs of :class:`lib7shifts.APIClient7Shifts` that this client
+    #: doesn't support; passing any of them raises TypeError
+    UNSUPPORTED_KWARGS = (
+        'cache', 'coalesce', 'transport', 'hedge', 'concurrency_limiter',
+        'page_sizer', 'pool_maxsize', 'pool_block', 'pool_manager')
+
+    def __init__(self, **kwargs):
+        """
+        Supports these kwargs of :class:`lib7shifts.APIClient7Shifts`:
+        `access_token`, `base_url`, `rate_limit_lock`, `rate_limit`,
+        `retry`, `json_decoder`, `hooks`, `circuit_breaker` and `timeout`,
+        as well as:
+
+        - max_connections: the maximum number of simultaneous connections
+          to the API (default: 100), in place of `pool_maxsize` and
+          `pool_block`
+
+        Any of :attr:`UNSUPPORTED_KWARGS` raises TypeError, unless it is
+        None or False.
+
+        A `timeout` must be a number of seconds, which applies to connecting
+        and to each read.
+
+        If a `rate_limit_lock` is provided, its blocking `acquire` method is
+        run in the default executor so that the event loop is not stalled.
+        Retries wait with :func:`asyncio.sleep`.
+        """
+        unsupported = sorted(
+            name for name in self.UNSUPPORTED_KWARGS
+            if kwargs.get(name) not in (None, False))
+        if unsupported:
+            raise TypeError("{} does not support: {}".format(
+                self.__class__.__name__, ', '.join(unsupported)))
+        kwargs['coalesce'] = False
+        self.max_connections = kwargs.pop('max_connections', 100)
+        super(AsyncAPIClient7Shifts, self).__init__(**kwargs)
+        self._session = None
+        url = urllib3.util.parse_url(self.BASE_URL)
+        self._origin = '{}://{}'.format(url.scheme, url.netloc)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the underlying session and all of its connections. A new
+        session will be created if the client is used again."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def _connection_pool(self):
+        """Returns the :class:`aiohttp.ClientSession` used for requests,
+        creating it on first use (it must be created inside a running event
+        loop)."""
+        if self._session is None:
+            self._create_pool()
+        return self._session
+
+    def _create_pool(self):
+        """Create an aiohttp session whose connector verifies certificates
+        against the certifi bundle, and whose default headers match those
+        used by the synchronous client."""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            ssl=ssl.create_default_context(cafile=certifi.where()))
+        session_kw = {}
+        if self.timeout is not None:
+            session_kw['timeout'] = aiohttp.ClientTimeout(
+                total=None, sock_connect=self.timeout,
+                sock_read=self.timeout)
+        self._session = aiohttp.ClientSession(
+            connector=connector, headers=self._default_headers(),
+            **session_kw)
+
+    def _destroy_pool(self):
+        """Drop the current session so that a new one is created on next
+        use. Prefer :meth:`close`, which also closes open connections."""
+        self._session = None
+
+    async def stream_endpoint(self, endpoint, chunk_size=2 ** 16,
+                              **urlopen_kw):
+        """Async generator version of
+        :meth:`APIClient7Shifts.stream_endpoint`: make a GET call against
+        `endpoint`, and yield its body as chunks of bytes while it is being
+        received. Errors are raised, after any retries, before the first
+        chunk is yielded. If the body isn't read to the end, close the
+        generator (eg. with :func:`contextlib.aclosing`) to free its
+        connection at once."""
+        response = await self._fetch(
+            'GET', endpoint, stream=True, **urlopen_kw)
+        if response.status >= 300:
+            self._handle_response(response)
+        try:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+        finally:
+            # closes the connection if the rest of the body is unread
+            response.release()
+
+    async def _request(self, method, path, **urlopen_kw):
+        """
+        Coroutine counterpart to :meth:`APIClient7Shifts._request`. Accepts
+        the same ``fields``, ``body`` and ``headers`` kwargs, and handles the
+        response in the same way, returning the decoded JSON body or raising
+        :class:`lib7shifts.exceptions.APIError`. Transient failures are
+        retried according to the client's :attr:`retry` policy.
+        """
+        return self._handle_response(
+            await self._fetch(method.upper(), path, **urlopen_kw))
+
+    async def _fetch(self, method, path, stream=False, **urlopen_kw):
+        """Send a request, retrying according to :attr:`retry`, and return
+        the final response (successful or not) without decoding it. If
+        `stream` is set, a successful response is the
+        :class:`aiohttp.ClientResponse` itself, its body unread, which the
+        caller must release."""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(
+                    method, path, attempt, stream, **urlopen_kw)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                delay = self._retry_delay(
+                    method, attempt, started, error=error)
+                if delay is None:
+                    raise
+                self.log.warning(
+                    "%s %s failed (%s), retrying in %.2fs", method, path,
+                    error, delay)
+            else:
+                if response.status < 300:
+                    return response
+                delay = self._retry_delay(
+                    method, attempt, started, status=response.status,
+                    headers=response.headers)
+                if delay is None:
+                    return response
+                self.log.warning(
+                    "%s %s returned %d, retrying in %.2fs", method, path,
+                    response.status, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(self, method, path, attempt=0, stream=False,
+                    **urlopen_kw):
+        """Make a single attempt at a request, after checking the circuit
+        breaker and waiting for the rate limiter, and return a
+        :class:`Response` with the body read (or, if `stream` is set and the
+        request succeeded, the :class:`aiohttp.ClientResponse` with the body
+        unread)."""
+        self._check_circuit(path)
+        if self.rate_limit_lock is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.rate_limit_lock.acquire)
+        fields = self._encode_fields(urlopen_kw.get('fields') or {})
+        event = instrumentation.RequestEvent(method, path, attempt)
+        self._call_hooks('before_request', event)
+        started = time.monotonic()
+        try:
+            response = await self._connection_pool.request(
+                method, self._origin + path, params=fields,
+                data=urlopen_kw.get('body'),
+                headers=urlopen_kw.get('headers'))
+            if not stream or response.status >= 300:
+                try:
+                    data = await response.read()
+                finally:
+                    response.release()
+                response = Response(response.status, data, response.headers)
+                event.nbytes = len(data)
+        except Exception as error:
+            event.error = error
+            raise
+        else:
+            event.status = response.status
+        finally:
+            event.duration = time.monotonic() - started
+            self._record_circuit(event)
+            self._call_hooks('after_request', event)
+        self._update_rate_limit(response)
+        return response
+
+
+#: Kwargs of the synchronous list functions that the async ones don't
+#: support; passing any of them raises TypeError
+UNSUPPORTED_LIST_KWARGS = ('shards', 'compact', 'prefetch')
+
+
+async def page_api_get_results(client, endpoint, **kwargs):
+    """Async generator version of :func:`lib7shifts.base.page_api_get_results`
+    with the same cursor semantics: individual result rows are yielded, and
+    the next page is requested once the current one is exhausted.
+
+    Unless `limit` is explicitly passed by the caller, a page size of
+    `default_limit` will be used (adaptive page sizes are not supported).
+    Any of :data:`UNSUPPORTED_LIST_KWARGS` raises TypeError, unless it is
+    None or False, rather than being sent to the API as a filter.
+    """
+    unsupported = sorted(
+        name for name in UNSUPPORTED_LIST_KWARGS
+        if kwargs.pop(name, None) not in (None, False))
+    if unsupported:
+        raise TypeError("async list functions do not support: {}".format(
+            ', '.join(unsupported)))
+    default_limit = kwargs.pop('default_limit', 100)
+    if 'limit' not in kwargs:
+        kwargs['limit'] = default_limit
+    next = True
+    while next:
+        response = await client.list(endpoint, fields=kwargs)
+        for item in response['data']:
+            yield item
+        next = response['meta']['cursor']['next']
+        kwargs['cursor'] = next
+
+
+def _make_object(object_class, raw=False, lazy=False):
+    """Returns the function that turns an API dictionary into what a list
+    function yields, for its `raw` and `lazy` kwargs (see
+    :func:`lib7shifts.base.iter_objects`)"""
+    if raw:
+        return lambda item: item
+    if lazy:
+        return functools.partial(base.LazyObject, object_class)
+    return lambda item: object_class(**item)
+
+
+async def list_punches(client, company_id, raw=False, lazy=False, **kwargs):
+    """Async generator version of :func:`lib7shifts.list_punches`, yielding
+    :class:`lib7shifts.TimePunch` objects, or see `raw` and `lazy` there."""
+    make = _make_object(time_punches.TimePunch, raw, lazy)
+    async for item in page_api_get_results(
+            client, time_punches.ENDPOINT.format(company_id=company_id),
+            **time_punches._list_punches_params(kwargs)):
+        yield make(item)
+
+
+async def list_shifts(client, company_id, raw=False, lazy=False, **kwargs):
+    """Async generator version of :func:`lib7shifts.list_shifts`, yielding
+    :class:`lib7shifts.Shift` objects, or see `raw` and `lazy` there."""
+    make = _make_object(shifts.Shift, raw, lazy)
+    async for item in page_api_get_results(
+            client, shifts.ENDPOINT.format(company_id=company_id),
+            **shifts._list_shifts_params(kwargs)):
+        yield make(item)
+
+
+async def list_receipts(client, company_id, raw=False, lazy=False, **kwargs):
+    """Async generator version of :func:`lib7shifts.list_receipts`, yielding
+    :class:`lib7shifts.Receipt` objects, or see `raw` and `lazy` there.
+    `location_id` is required."""
+    make = _make_object(receipts.Receipt, raw, lazy)
+    async for item in page_api_get_results(
+            client, receipts.ENDPOINT.format(company_id=company_id),
+            **receipts._list_receipts_params(kwargs)):
+        yield make(item)
+
+
+async def list_users(client, company_id, raw=False, lazy=False, **kwargs):
+    """Async generator version of :func:`lib7shifts.list_users`, yielding
+    :class:`lib7shifts.User` objects, or see `raw` and `lazy` there."""
+    make = _make_object(users.User, raw, lazy)
+    kwargs.setdefault('default_limit', 200)
+    async for item in page_api_get_results(
+            client, users.ENDPOINT.format(company_id=company_id), **kwargs):
+        yield make(item)
+
+
+async def list_roles(client, company_id, raw=False, lazy=False, **kwargs):
+    """Async generator version of :func:`lib7shifts.list_roles`, yielding
+    :class:`lib7shifts.Role` objects, or see `raw` and `lazy` there."""
+    make = _make_object(roles.Role, raw, lazy)
+    kwargs.setdefault('default_limit', 200)
+    async for item in page_api_get_results(
+            client, roles.ENDPOINT.format(company_id=company_id), **kwargs):
+        yield make(item)
+
+
+async def list_locations(client, company_id, raw=False, lazy=False,
+                         **kwargs):
+    """Async generator version of :func:`lib7shifts.list_locations`, yielding
+    :class:`lib7shifts.Location` objects, or see `raw` and `lazy` there."""
+    make = _make_object(locations.Location, raw, lazy)
+    async for item in page_api_get_results(
+            client, locations.ENDPOINT.format(company_id=company_id),
+            **kwargs):
+        yield make(item)
+
+
+async def list_departments(client, company_id, raw=False, lazy=False,
+                           **kwargs):
+    """Async generator version of :func:`lib7shifts.list_departments`,
+    yielding :class:`lib7shifts.Department` objects, or see `raw` and `lazy`
+    there."""
+    make = _make_object(departments.Department, raw, lazy)
+    async for item in page_api_get_results(
+            client, departments.ENDPOINT.format(company_id=company_id),
+            **kwargs):
+        yield make(item)
+
+
+async def list_companies(client, raw=False, lazy=False):
+    """Async generator version of :func:`lib7shifts.list_companies`."""
+    make = _make_object(companies.Company, raw, lazy)
+    for item in (await client.list(companies.ENDPOINT))['data']:
+        yield make(item)
+
+
+async def list_events(client, company_id, raw=False, lazy=False, **kwargs):
+    """Async generator version of :func:`lib7shifts.list_events`. Both
+    `start_date` and `end_date` kwargs are required."""
+    if 'start_date' not in kwargs:
+        raise RuntimeError("start_date not provided for list_events, required")
+    if 'end_date' not in kwargs:
+        raise RuntimeError("end_date not provided for list_events, required")
+    make = _make_object(events.Event, raw, lazy)
+    response = await client.list(
+        events.ENDPOINT.format(company_id=company_id), fields=kwargs)
+    for item in response['data']:
+        yield make(item)
+
+
+async def list_user_wages(client, company_id, user_id, **urlopen_kw):
+    """Coroutine version of :func:`lib7shifts.list_user_wages`, returning a
+    tuple of (current, upcoming) :class:`lib7shifts.WageList` objects."""
+    response = await client.get_endpoint(
+        wages.ENDPOINT.format(company_id=company_id, user_id=user_id),
+        **urlopen_kw)
+    try:
+        return (
+            wages.WageList(response['data']['current_wages']),
+            wages.WageList(response['data']['upcoming_wages']))
+    except KeyError:
+        raise exceptions.EntityNotFoundError('WageList', user_id)
+
+
+async def list_user_assignments(client, company_id, user_id, **urlopen_kw):
+    """Coroutine version of :func:`lib7shifts.list_user_assignments`."""
+    response = await client.get_endpoint(
+        assignments.ENDPOINT.format(company_id=company_id, user_id=user_id),
+        **urlopen_kw)
+    try:
+        return assignments.Assignments(**response['data'])
+    except KeyError:
+        raise exceptions.EntityNotFoundError('Assignments', user_id)
@@ -3,26 +3,366 @@ Establish base classes with common design patterns, to be inherited by API
 Objects
 """
 import json
+import time
+import heapq
+import queue
+import datetime
+import operator
+import itertools
+import threading
+import collections.abc
+import concurrent.futures
 from . import dates
 
 
-def page_api_get_results(client, endpoint, **kwargs):
+def page_api_get_results(client, endpoint, prefetch=0, default_limit=100,
+                         **kwargs):
     """Execute an API call (GET) that is expected to have paging support.
     This method will yield individual result rows as an iterable, avoiding the
     need for the caller to concern themselves with the details of paging.
 
-    Unless `limit` is explicitly passed by the caller, a default page size of
-    100 will be used.
+    Unless `limit` is explicitly passed by the caller, a page size of
+    `default_limit` will be used. If the client has a `page_sizer` (see
+    :class:`lib7shifts.pagesize.PageSizer`), that page size is only a starting
+    point, and is adjusted page by page to suit the endpoint.
+
+    Set `prefetch` to a number of pages to fetch pages in a background thread,
+    so that the next page is requested as soon as its cursor is known rather
+    than once the caller has used up the current page. At most `prefetch`
+    pages are buffered ahead of the caller.
+
+    Transient errors are retried by the client (see
+    :class:`lib7shifts.retry.RetryPolicy`) without losing the current position.
+    If a page still can't be fetched, the exception raised carries a `cursor`
+    attribute holding the cursor of that page, so the listing can be resumed
+    later by passing it back in with the `cursor` kwarg.
     """
+    sizer = None
     if 'limit' not in kwargs:
-        kwargs['limit'] = 100
-    next = True
-    while next:
-        response = client.list(endpoint, fields=kwargs)
+        sizer = getattr(client, 'page_sizer', None)
+        kwargs['limit'] = default_limit
+    pages = _iter_pages(client, endpoint, kwargs, sizer, default_limit)
+    if prefetch:
+        pages = _prefetch(pages, prefetch)
+    for response in pages:
         for item in response['data']:
             yield item
+
+
+def _iter_pages(client, endpoint, fields, sizer=None, default_limit=None):
+    """Yield each page of API results in turn, following the cursor chain.
+    The `fields` dictionary is updated with the cursor of each page, and with
+    the page size chosen by `sizer`, if given."""
+    next = True
+    succeeded = retries = 0
+    while next:
+        if sizer is not None:
+            fields['limit'] = sizer.get(endpoint, default_limit)
+        started = time.monotonic()
+        try:
+            response = client.list(endpoint, fields=fields)
+        except Exception as error:
+            if sizer is not None and sizer.record_failure(
+                    endpoint, fields['limit'], error, default=default_limit,
+                    succeeded=succeeded, retries=retries,
+                    retry=getattr(client, 'retry', None)):
+                retries += 1
+                continue
+            error.cursor = fields.get('cursor')
+            raise
+        succeeded = max(succeeded, fields['limit'])
+        retries = 0
+        if sizer is not None:
+            sizer.record_page(
+                endpoint, fields['limit'], len(response['data']),
+                time.monotonic() - started,
+                getattr(client, 'last_response_bytes', None))
+        yield response
         next = response['meta']['cursor']['next']
-        kwargs['cursor'] = next
+        fields['cursor'] = next
+
+
+def _prefetch(iterable, depth):
+    """Consume `iterable` in a background thread, keeping up to `depth` items
+    buffered ahead of the caller. Exceptions raised by the iterable are
+    re-raised in the calling thread. The background thread stops shortly
+    after the caller stops iterating."""
+    buffer = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as error:
+            put(_WorkerFailure(error))
+        else:
+            put(_DONE)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _WorkerFailure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+#: Marks the end of the rows produced by a background worker
+_DONE = object()
+
+
+class _WorkerFailure(object):
+    "Carries an exception from a background worker to the consuming thread"
+
+    def __init__(self, error):
+        self.error = error
+
+
+class _ShardWindow(object):
+    """A single time window of a sharded listing, from `start` up to but not
+    including `stop` (both whole seconds). Once a worker has looked at the
+    first page, the window either becomes a leaf (its rows are streamed into
+    :attr:`rows`) or is split in two (see :attr:`children`)."""
+
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+        self.children = None
+        self.rows = queue.Queue()
+        self.decided = threading.Event()
+
+
+def sort_order(sort_by=None, sort_dir=None):
+    """Returns the `sort_key` and `reverse` arguments to
+    :func:`page_api_get_results_sharded` for a listing sorted by the API's
+    `sort_by` parameter: a field name, or 'field.dir' for endpoints that
+    take the direction with it (eg. 'user_id.desc'). `sort_dir` ('asc' or
+    'desc') is the direction of endpoints that take it separately."""
+    field, _, direction = (sort_by or '').partition('.')
+    return field or None, (sort_dir or direction) == 'desc'
+
+
+def page_api_get_results_sharded(client, endpoint, field, shards=4,
+                                 max_workers=None, sort_key=None,
+                                 reverse=False,
+                                 min_window=datetime.timedelta(minutes=15),
+                                 **kwargs):
+    """Like :func:`page_api_get_results`, but split the date-time range given
+    by the ``<field>[gte]`` and ``<field>[lte]`` kwargs (both required) into
+    `shards` windows, and walk the cursor chain of each window concurrently
+    using a pool of `max_workers` threads (defaults to `shards`). Rows are
+    yielded as one stream.
+
+    The API's times are whole seconds, and it only filters on ``[gte]`` and
+    ``[lte]``, so each window covers whole seconds, from its start up to but
+    not including the start of the next: it is sent as ``[gte]`` its first
+    second and ``[lte]`` its last. A row on the boundary of two windows is
+    thus fetched by exactly one of them, and the windows together cover the
+    same seconds as the range given (a bound with a fraction of a second is
+    rounded inwards, to the seconds the API would match).
+
+    Windows size themselves to the data: when a window turns out to hold more
+    than one page of results and there are fewer than ``4 * max_workers``
+    windows, it is split in half (down to `min_window`) so that busy periods
+    are spread over more workers. Each split costs one discarded page fetch.
+
+    If `sort_key` (a field name or key function) is given, the windows are
+    merged so that the stream is ordered by that key, which requires that the
+    API returns each window sorted by it too (see :func:`sort_order`).
+    Otherwise rows are yielded window by window, in time order, each window
+    in the order the API returns it. Set `reverse` for descending order.
+
+    Rows of windows later in the stream than the one being consumed are
+    buffered in memory until they are reached. The page size is fixed for
+    the whole listing, see :func:`page_api_get_results` for how it is
+    chosen.
+    """
+    default_limit = kwargs.pop('default_limit', 100)
+    sizer = getattr(client, 'page_sizer', None)
+    if 'limit' not in kwargs:
+        kwargs['limit'] = default_limit
+        if sizer is not None:
+            kwargs['limit'] = sizer.get(endpoint, default_limit)
+    # shard workers already fetch ahead of the caller
+    kwargs.pop('prefetch', None)
+    gte, lte = '{}[gte]'.format(field), '{}[lte]'.format(field)
+    if not kwargs.get(gte) or not kwargs.get(lte):
+        raise RuntimeError(
+            "{} and {} must be provided for sharded listings".format(gte, lte))
+    start, end = (kwargs[gte], kwargs[lte])
+    if isinstance(start, str):
+        start = dates.from_iso8601_dt(start)
+    if isinstance(end, str):
+        end = dates.from_iso8601_dt(end)
+    if isinstance(sort_key, str):
+        sort_key = operator.itemgetter(sort_key)
+    one_second = datetime.timedelta(seconds=1)
+    if start.microsecond:
+        start = start.replace(microsecond=0) + one_second
+    stop = end.replace(microsecond=0) + one_second
+    # every window must span at least one second
+    shards = max(1, min(shards, int((stop - start).total_seconds())))
+    max_workers = max_workers or shards
+    max_windows = 4 * max_workers
+    lock = threading.Lock()
+    cancelled = threading.Event()
+    window_count = [shards]
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+
+    def fetch(window):
+        params = dict(kwargs)
+        params[gte] = dates.iso8601_dt(window.start)
+        params[lte] = dates.iso8601_dt(window.stop - one_second)
+        try:
+            response = client.list(endpoint, fields=params)
+            next = response['meta']['cursor']['next']
+            if next and window.stop - window.start >= 2 * max(
+                    min_window, one_second):
+                with lock:
+                    split = window_count[0] < max_windows
+                    if split:
+                        window_count[0] += 1
+                if split:
+                    middle = window.start + (window.stop - window.start) / 2
+                    middle = middle.replace(microsecond=0)
+                    window.children = (
+                        _ShardWindow(window.start, middle),
+                        _ShardWindow(middle, window.stop))
+                    window.decided.set()
+                    for child in window.children:
+                        executor.submit(fetch, child)
+                    return
+            window.decided.set()
+            while True:
+                for item in response['data']:
+                    window.rows.put(item)
+                if not next or cancelled.is_set():
+                    break
+                params['cursor'] = next
+                response = client.list(endpoint, fields=params)
+                next = response['meta']['cursor']['next']
+        except Exception as error:
+            window.rows.put(_WorkerFailure(error))
+            window.decided.set()
+            return
+        window.rows.put(_DONE)
+
+    def iter_window(window):
+        window.decided.wait()
+        if window.children is not None:
+            yield from merge(window.children)
+            return
+        while True:
+            item = window.rows.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _WorkerFailure):
+                raise item.error
+            yield item
+
+    def merge(windows):
+        if reverse:
+            windows = list(reversed(windows))
+        if sort_key is None:
+            return itertools.chain.from_iterable(
+                iter_window(window) for window in windows)
+        return heapq.merge(*[iter_window(window) for window in windows],
+                           key=sort_key, reverse=reverse)
+
+    width = (stop - start) / shards
+    bounds = [start] + [(start + width * shard).replace(microsecond=0)
+                        for shard in range(1, shards)] + [stop]
+    windows = [_ShardWindow(bounds[shard], bounds[shard + 1])
+               for shard in range(shards)]
+    try:
+        for window in windows:
+            executor.submit(fetch, window)
+        yield from merge(windows)
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False)
+
+
+def iter_objects(results, object_class, raw=False, lazy=False):
+    """Turn the rows of a listing (API dictionaries) into `object_class`
+    objects, as the ``list_`` functions do. Those functions pass their `raw`
+    and `lazy` kwargs through:
+
+    - raw: yield the decoded dictionaries themselves, without copying them
+      into objects; the quickest way to feed rows to eg.
+      ``pandas.DataFrame.from_dict``
+    - lazy: yield :class:`LazyObject` wrappers, which only build the object
+      once one of its methods or properties is used
+    """
+    if raw:
+        return iter(results)
+    if lazy:
+        return (LazyObject(object_class, item) for item in results)
+    return (object_class(**item) for item in results)
+
+
+class LazyObject(collections.abc.Mapping):
+    """
+    A row of a listing, read straight from the API dictionary until a method
+    or property of `object_class` (eg. :class:`lib7shifts.TimePunch`) is
+    used, at which point the object is built (once) to answer it. Item
+    access, iteration and the other read-only dictionary methods never build
+    the object. Note that the wrapper isn't an instance of `object_class`;
+    use :meth:`materialize` to get that.
+    """
+    __slots__ = ('_object_class', '_data', '_object')
+
+    def __init__(self, object_class, data):
+        self._object_class = object_class
+        self._data = data
+        self._object = None
+
+    def materialize(self):
+        "Returns the `object_class` object for the row, building it if need be"
+        if self._object is None:
+            self._object = self._object_class(**self._data)
+        return self._object
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getattr__(self, name):
+        if name in LazyObject.__slots__:
+            # not set yet, eg. while unpickling
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def __getstate__(self):
+        return (self._object_class, self._data)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return "{}({}, {!r})".format(self.__class__.__name__,
+                                     self._object_class.__name__, self._data)
 
 
 class APIObject(dict):
@@ -38,13 +378,30 @@ class APIObject(dict):
     @property
     def created(self):
         "Returns a :class:`datetime.datetime` object for shift creation time"
-        return dates.to_datetime(self.get('created'))
+        return self._parse_date('created')
 
     @property
     def modified(self):
         """Returns a :class:`datetime.datetime` object corresponding to the
         last time this shift was modified"""
-        return dates.to_datetime(self.get('modified'))
+        return self._parse_date('modified')
+
+    def _parse_date(self, name, tzinfo=datetime.timezone.utc):
+        """Returns the `name` field as a :class:`datetime.datetime` in
+        `tzinfo`, see :func:`lib7shifts.dates.to_datetime`. The result is
+        kept until the field (or `tzinfo`) changes, so that properties can
+        be read over and over without parsing the field again."""
+        value = self.get(name)
+        try:
+            parsed = self._parsed_dates
+        except AttributeError:
+            parsed = self._parsed_dates = {}
+        cached = parsed.get(name)
+        if cached is not None and cached[0] == value and cached[1] == tzinfo:
+            return cached[2]
+        date = dates.to_datetime(value, tzinfo)
+        parsed[name] = (value, tzinfo, date)
+        return date
 
     def refresh(self):
         """Full CRUD implementations need to ensure that objects can be
@@ -0,0 +1,280 @@
+"""
+Response caching for read endpoints.
+
+Reference data such as companies, locations, departments and roles rarely
+changes, yet is fetched in full on every run. With a cache attached, the
+client keeps the body of each successful GET to those endpoints along with
+its validators (the ETag and Last-Modified headers):
+
+- when a cached response has validators, the request is repeated with
+  If-None-Match/If-Modified-Since headers, and a 304 Not Modified reply is
+  answered from the cache, so the body isn't sent again
+- when the API sends no validators, the cached response is served without
+  any request at all until `ttl` seconds have passed
+- a Cache-Control max-age from the API overrides `ttl`, and responses marked
+  no-store are never cached
+
+Two stores are provided, :class:`MemoryCache` for the life of a process and
+:class:`SQLiteCache` to share responses between runs::
+
+    import lib7shifts
+    from lib7shifts.cache import SQLiteCache
+    client = lib7shifts.get_client(cache=SQLiteCache('~/.7shifts-cache.db'))
+
+Responses are cached per access token, so one store may be shared between
+clients for different accounts.
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import collections
+from .ratelimit import get_header
+from .pagesize import endpoint_template
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+#: Specify the name of the environment variable where the command line tools
+#: look for the path of an on-disk cache.
+CACHE_PATH_ENVVAR = 'CACHE_7SHIFTS'
+
+#: Endpoint templates (see :func:`pagesize.endpoint_template`) that are
+#: cached by default: reference data that changes rarely.
+REFERENCE_ENDPOINTS = (
+    r'/v2/companies(/\{id\})?',
+    r'/v2/company/\{id\}/(locations|departments|roles)(/\{id\})?',
+    r'/v2/whoami',
+)
+
+_MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+def get_cache_from_env(**kwargs):
+    """Returns an :class:`SQLiteCache` at the path named by the
+    :attr:`CACHE_PATH_ENVVAR` environment variable, or None if it isn't set.
+    kwargs are passed to the cache."""
+    path = os.environ.get(CACHE_PATH_ENVVAR)
+    if not path:
+        return None
+    return SQLiteCache(path, **kwargs)
+
+
+class CacheEntry(collections.namedtuple(
+        'CacheEntry', ('data', 'etag', 'last_modified', 'expires'))):
+    """A cached response body (bytes), its validators and the time (seconds
+    since the epoch) until which it may be used without revalidation."""
+    __slots__ = ()
+
+    def is_fresh(self, now=None):
+        "Returns True if the entry may be used without asking the API"
+        if now is None:
+            now = time.time()
+        return now < self.expires
+
+    def conditional_headers(self):
+        "Returns the headers that ask the API whether this entry is current"
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    """Base class for response caches. Subclasses provide the storage, by
+    implementing :meth:`get`, :meth:`set`, :meth:`delete` and :meth:`clear`.
+    Safe to share between threads and clients."""
+
+    def __init__(self, ttl=300, endpoints=REFERENCE_ENDPOINTS):
+        """
+        - ttl: the number of seconds to serve a response that came without
+          validators (or a max-age) before fetching it again
+        - endpoints: regular expressions matching the endpoint templates to
+          cache, eg. r'/v2/company/\\{id\\}/users'
+        """
+        self.ttl = ttl
+        self.endpoints = [re.compile(pattern) for pattern in endpoints]
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(hits={}, revalidations={}, misses={})".format(
+            self.__class__.__name__, self.hits, self.revalidations,
+            self.misses)
+
+    def applies(self, path):
+        "Returns True if GET responses for `path` should be cached"
+        template = endpoint_template(path)
+        return any(pattern.fullmatch(template) for pattern in self.endpoints)
+
+    @staticmethod
+    def make_key(path, fields=None, access_token=None):
+        """Returns the key for a GET of `path` with the query `fields`, as
+        made with `access_token`. The token is hashed so that it isn't
+        stored."""
+        key = path
+        if fields:
+            key += '?' + urlencode(sorted(
+                (name, str(value)) for name, value in fields.items()))
+        if access_token:
+            key = hashlib.sha256(access_token.encode('utf8')).hexdigest()[
+                :16] + ' ' + key
+        return key
+
+    def lookup(self, key):
+        "Returns the entry for `key`, or None, and counts hits and misses"
+        entry = self.get(key)
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+            elif entry.is_fresh():
+                self.hits += 1
+            else:
+                self.revalidations += 1
+        return entry
+
+    def store(self, key, headers, data):
+        """Cache the response body `data`, received with `headers`, under
+        `key` unless the API asked for it not to be stored. Returns the new
+        entry or None."""
+        control = (get_header(headers, 'cache-control') or '').lower()
+        if 'no-store' in control:
+            return None
+        etag = get_header(headers, 'etag')
+        last_modified = get_header(headers, 'last-modified')
+        entry = CacheEntry(data, etag, last_modified, self._expires(
+            headers, validated=bool(etag or last_modified)))
+        self.set(key, entry)
+        return entry
+
+    def refresh(self, key, entry, headers):
+        """Update `entry` after a 304 Not Modified response with `headers`,
+        and return the updated entry."""
+        entry = entry._replace(
+            etag=get_header(headers, 'etag') or entry.etag,
+            last_modified=get_header(
+                headers, 'last-modified') or entry.last_modified,
+            expires=self._expires(headers))
+        self.set(key, entry)
+        return entry
+
+    def _expires(self, headers, validated=True):
+        """Returns the expiry time for a response with `headers`. Responses
+        with validators expire immediately (they are revalidated on every
+        use) unless the API gave a max-age."""
+        match = _MAX_AGE.search(
+            (get_header(headers, 'cache-control') or '').lower())
+        if match:
+            return time.time() + int(match.group(1))
+        if validated:
+            return time.time()
+        return time.time() + self.ttl
+
+    def get(self, key):
+        "Returns the :class:`CacheEntry` stored under `key`, or None"
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        "Store `entry` under `key`"
+        raise NotImplementedError
+
+    def delete(self, key):
+        "Remove the entry stored under `key`, if any"
+        raise NotImplementedError
+
+    def clear(self):
+        "Remove all entries"
+        raise NotImplementedError
+
+
+class MemoryCache(ResponseCache):
+    """Keeps responses in memory for the life of the process, discarding the
+    least recently used entries once there are more than `max_entries`."""
+
+    def __init__(self, max_entries=1024, **kwargs):
+        super(MemoryCache, self).__init__(**kwargs)
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(ResponseCache):
+    """Keeps responses in an SQLite database at `path`, so that they can be
+    revalidated by later runs. The database is created if needed."""
+
+    def __init__(self, path, **kwargs):
+        super(SQLiteCache, self).__init__(**kwargs)
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, data BLOB, etag TEXT, '
+                'last_modified TEXT, expires REAL)')
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT data, etag, last_modified, expires FROM responses '
+                'WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(bytes(row[0]), *row[1:])
+
+    def set(self, key, entry):
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, entry.data, entry.etag, entry.last_modified,
+                 entry.expires))
+
+    def delete(self, key):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses')
+
+    def close(self):
+        "Close the database connection"
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,154 @@
+"""
+Per-endpoint circuit breaking for the 7shifts API client.
+
+During a partial outage (say, the hours and wages report answering every
+request with a 500), retrying an endpoint that is down wastes the rate budget
+that healthy endpoints need. A :class:`CircuitBreaker` given to the client
+with the `circuit_breaker` kwarg tracks failures per endpoint template:
+
+- closed: requests flow normally. After `failure_threshold` consecutive
+  failures (network errors or 5xx responses) the circuit opens.
+- open: requests fail immediately with
+  :class:`lib7shifts.exceptions.CircuitOpenError`, without being sent or
+  taking from the rate limit, until `recovery_timeout` seconds have passed.
+- half-open: up to `half_open_requests` probe requests are let through. If
+  one succeeds the circuit closes again; if one fails it opens again.
+
+Changes of state are reported to the client's instrumentation hooks through
+their ``circuit_changed(endpoint, state)`` method (see
+:mod:`lib7shifts.instrumentation`).
+"""
+import time
+import threading
+from . import exceptions
+from .pagesize import endpoint_template
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+#: Response codes that count as a failure of the endpoint
+FAILURE_STATUSES = frozenset([500, 502, 503, 504])
+
+
+class _Circuit(object):
+    "The state of one endpoint's circuit"
+    __slots__ = ('state', 'failures', 'opened_at', 'probes')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+
+class CircuitBreaker(object):
+    """Tracks a circuit per endpoint template. Safe to share between threads
+    and clients."""
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0,
+                 half_open_requests=1, statuses=FAILURE_STATUSES,
+                 clock=time.monotonic):
+        """
+        - failure_threshold: consecutive failures that open a circuit
+        - recovery_timeout: seconds a circuit stays open before probing
+        - half_open_requests: probe requests allowed at once while half-open
+        - statuses: the HTTP status codes that count as failures
+        - clock: a function returning the current time in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_requests = half_open_requests
+        self.statuses = frozenset(statuses)
+        self._clock = clock
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.states())
+
+    def states(self):
+        "Returns a dictionary of the state of each endpoint template's circuit"
+        with self._lock:
+            return {endpoint: circuit.state
+                    for endpoint, circuit in self._circuits.items()}
+
+    def state(self, endpoint):
+        "Returns the state of the circuit for `endpoint`"
+        with self._lock:
+            circuit = self._circuits.get(endpoint_template(endpoint))
+            if circuit is None:
+                return CLOSED
+            if circuit.state == OPEN and self._recovered(circuit):
+                return HALF_OPEN
+            return circuit.state
+
+    def is_open(self, endpoint):
+        """Returns True if requests to `endpoint` would currently fail fast,
+        eg. to skip work that depends on it"""
+        return self.state(endpoint) == OPEN
+
+    def before_request(self, endpoint):
+        """Called before a request to `endpoint` is sent. Raises
+        :class:`exceptions.CircuitOpenError` if it must not be, and returns
+        a new state if the circuit changed state (or None)."""
+        template = endpoint_template(endpoint)
+        with self._lock:
+            circuit = self._circuits.setdefault(template, _Circuit())
+            if circuit.state == CLOSED:
+                return None
+            changed = None
+            if circuit.state == OPEN:
+                if not self._recovered(circuit):
+                    raise exceptions.CircuitOpenError(
+                        template, circuit.opened_at + self.recovery_timeout -
+                        self._clock())
+                circuit.state = changed = HALF_OPEN
+                circuit.probes = 0
+            if circuit.probes >= self.half_open_requests:
+                raise exceptions.CircuitOpenError(template, 0.0)
+            circuit.probes += 1
+            return changed
+
+    def record(self, endpoint, status=None, error=None):
+        """Record the outcome of a request to `endpoint`: its response
+        `status`, or the `error` raised if there was no response. Returns a
+        new state if the circuit changed state (or None). Successes are
+        ignored while the circuit is open, since they come from requests
+        sent before it opened."""
+        failed = error is not None or status in self.statuses
+        template = endpoint_template(endpoint)
+        with self._lock:
+            circuit = self._circuits.setdefault(template, _Circuit())
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(0, circuit.probes - 1)
+            if not failed:
+                if circuit.state == OPEN:
+                    # a request sent before the circuit opened; only a
+                    # half-open probe may close it
+                    return None
+                circuit.failures = 0
+                if circuit.state != CLOSED:
+                    circuit.state = CLOSED
+                    return CLOSED
+                return None
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or (
+                    circuit.state == CLOSED and
+                    circuit.failures >= self.failure_threshold):
+                circuit.state = OPEN
+                circuit.opened_at = self._clock()
+                return OPEN
+            return None
+
+    def reset(self, endpoint=None):
+        "Close the circuit for `endpoint`, or all circuits"
+        with self._lock:
+            if endpoint is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(endpoint_template(endpoint), None)
+
+    def _recovered(self, circuit):
+        "Must be called with the lock held"
+        return self._clock() - circuit.opened_at >= self.recovery_timeout
@@ -4,7 +4,15 @@ Common methods and attributes for the various 7shifts commands
 import logging
 import datetime
 import json
-from lib7shifts import get_client as get_7shifts_client
+from lib7shifts import get_client
+from lib7shifts.cache import get_cache_from_env
+
+
+def get_7shifts_client(**kwargs):
+    """Returns a 7shifts API client, caching reference data on disk if the
+    CACHE_7SHIFTS environment variable names a cache file"""
+    kwargs.setdefault('cache', get_cache_from_env())
+    return get_client(**kwargs)
 
 
 def print_api_item(item):
@@ -33,8 +33,11 @@ Sync Options:
                         and including today (NN=1 equals sync yesterday+today)
   --company-id=NN       Provide a company ID in cases where one cannot be
                         inferred from API data (if you have multiple companies)
-  --tz=STR              Specify a timezone to work in
+  --tz=STR              Specify a timezone to work in, for locations that
+                        don't have a valid one of their own
                         [default: America/Edmonton]
+  --workers=NN          Number of sync tasks to run at once, shared fairly
+                        between companies [default: 4]
 
 If --modified-since is provided, it trumps all other date arguments. If it is
 not present, then date handling is as follows:
@@ -67,35 +70,65 @@ General options:
 
   -h --help             Show this screen
   --debug-db            Enable database debug logging
+  --metrics             Log request counts, retries, bytes and latencies per
+                        API endpoint once the sync is finished
 
 You will also need to provide a 7shifts API token with an environment
-variable called ACCESS_TOKEN_7SHIFTS.
+variable called ACCESS_TOKEN_7SHIFTS. To keep reference data (companies,
+locations, departments and roles) between runs, and only download it again
+when it changes, set CACHE_7SHIFTS to the path of a cache file.
 
 Note that all sync actions require that you install the latest Pandas and
 SQLAlchemy python packages.
 
 """
 import logging
+import zoneinfo
+import threading
 import pandas
 import sqlalchemy
 from datetime import timedelta, date, datetime, time
 from docopt import docopt
 import lib7shifts
 from .util import parse_last_modified
-from lib7shifts.dates import get_local_tz
+from lib7shifts.dates import get_local_tz, to_y_m_d, yesterday
 
 
 _CLIENT_7SHIFTS = None
 _DB_CONNECTION = None
+_TIMEZONES = None
+_DB_LOCK = threading.Lock()
+
+#: Number of pages to fetch ahead of processing for large listings
+PREFETCH_PAGES = 2
+
+#: Most threads used to fetch per-user data; how many of them have a request
+#: in flight at once is adjusted to how the API is coping
+MAX_WORKERS = 16
 
 
 def get_7shifts():
     global _CLIENT_7SHIFTS
     if _CLIENT_7SHIFTS is None:
-        _CLIENT_7SHIFTS = lib7shifts.get_client()
+        _CLIENT_7SHIFTS = lib7shifts.get_client(
+            retry=lib7shifts.retry.RetryPolicy(), page_sizer=True,
+            circuit_breaker=True, pool_maxsize=MAX_WORKERS,
+            concurrency_limiter=lib7shifts.concurrency.AIMDLimiter(
+                max_limit=MAX_WORKERS),
+            cache=lib7shifts.cache.get_cache_from_env())
     return _CLIENT_7SHIFTS
 
 
+def get_timezones(default=None):
+    """Returns the resolver of location timezones, which uses `default` for
+    locations without a valid timezone (see --tz)"""
+    global _TIMEZONES
+    if _TIMEZONES is None:
+        _TIMEZONES = lib7shifts.timezones.TimezoneResolver(
+            get_7shifts(), default=default)
+    return _TIMEZONES
+
+
 def get_db(url=None, db_debug=False):
     global _DB_CONNECTION
     if _DB_CONNECTION is None:
@@ -113,10 +146,11 @@ def logger():
 def parse_dates(args):
     """Given args, figure out the necessary date fields to supply to 7shifts
     API calls. If no end date was supplied, make it yesterday at 11:59pm. These
-    are timezone-aware objects and assume local timezone, converting those
-    timestamps to UTC prior to API requests.
+    are timezone-aware objects in the --tz timezone, converted to UTC prior to
+    API requests. See :func:`location_dates` for the same days in the
+    timezone of a location.
 
-    Returns a dict with named fields (start, end, modified_since)."""
+    Returns a dict with named fields (start, end, days, modified_since)."""
     retval = {}
     if args.get('--modified-since'):
         retval['modified_since'] = parse_last_modified(
@@ -136,19 +170,35 @@ def parse_dates(args):
         start = end - days
         if args.get("--start-date"):
             start = date.fromisoformat(args.get('--start-date'))
-        # now let's convert to TZ-aware datetime in local timezone. This is
-        # actually pretty tricky with the python standard library, but we're
-        # already using Pandas, so let's let it help us get this right. ;-)
-        dr = pandas.date_range(start, end, freq='D', tz=args.get('--tz'))
-        # 11:59:59 pm in local zone for whatever date 'end' was
-        retval['end'] = dr[-1] - timedelta(seconds=1)
-        retval['start'] = dr[0]
+        retval['days'] = (start, end)
+        retval.update(location_dates(
+            retval, zoneinfo.ZoneInfo(args.get('--tz'))))
         logger().info(
             "Using the following datetimes: start:%s, end:%s",
             retval['start'], retval['end'])
     return retval
 
 
+def location_dates(dates, tzinfo):
+    """Returns a copy of `dates` (see :func:`parse_dates`) with the start and
+    end times of its days in `tzinfo`, eg. the timezone of a location:
+    midnight at the start of the first day, and 11:59:59 pm before the last
+    one. Dates given by --modified-since are left as they are."""
+    if 'days' not in dates:
+        return dates
+    first, last = dates['days']
+    return dict(
+        dates, start=datetime.combine(first, time(), tzinfo),
+        end=datetime.combine(last, time(), tzinfo) - timedelta(seconds=1))
+
+
+def get_location_dates(company_id, location, dates):
+    """Returns `dates` in the timezone of `location`, see
+    :func:`location_dates`. The sync_location_* functions take the dates
+    of their location in this form."""
+    return location_dates(dates, get_timezones().get(location.id, company_id))
+
+
 def db_upsert(table, data_frame, tmp_table_prefix='upsert_tmp_'):
     """Not all DB's support upsert operations, and Pandas' to_sql() method
     does not support upsert, regardless. Implement our own upsert by storing
@@ -159,7 +209,14 @@ def db_upsert(table, data_frame, tmp_table_prefix='upsert_tmp_'):
 
     If more than 10,000 rows are provided in the dataframe, a warning
     will be issued (Python logging framework).
+
+    Upserts from several threads are made one at a time.
     """
+    with _DB_LOCK:
+        return _db_upsert(table, data_frame, tmp_table_prefix)
+
+
+def _db_upsert(table, data_frame, tmp_table_prefix):
     if len(data_frame) > 10000:
         logger().warn("%d rows supplied to db_upsert, recommend < 10000",
                       len(data_frame))
@@ -179,7 +236,7 @@ def db_upsert(table, data_frame, tmp_table_prefix='upsert_tmp_'):
     logger().debug("upsert query: %s", query)
     conn = get_db().connect()
     with conn.begin():
-        # This is not thread safe -- wrap in a lock if threads are expected.
+        # Not thread safe, hence the lock in db_upsert.
         # If multiple processes will be doing upserts, use a random table
         # name and clean up afterwards (including upon exception handling)
         data_frame.to_sql(tmp_table, conn, if_exists='replace')
@@ -195,7 +252,7 @@ def get_one_company_data(company_id):
 
 def get_all_company_data():
     return pandas.DataFrame.from_dict(
-        lib7shifts.list_companies(get_7shifts()))
+        lib7shifts.list_companies(get_7shifts(), raw=True))
 
 
 def sync_company_data(company):
@@ -211,12 +268,21 @@ def get_location_data(company_id, date_args={}):
     kwargs = {}
     if 'modified_since' in date_args:
         kwargs['modified_since'] = date_args['modified_since']
-    return pandas.DataFrame.from_dict(lib7shifts.list_locations(
-        get_7shifts(), company_id, **kwargs))
-
-
-def sync_location_data(company_id, date_args):
-    data = get_location_data(company_id, date_args)
+    locations = list(lib7shifts.list_locations(
+        get_7shifts(), company_id, raw=True, **kwargs))
+    get_timezones().add_locations(locations)
+    return pandas.DataFrame.from_dict(locations)
+
+
+def sync_location_data(company_id, date_args, locations=None):
+    """Sync the locations of a company. If the `locations` data frame
+    (from :func:`get_location_data`) is given, those are synced instead of
+    listing them again."""
+    data = locations
+    if data is None:
+        data = get_location_data(company_id, date_args)
+    else:
+        data = data.copy()
     logger().debug(
         "retrieved %d location records for company %d",
         len(data), company_id)
@@ -231,7 +297,7 @@ def get_department_data(company_id, date_args):
     if 'modified_since' in date_args:
         kwargs['modified_since'] = date_args['modified_since']
     return pandas.DataFrame.from_dict(lib7shifts.list_departments(
-        get_7shifts(), company_id, **kwargs))
+        get_7shifts(), company_id, raw=True, **kwargs))
 
 
 def sync_deparment_data(company_id, date_args):
@@ -252,7 +318,7 @@ def get_role_data(company_id, date_args):
     roles = []
     stations = []
     for role in lib7shifts.list_roles(
-            get_7shifts(), company_id, **kwargs):
+            get_7shifts(), company_id, raw=True, **kwargs):
         if role.get('num_stations') > 0:
             stations.extend(role.pop('stations'))
         roles.append(role)
@@ -283,7 +349,7 @@ def get_user_data(company_id, date_args, status):
     if 'modified_since' in date_args:
         kwargs['modified_since'] = date_args['modified_since']
     return pandas.DataFrame.from_dict(lib7shifts.list_users(
-        get_7shifts(), company_id, **kwargs))
+        get_7shifts(), company_id, raw=True, **kwargs))
 
 
 def sync_user_data(company_id, date_args, status='active'):
@@ -306,10 +372,12 @@ def get_user_wage_data(company_id, user_id):
 
 def sync_wage_data(company_id, date_args, status='active'):
     # wage data is sought on a per-user basis
-    users = get_user_data(company_id, date_args, status)
+    users = list(get_user_data(company_id, date_args, status).itertuples())
     updated = 0
-    for user in users.itertuples():
-        wages = get_user_wage_data(company_id, user.id)
+    all_wages = lib7shifts.concurrency.fan_out(
+        lambda user: get_user_wage_data(company_id, user.id), users,
+        max_workers=MAX_WORKERS)
+    for user, wages in zip(users, all_wages):
         logger().debug(
             "retrieved %d wage records for user %s %s (id: %d)",
             len(wages), user.first_name, user.last_name, user.id)
@@ -324,12 +392,15 @@ def get_user_assignment_data(company_id, user_id):
 
 
 def sync_assignment_data(company_id, date_args, status='active'):
-    users = get_user_data(company_id, date_args, status)
+    users = list(get_user_data(company_id, date_args, status).itertuples())
     updated = 0
     data = {}
-    for user in users.itertuples():
+    all_assignments = lib7shifts.concurrency.fan_out(
+        lambda user: get_user_assignment_data(company_id, user.id), users,
+        max_workers=MAX_WORKERS)
+    for user, assignments in zip(users, all_assignments):
         # fetch data and store for later writing
-        for k, v in get_user_assignment_data(company_id, user.id).items():
+        for k, v in assignments.items():
             logger().debug(
                 "found %d %s assignments for %s %s (id: %d)",
                 len(v), k, user.first_name, user.last_name, user.id)
@@ -357,7 +428,9 @@ def get_receipt_data(company_id, location_id, date_args):
         kwargs['receipt_date[gte]'] = date_args['start']
         kwargs['receipt_date[lte]'] = date_args['end']
     kwargs['location_id'] = location_id
-    return lib7shifts.list_receipts(get_7shifts(), company_id, **kwargs)
+    kwargs['prefetch'] = PREFETCH_PAGES
+    return lib7shifts.list_receipts(
+        get_7shifts(), company_id, raw=True, **kwargs)
 
 
 def _sync_receipt_chunk(chunk):
@@ -376,42 +449,67 @@ def sync_receipt_data(company_id, date_args, chunk_size=1000):
     locations = get_location_data(company_id)
     written = 0
     for location in locations.itertuples():
-        logger().info('gathering receipt data for location: %s',
-                      location.name)
-        chunk = []
-        data = get_receipt_data(company_id, location.id, date_args)
-        while True:
-            try:
-                chunk.append(next(data))
-            except StopIteration:
+        written += sync_location_receipt_data(
+            company_id, location,
+            get_location_dates(company_id, location, date_args), chunk_size)
+    return written
+
+
+def sync_location_receipt_data(company_id, location, date_args,
+                               chunk_size=1000):
+    """Sync the receipts of one location, for the dates in `date_args` in
+    the location's timezone (see :func:`get_location_dates`)"""
+    logger().info('gathering receipt data for location: %s', location.name)
+    written = 0
+    chunk = []
+    data = get_receipt_data(company_id, location.id, date_args)
+    while True:
+        try:
+            chunk.append(next(data))
+        except StopIteration:
+            written += _sync_receipt_chunk(chunk)
+            break
+        else:
+            if len(chunk) >= chunk_size:
                 written += _sync_receipt_chunk(chunk)
-                break
-            else:
-                if len(chunk) >= chunk_size:
-                    written += _sync_receipt_chunk(chunk)
-                    del chunk[:]
+                del chunk[:]
     return written
 
 
-def get_shift_data(company_id, date_args):
+def get_shift_data(company_id, date_args, location_id=None):
     kwargs = {}
+    if location_id is not None:
+        kwargs['location_id'] = location_id
     if 'modified_since' in date_args:
         kwargs['modified_since'] = date_args['modified_since']
     else:
         kwargs['start[gte]'] = date_args['start']
         kwargs['start[lte]'] = date_args['end']
+    kwargs['prefetch'] = PREFETCH_PAGES
     return pandas.DataFrame.from_dict(
-        lib7shifts.list_shifts(get_7shifts(), company_id, **kwargs))
+        lib7shifts.list_shifts(
+            get_7shifts(), company_id, raw=True, **kwargs))
 
 
 def sync_shift_data(company_id, dates):
     """Get the pandas data frame from 7shifts API data and sync it to the
-    database.
+    database, location by location.
     """
-    data = get_shift_data(company_id, dates)
+    written = 0
+    for location in get_location_data(company_id).itertuples():
+        written += sync_location_shift_data(
+            company_id, location,
+            get_location_dates(company_id, location, dates))
+    return written
+
+
+def sync_location_shift_data(company_id, location, dates):
+    """Sync the shifts of one location, for the days in `dates` in the
+    location's timezone (see :func:`get_location_dates`)"""
+    data = get_shift_data(company_id, dates, location.id)
     logger().info(
-        "retrieved %d shifts for company %d based on specified parameters",
-        len(data), company_id)
+        "retrieved %d shifts for company %d, location %s",
+        len(data), company_id, location.name)
     if len(data) > 0:
         data.drop(columns=['breaks', ], inplace=True)
         data.set_index('id', drop=True, inplace=True)
@@ -419,12 +517,14 @@ def sync_shift_data(company_id, dates):
     return 0
 
 
-def get_punch_data(company_id, date_args, approved=None):
+def get_punch_data(company_id, date_args, approved=None, location_id=None):
     """Get the punch data from the API and return it as a Pandas dataframe.
     If approved is None, then both approved and unapproved punches are
     included. Setting 'approved' to any other value results in only approved
     punches being returned (that's how the API works right now)."""
     kwargs = {}
+    if location_id is not None:
+        kwargs['location_id'] = location_id
     if 'modified_since' in date_args:
         kwargs['modified_since'] = date_args['modified_since']
         kwargs['localize_search_time'] = True
@@ -433,20 +533,35 @@ def get_punch_data(company_id, date_args, approved=None):
         kwargs['clocked_in[lte]'] = date_args['end']
     if approved is not None:
         kwargs['approved'] = approved
+    kwargs['prefetch'] = PREFETCH_PAGES
     return pandas.DataFrame.from_dict(
-        lib7shifts.list_punches(get_7shifts(), company_id, **kwargs))
+        lib7shifts.list_punches(
+            get_7shifts(), company_id, raw=True, **kwargs))
 
 
 def sync_punch_data(company_id, dates, approved=None):
     """Get the pandas data frame from 7shifts API data and sync it to the
     database. If approved is None, then both approved and unapproved punches
     are included. If approved is anything else, only approved punches are
-    synced.
+    synced. Punches are synced location by location.
     """
-    data = get_punch_data(company_id, dates, approved=approved)
+    written = 0
+    for location in get_location_data(company_id).itertuples():
+        written += sync_location_punch_data(
+            company_id, location,
+            get_location_dates(company_id, location, dates), approved)
+    return written
+
+
+def sync_location_punch_data(company_id, location, dates, approved=None):
+    """Sync the punches of one location, for the days in `dates` in the
+    location's timezone (see :func:`get_location_dates`), see
+    :func:`sync_punch_data`"""
+    data = get_punch_data(
+        company_id, dates, approved=approved, location_id=location.id)
     logger().info(
-        "retrieved %d time punch rows for company %d with specified params",
-        len(data), company_id)
+        "retrieved %d time punch rows for company %d, location %s",
+        len(data), company_id, location.name)
     if len(data) > 0:
         data.set_index('id', drop=True, inplace=True)
         clean = data.drop(columns=['breaks', ])  # breaks can't insert directly
@@ -464,6 +579,19 @@ def sync_daily_sales_and_labor_data(company_id, dates):
     """Get the pandas data frame from 7shifts API data and sync it to the
     database.
     """
+    # location data is required for daily sales and labour
+    locations = get_location_data(company_id)
+    written = 0
+    for location in locations.itertuples():
+        written += sync_location_daily_sales_and_labor_data(
+            company_id, location,
+            get_location_dates(company_id, location, dates))
+    return written
+
+
+def sync_location_daily_sales_and_labor_data(company_id, location, dates):
+    """Sync the daily sales and labour of one location, for the days in
+    `dates` in the location's timezone (see :func:`get_location_dates`)"""
     kwargs = {}
     if 'start' in dates:
         kwargs['start_date'] = to_y_m_d(dates['start'])
@@ -471,31 +599,132 @@ def sync_daily_sales_and_labor_data(company_id, dates):
     else:
         kwargs['start_date'] = to_y_m_d(dates['modified_since'])
         kwargs['end_date'] = to_y_m_d(yesterday())
+    kwargs['location_id'] = location.id
+    data = get_daily_sales_and_labor_data(kwargs)
+    logger().info(
+        "found %d sales + labour records for company %d, location %s",
+        len(data), company_id, location.name)
+    if len(data) > 0:
+        data['location_id'] = location.id
+        # upserts require a single unique index, this helps with that
+        data['index_col'] = data.apply(
+            lambda r: f'{r.location_id}-{r.date}', 1)
+        data.set_index(['index_col', 'location_id', 'date'],
+                       drop=True, inplace=True)
+        return db_upsert('daily_sales_and_labor', data)
+    return 0
 
-    # location data is required for daily sales and labour
-    locations = get_location_data(company_id)
-    written = 0
+
+def run_stage(message, stage, *args, **kwargs):
+    """Run one stage of the sync, `stage` being called with args and kwargs,
+    and log `message` formatted with the count(s) it returns. If the stage
+    fails because the circuit for one of its endpoints is open (the API is
+    failing for that endpoint), it is skipped with a warning so that the
+    other stages can go ahead. Returns the stage's result, or None if it
+    was skipped."""
+    try:
+        result = stage(*args, **kwargs)
+    except lib7shifts.exceptions.CircuitOpenError as error:
+        logger().warning("Skipped %s: %s", stage.__name__, error)
+        return None
+    counts = result if isinstance(result, tuple) else (result, )
+    logger().info(message, *counts)
+    return result
+
+
+def schedule_company(scheduler, company_id, dates, args):
+    """Add the work units to sync the data of one company to `scheduler`,
+    as selected by the command-line `args`. Shifts, punches, receipts and
+    daily sales and labour are synced by location, so that a slow location
+    doesn't hold up the others, and so that each location's days are those
+    of its own timezone.
+
+    The company's locations are listed once, here, and the stages that need
+    them are given them (with the dates of each location worked out once);
+    the locations stage then syncs all of them, even with --modified-since.
+    The stages are otherwise independent: each one lists what it needs from
+    the API and upserts its own tables, none reading what another wrote, so
+    they run concurrently and in any order."""
+    def add(name, message, stage, *stage_args, **stage_kwargs):
+        scheduler.add(company_id, name, run_stage, message, stage,
+                      *stage_args, **stage_kwargs)
+
+    by_location = []
+    if args.get('all') or args.get('shifts'):
+        by_location.append(('shifts', "Synced %d shifts",
+                            sync_location_shift_data, {}))
+    if args.get('all') or args.get('punches'):
+        by_location.append((
+            'approved punches', "Synced %d approved time punches",
+            sync_location_punch_data, {'approved': True}))
+        if args.get('--unapproved'):
+            by_location.append((
+                'all punches', "Synced %d approved/non-approved time punches",
+                sync_location_punch_data, {'approved': None}))
+    if args.get('all') or args.get('receipts'):
+        by_location.append(('receipts', "Synced %d receipts",
+                            sync_location_receipt_data, {}))
+    if args.get('all') or args.get('daily_sales_and_labor'):
+        by_location.append((
+            'daily sales and labour',
+            "Synced %d daily sales and labour records",
+            sync_location_daily_sales_and_labor_data, {}))
+    sync_locations = args.get('all') or args.get('locations')
+    locations = None
+    if by_location or sync_locations:
+        try:
+            # all of them, since the stages by location need every one
+            locations = get_location_data(company_id)
+        except lib7shifts.exceptions.CircuitOpenError as error:
+            logger().warning(
+                "Skipped location data for company %s: %s", company_id, error)
+    if sync_locations and locations is not None:
+        add('locations', "Synced %d locations",
+            sync_location_data, company_id, dates, locations)
+    if args.get('all') or args.get('departments'):
+        add('departments', "Synced %d departments",
+            sync_deparment_data, company_id, dates)
+    if args.get('all') or args.get('roles'):
+        add('roles', "Synced %d roles with %d stations",
+            sync_role_data, company_id, dates)
+    if args.get('all') or args.get('users'):
+        add('active users', "Synced %d active users",
+            sync_user_data, company_id, dates, 'active')
+        if args.get("--inactive-users"):
+            add('inactive users', "Synced %d inactive users",
+                sync_user_data, company_id, dates, 'inactive')
+    if args.get('all') or args.get('wages'):
+        add('active user wages', "Synced %d wages for active users",
+            sync_wage_data, company_id, dates, 'active')
+        if args.get("--inactive-users"):
+            add('inactive user wages', "Synced %d wages for inactive users",
+                sync_wage_data, company_id, dates, 'inactive')
+    if args.get('all') or args.get('assignments'):
+        add('active user assignments',
+            "Synced %d assignments for active users",
+            sync_assignment_data, company_id, dates, 'active')
+        if args.get("--inactive-users"):
+            add('inactive user assignments',
+                "Synced %d assignments for inactive users",
+                sync_assignment_data, company_id, dates, 'inactive')
+    if not by_location or locations is None:
+        return
     for location in locations.itertuples():
-        kwargs['location_id'] = location.id
-        data = get_daily_sales_and_labor_data(kwargs)
-        logger().info(
-            "found %d sales + labour records for company %d, location %s",
-            len(data), company_id, location.name)
-        if len(data) > 0:
-            data['location_id'] = location.id
-            # upserts require a single unique index, this helps with that
-            data['index_col'] = data.apply(
-                lambda r: f'{r.location_id}-{r.date}', 1)
-            data.set_index(['index_col', 'location_id', 'date'],
-                           drop=True, inplace=True)
-            written += db_upsert('daily_sales_and_labor', data)
-    return written
+        local_dates = get_location_dates(company_id, location, dates)
+        for name, message, stage, kwargs in by_location:
+            add(f'{name} for {location.name}', message,
+                stage, company_id, location, local_dates, **kwargs)
 
 
 def main(**args):
     if args.get('--debug-db'):
         logging.getLogger('sqlalchemy.engine').setLevel(logging.DEBUG)
     get_db(args.get('--db'))
+    get_timezones(zoneinfo.ZoneInfo(args.get('--tz')))
+    metrics = None
+    if args.get('--metrics'):
+        metrics = lib7shifts.instrumentation.MetricsCollector()
+        get_7shifts().add_hook(metrics)
     dates = parse_dates(args)
     companies = None
     if args.get('--company-id'):
@@ -504,52 +733,18 @@ def main(**args):
         companies = get_all_company_data()
     if args.get('all') or args.get('companies'):
         sync_data = companies.copy()
-        logger().info("Synced %d companies", sync_company_data(sync_data))
+        run_stage("Synced %d companies", sync_company_data, sync_data)
+    # work on every company at once, so that small ones aren't held up by
+    # large ones
+    scheduler = lib7shifts.scheduler.FairScheduler(
+        max_workers=int(args.get('--workers') or 4))
     for company in companies.itertuples():
-        if args.get('all') or args.get('locations'):
-            logger().info("Synced %d locations",
-                          sync_location_data(company.id, dates))
-        if args.get('all') or args.get('departments'):
-            logger().info("Synced %d departments",
-                          sync_deparment_data(company.id, dates))
-        if args.get('all') or args.get('roles'):
-            logger().info("Synced %d roles with %d stations",
-                          *sync_role_data(company.id, dates))
-        if args.get('all') or args.get('users'):
-            logger().info("Synced %d active users",
-                          sync_user_data(company.id, dates, 'active'))
-            if args.get("--inactive-users"):
-                logger().info("Synced %d inactive users",
-                              sync_user_data(company.id, dates, 'inactive'))
-        if args.get('all') or args.get('wages'):
-            logger().info("Synced %d wages for active users",
-                          sync_wage_data(company.id, dates, 'active'))
-            if args.get("--inactive-users"):
-                logger().info("Synced %d wages for inactive users",
-                              sync_wage_data(company.id, dates, 'inactive'))
-        if args.get('all') or args.get('assignments'):
-            logger().info("Synced %d assignments for active users",
-                          sync_assignment_data(company.id, dates, 'active'))
-            if args.get("--inactive-users"):
-                logger().info("Synced %d assignments for inactive users",
-                              sync_assignment_data(
-                                  company.id, dates, 'inactive'))
-        if args.get('all') or args.get('receipts'):
-            logger().info("Synced %d receipts",
-                          sync_receipt_data(company.id, dates))
-        if args.get('all') or args.get('shifts'):
-            logger().info("Synced %d shifts",
-                          sync_shift_data(company.id, dates))
-        if args.get('all') or args.get('punches'):
-            logger().info("Synced %d approved time punches",
-                          sync_punch_data(
-                              company.id, dates, approved=True))
-            if args.get('--unapproved'):
-                logger().info("Synced %d approved/non-approved time punches",
-                              sync_punch_data(
-                                  company.id, dates, approved=None))
-        if args.get('all') or args.get('daily_sales_and_labor'):
-            logger().info("Synced %d daily sales and labour records",
-                          sync_daily_sales_and_labor_data(
-                              company.id, dates))
+        schedule_company(scheduler, company.id, dates, args)
+    failed = [result for result in scheduler.run() if not result.ok]
+    if metrics is not None:
+        logger().info("API request statistics:\n%s", metrics.report())
+    if failed:
+        logger().error("%d of %d sync tasks failed", len(failed),
+                       scheduler.total)
+        return 1
     return 0
@@ -19,11 +19,15 @@ def get_company(client, company_id):
         raise exceptions.EntityNotFoundError('Company', company_id)
 
 
-def list_companies(client):
+def list_companies(client, raw=False, lazy=False):
     """Implements the 'List' operation for 7shifts companies.
+
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`Company` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
     """
-    for item in client.list(ENDPOINT)['data']:
-        yield Company(**item)
+    yield from base.iter_objects(
+        client.list(ENDPOINT)['data'], Company, raw, lazy)
 
 
 class Company(base.APIObject):
@@ -0,0 +1,209 @@
+"""
+Helpers for making API calls from many threads at once.
+
+When work fans out over threads, the same read is often wanted by several
+threads at the same moment (eg. the user, role and location of many punches
+belonging to the same few people). A :class:`SingleFlight` lets the first
+caller make the request while the others wait for, and share, its result.
+
+How many threads should be in flight at once depends on how 7shifts is doing
+at that moment. An :class:`AIMDLimiter`, given to the client with the
+`concurrency_limiter` kwarg, finds out as it goes: it lets one more request
+into flight for every window of healthy responses, and halves the number
+allowed whenever the API answers 429 or 5xx, or slows down. Fan-out code,
+such as :func:`fan_out` or :func:`lib7shifts.base.page_api_get_results_sharded`,
+can then use as many threads as it likes; the limiter holds back the ones
+beyond the current limit::
+
+    limiter = AIMDLimiter(max_limit=32)
+    client = lib7shifts.get_client(concurrency_limiter=limiter)
+    wages = list(fan_out(
+        lambda user: lib7shifts.list_user_wages(client, 1, user['id']),
+        users, max_workers=limiter.max_limit))
+
+A limiter may be shared by several clients that use the same API budget.
+"""
+import copy
+import time
+import threading
+import concurrent.futures
+
+
+class _Call(object):
+    "A call in progress, shared by the caller making it and any waiters"
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls with the same key: while a call is in
+    progress, further calls with its key wait for it to finish and receive its
+    result (or exception) instead of making the call again. Once a call has
+    finished, the next call with its key is made afresh; nothing is cached.
+
+    Each waiter receives its own copy of the result, made with `copy`
+    (:func:`copy.deepcopy` by default), so that callers are free to modify
+    what they get back. Pass ``copy=None`` to hand every caller the very
+    same object instead, if none of them modify it. Copies are only made
+    when a call had waiters.
+
+    Safe to share between threads and clients."""
+
+    def __init__(self, copy=copy.deepcopy):
+        self.copy = copy
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(coalesced={})".format(
+            self.__class__.__name__, self.coalesced)
+
+    def do(self, key, func, *args, **kwargs):
+        """Call ``func(*args, **kwargs)`` unless a call with `key` is already
+        in progress, and return its result (or a copy of it, see
+        :attr:`copy`)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            if self.copy is None:
+                return call.result
+            return self.copy(call.result)
+        result = None
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            # no more waiters can join now; keep a pristine copy for them,
+            # since the caller may modify the result as soon as it's returned
+            if call.waiters and call.error is None:
+                call.result = result if self.copy is None \
+                    else self.copy(result)
+            call.done.set()
+        return result
+
+
+class AIMDLimiter(object):
+    """Limits the number of requests in flight at once, adjusting the limit
+    with additive increase, multiplicative decrease (AIMD):
+
+    - each healthy response while the limit is in full use adds
+      ``increase / limit``, so the limit grows by `increase` for every
+      window of `limit` responses
+    - a 429, 5xx or network error, or a smoothed latency more than
+      `latency_tolerance` times the fastest seen for the endpoint,
+      multiplies the limit by `backoff`. Responses to requests that were
+      sent before the last cut don't cut it again.
+
+    The limit stays between `min_limit` and `max_limit`. Use as a context
+    manager (or call :meth:`acquire` and :meth:`release`) around each
+    request, and report each outcome to :meth:`record`; the client does both
+    when given the limiter. Safe to share between threads and clients.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, increase=1.0,
+                 backoff=0.5, latency_tolerance=2.0, clock=time.monotonic):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        #: The number of times the limit was cut
+        self.decreases = 0
+        self._clock = clock
+        self._last_decrease = None
+        self._latency = {}
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return "{}(limit={:.1f}, in_flight={})".format(
+            self.__class__.__name__, self.limit, self.in_flight)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def acquire(self):
+        "Wait until another request may be in flight, and count it"
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        "Count a request as finished"
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def record(self, event):
+        """Adjust the limit for a finished
+        :class:`lib7shifts.instrumentation.RequestEvent`. Must be called
+        before the request's slot is released."""
+        congested = event.error is not None or event.status == 429 or \
+            (event.status or 0) >= 500
+        if not congested and event.duration is not None:
+            congested = self._slow(event.endpoint, event.duration)
+        with self._cond:
+            if congested:
+                sent = self._clock() - (event.duration or 0)
+                if self._last_decrease is None or sent >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = self._clock()
+                    self.decreases += 1
+            elif self.in_flight >= int(self.limit):
+                before = int(self.limit)
+                self.limit = min(
+                    self.max_limit, self.limit + self.increase / self.limit)
+                if int(self.limit) > before:
+                    self._cond.notify(int(self.limit) - before)
+
+    def _slow(self, endpoint, duration):
+        """Track the latency of `endpoint`, returning True if it has risen
+        past `latency_tolerance` times its baseline"""
+        with self._cond:
+            baseline, smoothed = self._latency.get(
+                endpoint, (duration, duration))
+            smoothed = 0.8 * smoothed + 0.2 * duration
+            # let the baseline creep up, in case the fastest was a fluke
+            baseline = min(duration, baseline * 1.01)
+            self._latency[endpoint] = (baseline, smoothed)
+            return smoothed > self.latency_tolerance * max(baseline, 0.001)
+
+
+def fan_out(func, items, max_workers=8):
+    """Call `func` with each of `items` from a pool of `max_workers` threads,
+    and yield the results in the order of `items`. The first exception
+    raised by `func` is raised when its result is reached, and the calls
+    not yet started are cancelled."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = [executor.submit(func, item) for item in items]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
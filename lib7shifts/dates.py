@@ -1,11 +1,26 @@
 """
 Utilities for handling dates from the 7Shifts API
+
+Besides the functions for single values, :func:`to_datetimes`,
+:func:`to_dates` and :func:`iso8601_dts` convert whole columns at once.
+They require the `pandas` package, which is not a dependency of lib7shifts.
 """
+import time
 import datetime
 
 DEFAULT_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 DEFAULT_DATE_FORMAT = '%Y-%m-%d'
 
+#: Seconds for which :func:`get_local_tz` reuses the timezone it looked up,
+#: short enough that a change of daylight saving time is picked up promptly
+LOCAL_TZ_TTL = 60
+
+#: The clocked_out value of a punch that is still open
+OPEN_PUNCH = '0000-00-00 00:00:00'
+
+#: The time at which the cached local timezone expires, and the timezone
+_local_tz = (0.0, None)
+
 
 class DateTime7Shifts(datetime.datetime):
     """Override representation of dates in datetime objects to match
@@ -43,24 +58,63 @@ def yesterday(tzinfo=None):
 
 
 def get_local_tz():
-    "Return the current local timezone"
-    return datetime.datetime.utcnow().astimezone().tzinfo
+    """Return the current local timezone. The answer is cached for
+    :attr:`LOCAL_TZ_TTL` seconds, since looking it up is relatively slow."""
+    global _local_tz
+    expires, tzinfo = _local_tz
+    now = time.monotonic()
+    if tzinfo is None or now >= expires:
+        tzinfo = datetime.datetime.utcnow().astimezone().tzinfo
+        _local_tz = (now + LOCAL_TZ_TTL, tzinfo)
+    return tzinfo
 
 
 def to_datetime(date_string, tzinfo=datetime.timezone.utc):
     """Given a datetime string in API format, return a
     :class:`datetime.datetime` object corresponding to the date and time"""
-    date = DateTime7Shifts.strptime(
-        date_string, DEFAULT_DATETIME_FORMAT)
-    return date.replace(tzinfo=tzinfo)
+    if _is_fixed(date_string, _DATETIME_LAYOUT):
+        # the API's fixed format, which fromisoformat reads far quicker
+        # than strptime
+        try:
+            return DateTime7Shifts.fromisoformat(date_string).replace(
+                tzinfo=tzinfo)
+        except ValueError:
+            pass  # for strptime's error message
+    return DateTime7Shifts.strptime(
+        date_string, DEFAULT_DATETIME_FORMAT).replace(tzinfo=tzinfo)
 
 
 def to_date(date_string, tzinfo=datetime.timezone.utc):
     """Given a date string in YYYY-MM-DD format, return a
     :class:`datetime.datetime` object corresponding to the date at 12AM"""
-    date = DateTime7Shifts.strptime(
-        date_string, DEFAULT_DATE_FORMAT)
-    return date.replace(tzinfo=tzinfo)
+    if _is_fixed(date_string, _DATE_LAYOUT):
+        try:
+            return DateTime7Shifts.fromisoformat(date_string).replace(
+                tzinfo=tzinfo)
+        except ValueError:
+            pass
+    return DateTime7Shifts.strptime(
+        date_string, DEFAULT_DATE_FORMAT).replace(tzinfo=tzinfo)
+
+
+#: The length of the API's date and datetime formats, and the positions of
+#: their separators
+_DATE_LAYOUT = (10, ((4, '-'), (7, '-')))
+_DATETIME_LAYOUT = (19, ((4, '-'), (7, '-'), (10, ' '), (13, ':'), (16, ':')))
+
+
+def _is_fixed(date_string, layout):
+    """Returns True if `date_string` has the length and separators of
+    `layout`. fromisoformat reads those strings just as strptime does, but
+    also accepts other ISO 8601 forms (week dates, UTC offsets, other
+    separators...), which must still be left to strptime to reject."""
+    length, separators = layout
+    if len(date_string) != length:
+        return False
+    for index, char in separators:
+        if date_string[index] != char:
+            return False
+    return True
 
 
 def to_local_date(date_string):
@@ -132,3 +186,106 @@ def iso8601_dt(dt_obj, tzinfo=None):
     return datetime.datetime.fromtimestamp(
         dt_obj.timestamp(), tzinfo).isoformat(
             timespec='seconds').replace('+00:00', 'Z')
+
+
+def from_iso8601_dt(date_string):
+    """The inverse of :func:`iso8601_dt`: parse an ISO 8601 date-time string
+    (including the Zulu form) into a timezone-aware :class:`DateTime7Shifts`
+    object."""
+    dt_obj = DateTime7Shifts.fromisoformat(date_string.replace('Z', '+00:00'))
+    if dt_obj.tzinfo is None:
+        dt_obj = dt_obj.replace(tzinfo=datetime.timezone.utc)
+    return dt_obj
+
+
+def to_datetimes(values, tzinfo=datetime.timezone.utc,
+                 date_format=DEFAULT_DATETIME_FORMAT):
+    """The vectorized form of :func:`to_datetime`: given a sequence, numpy
+    array or pandas Series of datetime strings in API format, return their
+    timezone-aware datetime64 values in `tzinfo`, parsed in one pass. None
+    and the :attr:`OPEN_PUNCH` value of a punch that is still clocked in
+    become NaT.
+
+    Returns a Series (with the same index) when given a Series, otherwise a
+    :class:`pandas.DatetimeIndex`. Raises ValueError for any other value
+    that isn't in `date_format`, and for local times that don't exist or are
+    ambiguous in `tzinfo` because of daylight saving time.
+    """
+    pandas = _pandas()
+    series = _as_series(pandas, values)
+    series = series.where(series != OPEN_PUNCH)
+    parsed = pandas.to_datetime(series, format=date_format)
+    return _like(pandas, values, parsed.dt.tz_localize(tzinfo))
+
+
+def to_dates(values, tzinfo=datetime.timezone.utc):
+    """The vectorized form of :func:`to_date`, for YYYY-MM-DD strings, see
+    :func:`to_datetimes`"""
+    return to_datetimes(values, tzinfo, date_format=DEFAULT_DATE_FORMAT)
+
+
+def iso8601_dts(values, tzinfo=None):
+    """The vectorized form of :func:`iso8601_dt`: given a sequence, array or
+    Series of datetimes (datetime objects or datetime64 values), return the
+    ISO 8601 strings the API expects for them, in UTC or `tzinfo`. As for
+    :func:`iso8601_dt`, timezone-unaware values are taken to be in the local
+    timezone. NaT and None become None.
+
+    Returns a Series (with the same index) when given a Series, otherwise a
+    :class:`pandas.Index`.
+    """
+    pandas = _pandas()
+    series = _as_series(pandas, values)
+    try:
+        times = pandas.to_datetime(series)
+    except (TypeError, ValueError):
+        # timezone-aware values with different offsets
+        times = pandas.to_datetime(series, utc=True)
+    if times.dt.tz is None:
+        times = times.dt.tz_localize(get_local_tz())
+    utc = times.dt.tz_convert(datetime.timezone.utc).dt.tz_localize(None)
+    local = times.dt.tz_convert(
+        tzinfo or datetime.timezone.utc).dt.tz_localize(None)
+    text = pandas.Series(local.to_numpy('datetime64[s]').astype(str),
+                         index=series.index, dtype=object)
+    # offsets are few, so format each distinct one only once
+    offsets = (local - utc).dt.total_seconds()
+    suffixes = dict((offset, _iso8601_offset(offset))
+                    for offset in offsets.dropna().unique())
+    text = text + offsets.map(suffixes)
+    return _like(pandas, values, text.astype(object).where(
+        times.notna(), None))
+
+
+def _iso8601_offset(seconds):
+    "Format a UTC offset in seconds as iso8601_dt does"
+    if not seconds:
+        return 'Z'
+    sign = '-' if seconds < 0 else '+'
+    minutes = int(abs(seconds)) // 60
+    return '{}{:02d}:{:02d}'.format(sign, minutes // 60, minutes % 60)
+
+
+def _pandas():
+    "Import pandas for the vectorized functions, which require it"
+    try:
+        import pandas
+    except ImportError:
+        raise RuntimeError(
+            "The pandas package is required for vectorized date conversion")
+    return pandas
+
+
+def _as_series(pandas, values):
+    "Returns `values` as a pandas Series, without copying them if possible"
+    if isinstance(values, pandas.Series):
+        return values
+    return pandas.Series(values)
+
+
+def _like(pandas, values, result):
+    """Returns the `result` Series as a Series if `values` was one, or as a
+    pandas Index otherwise"""
+    if isinstance(values, pandas.Series):
+        return result
+    return pandas.Index(result)
@@ -0,0 +1,184 @@
+"""
+Pluggable JSON decoding for API responses.
+
+Large responses (receipts, hours and wages reports) spend a good share of
+their time in JSON decoding. If `orjson` or `msgspec` is installed, the client
+uses it to decode response bodies straight from the bytes received, which is
+several times faster than the standard library. Otherwise it falls back to
+the standard :mod:`json` module. A specific decoder may be chosen with the
+client's `json_decoder` kwarg, either by name or by passing any callable that
+takes a bytes object and returns the decoded data::
+
+    client = lib7shifts.get_client(json_decoder='json')
+
+For very large documents, :func:`iter_json_array` decodes one array of a
+JSON object incrementally from a stream of chunks, so that only one element
+needs to be held in memory at a time.
+"""
+import json
+import codecs
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+#: Decoder names in order of preference
+PREFERENCE = ('orjson', 'msgspec', 'json')
+
+
+def available():
+    "Returns a tuple with the names of the decoders that can be used"
+    found = []
+    if orjson is not None:
+        found.append('orjson')
+    if msgspec is not None:
+        found.append('msgspec')
+    found.append('json')
+    return tuple(found)
+
+
+def get_decoder(name=None, encoding='utf8'):
+    """Returns a function that decodes a JSON document from bytes.
+
+    - name: one of 'orjson', 'msgspec' or 'json' (the standard library). If
+      not given, the fastest available decoder is used.
+    - encoding: the character encoding of the response bodies. The fast
+      decoders only support UTF-8, so the standard library is used for any
+      other encoding.
+
+    Raises a RuntimeError if the named decoder isn't installed.
+    """
+    utf8 = encoding.lower().replace('-', '') == 'utf8'
+    if name is None:
+        name = 'json'
+        if utf8:
+            name = next(
+                decoder for decoder in PREFERENCE if decoder in available())
+    if name not in available():
+        raise RuntimeError("JSON decoder '{}' is not available".format(name))
+    if name != 'json' and not utf8:
+        raise RuntimeError(
+            "JSON decoder '{}' only supports UTF-8".format(name))
+    if name == 'orjson':
+        return orjson.loads
+    if name == 'msgspec':
+        return msgspec.json.Decoder().decode
+
+    def decode(data):
+        return json.loads(data.decode(encoding))
+    return decode
+
+
+#: Characters that may follow a complete JSON value
+_DELIMITERS = ' \t\r\n,:]}'
+
+
+class _ChunkBuffer(object):
+    """Text decoded from a stream of byte chunks, consumed from the front.
+    Used by :func:`iter_json_array`."""
+
+    def __init__(self, chunks, encoding):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self.text = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def more(self):
+        """Read at least enough chunks to double the unconsumed text (so that
+        repeated attempts at decoding a large value stay linear). Returns
+        False if the stream has already ended."""
+        if self.exhausted:
+            return False
+        pending = [self.text[self.pos:]]
+        wanted = max(1, len(pending[0]))
+        received = 0
+        while received < wanted:
+            try:
+                text = self._decoder.decode(next(self._chunks))
+            except StopIteration:
+                pending.append(self._decoder.decode(b'', final=True))
+                self.exhausted = True
+                break
+            pending.append(text)
+            received += len(text)
+        self.text = ''.join(pending)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at the end
+        of the stream"""
+        while True:
+            while self.pos < len(self.text) and \
+                    self.text[self.pos] in _DELIMITERS[:4]:
+                self.pos += 1
+            if self.pos < len(self.text) or not self.more():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, characters):
+        "Consume and return the next character, which must be in characters"
+        char = self.peek()
+        if not char or char not in characters:
+            raise json.JSONDecodeError(
+                "Expecting one of {!r}".format(characters), self.text,
+                self.pos)
+        self.pos += 1
+        return char
+
+    def value(self, decoder):
+        "Decode and consume the next complete JSON value"
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # a number at the end of the text may continue in the next chunk
+            # (eg. '1' then '.5'), so only accept values followed by a
+            # delimiter
+            if (end < len(self.text) and self.text[end] in _DELIMITERS) \
+                    or not self.more():
+                self.pos = end
+                return value
+
+
+def iter_json_array(chunks, key, rest=None, encoding='utf8'):
+    """Incrementally decode a JSON object arriving as an iterable of byte
+    `chunks`, yielding each element of the array found under `key` as soon as
+    it has been received. Only the top level of the object is scanned, and
+    other top-level values are decoded whole, then stored in the `rest`
+    dictionary if one is given (it is complete once iteration finishes).
+
+    Raises :class:`json.JSONDecodeError` if the document is malformed or the
+    stream ends early.
+    """
+    decoder = json.JSONDecoder()
+    buffer = _ChunkBuffer(chunks, encoding)
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+    while True:
+        name = buffer.value(decoder)
+        buffer.expect(':')
+        if name == key and buffer.peek() == '[':
+            buffer.expect('[')
+            if buffer.peek() == ']':
+                buffer.expect(']')
+            else:
+                while True:
+                    yield buffer.value(decoder)
+                    if buffer.expect(',]') == ']':
+                        break
+        else:
+            value = buffer.value(decoder)
+            if rest is not None:
+                rest[name] = value
+        if buffer.expect(',}') == '}':
+            return
@@ -22,7 +22,8 @@ def get_department(client, company_id, department_id):
         raise exceptions.EntityNotFoundError('Department', department_id)
 
 
-def list_departments(client, company_id, **kwargs):
+def list_departments(client, company_id, raw=False, lazy=False,
+                     **kwargs):
     """Implements the 'List' operation for 7shifts departments, returning the
     departments associated with the company you've authenticated with (by
     default).
@@ -33,13 +34,16 @@ def list_departments(client, company_id, **kwargs):
     - modified_since: a YYYY-MM-DD date string
     - location_id: filter to a specific location
 
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`Department` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
+
     Returns an iterable of :class:`Department` objects.
     """
-    if 'limit' not in kwargs:
-        kwargs['limit'] = 100
-    for item in base.page_api_get_results(
-            client, ENDPOINT.format(company_id=company_id), **kwargs):
-        yield Department(**item)
+    kwargs.setdefault('default_limit', 100)
+    yield from base.iter_objects(base.page_api_get_results(
+        client, ENDPOINT.format(company_id=company_id), **kwargs),
+        Department, raw, lazy)
 
 
 class Department(base.APIObject):
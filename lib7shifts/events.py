@@ -11,7 +11,7 @@ from . import exceptions
 ENDPOINT = '/v2/company/{company_id}/events'
 
 
-def list_events(client, company_id, **kwargs):
+def list_events(client, company_id, raw=False, lazy=False, **kwargs):
     """Retrieve a list of schedule events for the given timeframe.
 
     Supported kwargs::
@@ -20,14 +20,16 @@ def list_events(client, company_id, **kwargs):
         - start_date: a YYYY-MM-DD formatted date (required)
         - end_date: a YYYY-MM-DD formatted date (required)
 
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`Event` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
     """
     if 'start_date' not in kwargs:
         raise RuntimeError("start_date not provided for list_events, required")
     if 'end_date' not in kwargs:
         raise RuntimeError("end_date not provided for list_events, required")
-    for item in client.list(ENDPOINT.format(
-            company_id=company_id), fields=kwargs)['data']:
-        yield Event(**item)
+    yield from base.iter_objects(client.list(ENDPOINT.format(
+        company_id=company_id), fields=kwargs)['data'], Event, raw, lazy)
 
 
 def get_event(client, company_id, event_id):
@@ -9,6 +9,11 @@ class APIError(Exception):
     def __init__(self, status, response=None):
         self.status = status
         self._response = None
+        #: Set by :func:`lib7shifts.base.page_api_get_results` to the cursor
+        #: of the page that failed, so that a listing can be resumed
+        self.cursor = None
+        #: The headers of the response (eg. Retry-After), if it had any
+        self.headers = getattr(response, 'headers', None)
         self.response = response.data
 
     @property
@@ -37,6 +42,32 @@ class APIError(Exception):
         return self.__str__()
 
 
+class CircuitOpenError(Exception):
+    """Raised instead of making a request to an endpoint whose circuit is
+    open (see :mod:`lib7shifts.circuitbreaker`). `retry_after` is the number
+    of seconds until the endpoint will be probed again."""
+
+    def __init__(self, endpoint, retry_after):
+        self.endpoint = endpoint
+        self.retry_after = max(0.0, retry_after)
+
+    def __str__(self):
+        return "circuit open for {} (retry in {:.0f}s)".format(
+            self.endpoint, self.retry_after)
+
+
+class ReplayMissError(Exception):
+    """Raised by :class:`lib7shifts.transport.ReplayTransport` for a request
+    that isn't in its cassette."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+
+    def __str__(self):
+        return "no recorded response for {} {}".format(self.method, self.path)
+
+
 class EntityNotFoundError(Exception):
 
     def __init__(self, entity_type, entity_id):
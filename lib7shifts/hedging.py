@@ -0,0 +1,92 @@
+"""
+Hedged GET requests, to cut the tail latency of reads.
+
+Most pages of a listing come back quickly, but the odd one can take many
+times longer, and stalls everything waiting on it. A :class:`HedgePolicy`,
+given to the client with the `hedge` kwarg, learns the usual latency of each
+endpoint template from recent requests. When a GET hasn't been answered
+within that time (a high percentile of the recent latencies), the client
+sends a duplicate on another pooled connection and uses whichever response
+arrives first::
+
+    client = lib7shifts.get_client(hedge=True, pool_maxsize=16)
+
+Duplicates go through the rate limiter like any other request, and
+`max_extra` caps them as a fraction of all requests made, so hedging can't
+eat more than a small share of the rate budget. Only GETs are hedged, since
+only they are safe to send twice, and only by the synchronous client.
+"""
+import collections
+import threading
+from .pagesize import endpoint_template
+
+
+class HedgePolicy(object):
+    """Decides when to hedge GET requests, from the latencies of recent
+    successful requests to each endpoint template. Safe to share between
+    threads and clients."""
+
+    def __init__(self, percentile=0.95, max_extra=0.05, min_delay=0.1,
+                 min_samples=20, window=200):
+        """
+        - percentile: the fraction of recent requests that must have been
+          answered before a request is hedged (eg. 0.95 hedges requests
+          slower than 95% of recent ones)
+        - max_extra: the most hedged requests allowed, as a fraction of all
+          requests made
+        - min_delay: the fewest seconds to wait before hedging
+        - min_samples: requests to an endpoint needed before any are hedged
+        - window: the number of recent latencies kept per endpoint
+        """
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        #: Requests seen, and duplicate requests sent, and won by a duplicate
+        self.requests = 0
+        self.hedged = 0
+        self.won = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(requests={}, hedged={}, won={})".format(
+            self.__class__.__name__, self.requests, self.hedged, self.won)
+
+    def record(self, event):
+        "Learn from a finished :class:`instrumentation.RequestEvent`"
+        with self._lock:
+            self.requests += 1
+            if event.method != 'GET' or event.failed:
+                return
+            latencies = self._latencies.get(event.endpoint)
+            if latencies is None:
+                latencies = self._latencies[event.endpoint] = \
+                    collections.deque(maxlen=self.window)
+            latencies.append(event.duration)
+
+    def get_delay(self, path):
+        """Returns the seconds to wait for a response to a GET request for
+        `path` before hedging it, or None if it shouldn't be hedged"""
+        with self._lock:
+            latencies = self._latencies.get(endpoint_template(path))
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def allow(self):
+        """Returns True, counting a hedged request, if one more is within
+        `max_extra`"""
+        with self._lock:
+            if self.hedged + 1 > self.max_extra * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def count_win(self):
+        "Count a hedged request that was answered before the original"
+        with self._lock:
+            self.won += 1
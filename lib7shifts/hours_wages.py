@@ -168,7 +168,14 @@ The hours and wages report looks like this::
             "end": "2022-07-09"
         }
 
+For large companies and long periods, the report can be very large. The
+:func:`iter_hours_and_wages_users` and :func:`iter_hours_and_wages_shifts`
+functions parse the report while it is being downloaded, and yield one user
+block (or one shift) at a time, so that memory use is bounded by the size of
+a single user block rather than the whole report.
 """
+from . import decoders
+
 ENDPOINT = '/v2/reports/hours_and_wages'
 
 
@@ -200,3 +207,41 @@ def get_hours_and_wages_report(client, **kwargs):
 
     """
     return client.get_endpoint(ENDPOINT, fields=kwargs)
+
+
+def iter_hours_and_wages_users(client, summary=None, **kwargs):
+    """Streaming version of :func:`get_hours_and_wages_report`. Supports the
+    same kwargs, but yields the entries of the report's "users" list one at a
+    time, as they are received and decoded.
+
+    If a `summary` dictionary is passed, it is filled with the report's other
+    top-level keys (total, start, end, etc.) as they are decoded. Since those
+    may come after the users in the response, the summary is only complete
+    once iteration has finished.
+    """
+    chunks = client.stream_endpoint(ENDPOINT, fields=kwargs)
+    try:
+        yield from decoders.iter_json_array(
+            chunks, 'users', rest=summary, encoding=client.ENCODING)
+    finally:
+        chunks.close()
+
+
+def iter_hours_and_wages_shifts(client, summary=None, **kwargs):
+    """Streaming version of :func:`get_hours_and_wages_report` that yields one
+    dictionary per shift, flattened out of the users -> weeks -> shifts
+    nesting. Each shift dictionary is the same as in the report, with two
+    extra keys:
+
+    - user: the "user" dictionary of the user block the shift came from
+    - week: the "week" label of the week the shift came from
+
+    Per-user and per-week totals are skipped. See
+    :func:`iter_hours_and_wages_users` for the `summary` argument.
+    """
+    for user in iter_hours_and_wages_users(client, summary=summary, **kwargs):
+        for week in user.get('weeks', []):
+            for shift in week.get('shifts', []):
+                shift['user'] = user.get('user')
+                shift['week'] = week.get('week')
+                yield shift
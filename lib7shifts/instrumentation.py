@@ -0,0 +1,187 @@
+"""
+Request instrumentation for the 7shifts API client.
+
+Hooks are objects given to the client with the `hooks` kwarg (or added later
+with :meth:`lib7shifts.APIClient7Shifts.add_hook`). Before every HTTP request
+attempt, including retries, the client calls each hook's ``before_request``
+method with a :class:`RequestEvent`, then calls ``after_request`` with the
+same event once the attempt has finished, whether it succeeded or failed.
+If the client has a circuit breaker, ``circuit_changed`` is called with the
+endpoint template and new state whenever a circuit opens, half-opens or
+closes. Hooks need only define the methods they use.
+
+:class:`MetricsCollector` is a ready-made hook that keeps request counts,
+retries, errors, bytes received and a latency histogram per endpoint::
+
+    import lib7shifts
+    from lib7shifts.instrumentation import MetricsCollector
+    metrics = MetricsCollector()
+    client = lib7shifts.get_client(hooks=[metrics])
+    ...
+    print(metrics.report())
+"""
+import bisect
+import threading
+from .pagesize import endpoint_template
+
+#: Upper bounds, in seconds, of the latency histogram buckets. The last
+#: bucket counts anything slower.
+LATENCY_BUCKETS = (
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class RequestEvent(object):
+    """Describes one HTTP request attempt.
+
+    - method, path: the request
+    - endpoint: `path` as an endpoint template, with IDs replaced by '{id}'
+    - attempt: 0 for the first attempt, 1 for the first retry, etc.
+    - status: the response status (None before the request, or if no
+      response was received)
+    - nbytes: the length of the response body, if known
+    - duration: the seconds taken by the attempt
+    - error: the exception raised, if no response was received
+    """
+    __slots__ = ('method', 'path', 'endpoint', 'attempt', 'status', 'nbytes',
+                 'duration', 'error')
+
+    def __init__(self, method, path, attempt=0):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint_template(path)
+        self.attempt = attempt
+        self.status = None
+        self.nbytes = None
+        self.duration = None
+        self.error = None
+
+    def __repr__(self):
+        return "<RequestEvent {} {} attempt={} status={} {}s>".format(
+            self.method, self.endpoint, self.attempt, self.status,
+            self.duration)
+
+    @property
+    def failed(self):
+        "True if no response was received, or the response was an error"
+        return self.error is not None or (self.status or 0) >= 400
+
+
+class EndpointStats(object):
+    "Request statistics for one endpoint template"
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, event):
+        "Count a finished :class:`RequestEvent`"
+        self.requests += 1
+        if event.attempt:
+            self.retries += 1
+        if event.failed:
+            self.errors += 1
+        self.bytes += event.nbytes or 0
+        self.seconds += event.duration
+        self.max_seconds = max(self.max_seconds, event.duration)
+        self.histogram[bisect.bisect_left(
+            LATENCY_BUCKETS, event.duration)] += 1
+
+    def percentile(self, fraction):
+        """Returns an estimate of the latency below which `fraction` (eg.
+        0.95) of requests completed: the upper bound of the histogram bucket
+        it falls in, or the slowest request seen for the last bucket. Returns
+        None if there have been no requests."""
+        if not self.requests:
+            return None
+        wanted = fraction * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+    def as_dict(self):
+        "Returns the statistics as a dictionary"
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'max_seconds': self.max_seconds,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'histogram': dict(zip(
+                [str(bound) for bound in LATENCY_BUCKETS] + ['inf'],
+                self.histogram)),
+        }
+
+
+class MetricsCollector(object):
+    """A hook that keeps :class:`EndpointStats` per endpoint template. Safe to
+    share between threads and clients."""
+
+    def __init__(self):
+        self._stats = {}
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def after_request(self, event):
+        "Record a finished request attempt"
+        with self._lock:
+            stats = self._stats.get(event.endpoint)
+            if stats is None:
+                stats = self._stats[event.endpoint] = EndpointStats()
+            stats.add(event)
+
+    def circuit_changed(self, endpoint, state):
+        "Record the state of a circuit (see :mod:`circuitbreaker`)"
+        with self._lock:
+            self._circuits[endpoint] = state
+
+    def circuits(self):
+        """Returns a dictionary of the last known circuit state of each
+        endpoint template whose circuit has changed state"""
+        with self._lock:
+            return dict(self._circuits)
+
+    def get(self, endpoint):
+        """Returns the :class:`EndpointStats` for the template of `endpoint`,
+        or None if it hasn't been requested"""
+        with self._lock:
+            return self._stats.get(endpoint_template(endpoint))
+
+    def dump(self):
+        """Returns a dictionary of statistics (see
+        :meth:`EndpointStats.as_dict`) per endpoint template"""
+        with self._lock:
+            return {endpoint: dict(
+                stats.as_dict(), circuit=self._circuits.get(endpoint, 'closed'))
+                for endpoint, stats in self._stats.items()}
+
+    def report(self):
+        """Returns a plain-text table of the statistics, with the endpoints
+        that took the most time in total first"""
+        rows = sorted(self.dump().items(), key=lambda row: -row[1]['seconds'])
+        lines = [('{:<48} {:>8} {:>7} {:>6} {:>10} {:>9} {:>7} {:>7} '
+                  '{:>9}').format(
+            'endpoint', 'requests', 'retries', 'errors', 'bytes', 'seconds',
+            'p50', 'p95', 'circuit')]
+        for endpoint, stats in rows:
+            lines.append(
+                '{:<48} {requests:>8} {retries:>7} {errors:>6} {bytes:>10} '
+                '{seconds:>9.2f} {p50:>7.3f} {p95:>7.3f} {circuit:>9}'.format(
+                    endpoint, **stats))
+        return '\n'.join(lines)
+
+    def reset(self):
+        "Forget all statistics"
+        with self._lock:
+            self._stats.clear()
+            self._circuits.clear()
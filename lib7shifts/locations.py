@@ -20,19 +20,22 @@ def get_location(client, company_id, location_id):
         raise exceptions.EntityNotFoundError('Location', location_id)
 
 
-def list_locations(client, company_id, **kwargs):
+def list_locations(client, company_id, raw=False, lazy=False, **kwargs):
     """
     Implement the List method for the 7shifts API.
 
     Supports the modified_since kwarg.
 
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`Location` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
+
     See the API docs for details.
     """
-    if 'limit' not in kwargs:
-        kwargs['limit'] = 100
-    for item in base.page_api_get_results(
-            client, ENDPOINT.format(company_id=company_id), **kwargs):
-        yield Location(**item)
+    kwargs.setdefault('default_limit', 100)
+    yield from base.iter_objects(base.page_api_get_results(
+        client, ENDPOINT.format(company_id=company_id), **kwargs),
+        Location, raw, lazy)
 
 
 class Location(base.APIObject):
@@ -0,0 +1,223 @@
+"""
+Serve many 7shifts accounts (eg. franchisees, each with its own access token)
+from one process.
+
+A :class:`ClientManager` hands out an :class:`lib7shifts.APIClient7Shifts`
+per access token, keeping the most recently used ones in an LRU so they can
+be reused from job to job::
+
+    from lib7shifts.manager import ClientManager
+    manager = ClientManager(tenant_rate=5, global_rate=20,
+                            retry=lib7shifts.retry.RetryPolicy())
+    for token in franchisee_tokens:
+        client = manager.get(token)
+        ...
+
+Clients for the same host share its connection pool (the access token is
+sent with each request rather than being part of the pool), so a worker
+serving hundreds of tenants keeps a handful of connections open rather than
+hundreds. Each tenant has its own rate budget, `tenant_rate`, and all of
+them share a budget of `global_rate`; either may be left out. Pools and
+clients that haven't been used for `idle_timeout` seconds are closed and
+forgotten as the manager is used, or on demand with :meth:`close_idle`.
+"""
+import os
+import time
+import threading
+import collections
+import certifi
+import urllib3
+from . import ratelimit
+
+
+class ClientManager(object):
+    """Hands out clients per access token, sharing connection pools and rate
+    budgets between them. Safe to share between threads."""
+
+    def __init__(self, max_clients=100, tenant_rate=None, global_rate=None,
+                 idle_timeout=300.0, pool_maxsize=10, pool_block=False,
+                 clock=time.monotonic, **client_kwargs):
+        """
+        - max_clients: the most clients kept for reuse; the least recently
+          used is dropped to make room for another
+        - tenant_rate: requests per second allowed for each access token
+        - global_rate: requests per second allowed for all tokens together
+        - idle_timeout: seconds after which an unused client or pool is
+          closed
+        - pool_maxsize, pool_block: as for
+          :class:`lib7shifts.APIClient7Shifts`, but for each shared pool
+        - clock: a function returning the current time in seconds
+
+        Any other kwargs are passed to every client created, so objects such
+        as a :class:`lib7shifts.cache.ResponseCache` or
+        :class:`lib7shifts.concurrency.AIMDLimiter` given here are shared by
+        all of them.
+        """
+        self.max_clients = max_clients
+        self.tenant_rate = tenant_rate
+        self.global_bucket = None
+        if global_rate:
+            self.global_bucket = ratelimit.TokenBucket(rate=global_rate)
+        self.idle_timeout = idle_timeout
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.client_kwargs = client_kwargs
+        self._clock = clock
+        self._clients = collections.OrderedDict()
+        self._pools = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(clients={}, pools={})".format(
+            self.__class__.__name__, len(self._clients), len(self._pools))
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, access_token, **kwargs):
+        """Returns the client for `access_token`, creating it if need be with
+        `kwargs` in addition to those given to the manager"""
+        from . import get_client
+        self.close_idle()
+        now = self._clock()
+        with self._lock:
+            self._check_pid()
+            entry = self._clients.get(access_token)
+            if entry is not None:
+                self._clients.move_to_end(access_token)
+                entry[1] = now
+                return entry[0]
+        client_kwargs = dict(self.client_kwargs, **kwargs)
+        client_kwargs.setdefault('rate_limit_lock', self._rate_limit())
+        client = get_client(
+            access_token=access_token, pool_manager=self, **client_kwargs)
+        with self._lock:
+            # another thread may have created one in the meantime
+            entry = self._clients.setdefault(access_token, [client, now])
+            self._clients.move_to_end(access_token)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+            return entry[0]
+
+    def connection_from_url(self, url, headers=None, **request_kw):
+        """Returns a pool for `url` that sends `headers` and `request_kw`
+        (eg. `retries`) with every request, sharing connections with the
+        other pools for the same host. Called by the client."""
+        return SharedPool(self, url, headers, request_kw)
+
+    def close_idle(self, idle_timeout=None):
+        """Close the pools, and forget the clients, that haven't been used
+        for `idle_timeout` seconds (by default, the manager's)"""
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        cutoff = self._clock() - idle_timeout
+        with self._lock:
+            self._check_pid()
+            for token, (_, used) in list(self._clients.items()):
+                if used < cutoff:
+                    del self._clients[token]
+            idle = [key for key, (_, used) in self._pools.items()
+                    if used < cutoff]
+            pools = [self._pools.pop(key)[0] for key in idle]
+        for pool in pools:
+            pool.close()
+
+    def close(self):
+        "Close all pools and forget all clients"
+        with self._lock:
+            pools = [pool for pool, _ in self._pools.values()]
+            self._pools.clear()
+            self._clients.clear()
+        for pool in pools:
+            pool.close()
+
+    def get_pool(self, url, access_token=None):
+        """Returns the connection pool shared by requests to `url`, noting
+        that it (and the client for `access_token`) is in use"""
+        parsed = urllib3.util.parse_url(url)
+        key = (parsed.scheme, parsed.host, parsed.port)
+        now = self._clock()
+        with self._lock:
+            self._check_pid()
+            entry = self._pools.get(key)
+            if entry is None:
+                entry = self._pools[key] = [self._create_pool(url), now]
+            entry[1] = now
+            client = self._clients.get(access_token)
+            if client is not None:
+                client[1] = now
+            return entry[0]
+
+    def _create_pool(self, url):
+        "Create the shared pool for the host of `url`"
+        pool_kw = {'maxsize': self.pool_maxsize, 'block': self.pool_block}
+        if url.startswith('https:'):
+            pool_kw.update(cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+        return urllib3.connectionpool.connection_from_url(url, **pool_kw)
+
+    def _rate_limit(self):
+        "Returns the rate limit for a new client"
+        tenant = None
+        if self.tenant_rate:
+            tenant = ratelimit.TokenBucket(rate=self.tenant_rate)
+        if tenant is None and self.global_bucket is None:
+            return None
+        return TenantRateLimit(tenant, self.global_bucket)
+
+    def _check_pid(self):
+        """Forget pools and clients created before a fork. Must be called
+        with the lock held."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pools.clear()
+            self._clients.clear()
+
+
+class SharedPool(object):
+    """One client's view of a shared connection pool, adding the client's
+    headers (including its access token) to each request"""
+
+    def __init__(self, manager, url, headers=None, request_kw=None):
+        self.manager = manager
+        self.url = url
+        self.headers = dict(headers or {})
+        self.request_kw = dict(request_kw or {})
+
+    def request(self, method, path, **urlopen_kw):
+        headers = dict(self.headers)
+        headers.update(urlopen_kw.pop('headers', None) or {})
+        for name, value in self.request_kw.items():
+            urlopen_kw.setdefault(name, value)
+        token = self.headers.get('Authorization', '')[len('Bearer '):]
+        pool = self.manager.get_pool(self.url, token)
+        return pool.request(method, path, headers=headers, **urlopen_kw)
+
+
+class TenantRateLimit(object):
+    """A rate limit made of a tenant's own budget and one shared by all
+    tenants (either of which may be None). Requests wait for the tenant's
+    budget first, so a tenant that is being held back doesn't take from the
+    shared budget meanwhile. Only the tenant's budget follows the rate-limit
+    headers of its responses, since 7shifts counts requests per access
+    token."""
+
+    def __init__(self, tenant, shared):
+        self.tenant = tenant
+        self.shared = shared
+
+    def acquire(self):
+        if self.tenant is not None:
+            self.tenant.acquire()
+        if self.shared is not None:
+            self.shared.acquire()
+
+    def update_from_headers(self, headers):
+        if self.tenant is not None:
+            self.tenant.update_from_headers(headers)
@@ -0,0 +1,848 @@
+"""
+A local stand-in for the 7shifts API, for load tests and benchmarks.
+
+The server implements the v2 endpoints used by this library (companies,
+locations, departments, roles, users, wages, assignments, time punches,
+shifts, receipts, whoami and the hours and wages, and daily sales and labour
+reports) over synthetic data. Every record is generated from its position in
+the dataset and a seed, so the data is the same on every run, and a dataset
+of millions of punches takes no memory or start-up time. Lists use the same
+cursor pagination as the real API, and the date range filters of punches,
+shifts and receipts, so listings (including sharded ones) behave as they
+would against 7shifts.
+
+Receipts can also be created (POST) and updated (PUT), as the bulk upserts
+of :func:`lib7shifts.bulk_upsert_receipts` do. Written receipts are kept in
+:attr:`MockServer.receipts`, apart from the synthetic ones that listings
+return; creating a receipt_id a second time gets a 409, and updating one
+that hasn't been created gets a 404.
+
+To find out how a pipeline copes with a struggling API, the server can also
+limit the request rate per access token (answering 429 with Retry-After and
+x-ratelimit headers, like 7shifts), fail a fraction of requests with 5xx
+errors, reject pages larger than the API allows, and add latency.
+
+Run it from the shell, then point the library (or ``7shifts sync``) at it
+with the API_URL_7SHIFTS environment variable::
+
+    python -m lib7shifts.mockserver --punches=5000000 --rate-limit=10
+    export API_URL_7SHIFTS=http://127.0.0.1:8080/v2
+
+Or start one in-process, eg. in a test::
+
+    from lib7shifts.mockserver import MockServer, MockData
+    with MockServer(MockData(punches=100000)) as server:
+        client = server.get_client()
+        punches = list(lib7shifts.list_punches(client, 1))
+
+Usage:
+  lib7shifts.mockserver [options]
+
+Options:
+  -h --help         Show this screen
+  --host=HOST       Address to listen on [default: 127.0.0.1]
+  --port=N          Port to listen on [default: 8080]
+  --seed=N          Seed for the synthetic data and failures [default: 0]
+  --companies=N     Number of companies [default: 1]
+  --locations=N     Locations per company [default: 5]
+  --departments=N   Departments per location [default: 2]
+  --roles=N         Roles per department [default: 3]
+  --users=N         Users per company [default: 200]
+  --punches=N       Time punches per company [default: 100000]
+  --shifts=N        Shifts per company [default: 100000]
+  --receipts=N      Receipts per company [default: 100000]
+  --start=DATE      Date of the first punch, shift and receipt
+                    [default: 2023-01-01]
+  --days=N          Number of days the punches, shifts and receipts cover
+                    [default: 365]
+  --rate-limit=N    Requests per second allowed per access token
+  --error-rate=F    Fraction of requests that fail with a 5xx error
+                    [default: 0]
+  --latency=S       Seconds to wait before answering each request
+                    [default: 0]
+  --item-latency=S  Extra seconds to wait per item in a list page
+                    [default: 0]
+  --max-limit=N     Largest page size accepted [default: 500]
+  -v --verbose      Log every request
+"""
+import re
+import json
+import math
+import time
+import uuid
+import random
+import base64
+import hashlib
+import logging
+import datetime
+import threading
+import http.server
+from urllib.parse import urlsplit, parse_qsl
+from . import dates
+from .ratelimit import TokenBucket
+
+#: Status codes chosen from when a request is failed on purpose
+ERROR_STATUSES = (500, 502, 503, 504)
+
+#: Query parameters that never filter list results
+_RESERVED_FIELDS = frozenset([
+    'limit', 'cursor', 'sort_by', 'sort_dir', 'modified_since',
+    'localize_search_time', 'include_deleted'])
+
+_FIRST_NAMES = ('Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley',
+                'Jamie', 'Avery', 'Quinn', 'Drew', 'Robin')
+_LAST_NAMES = ('Smith', 'Tremblay', 'Martin', 'Roy', 'Wilson', 'Gagnon',
+               'Lee', 'Brown', 'Singh', 'Campbell', 'Chen', 'Young')
+_TIMEZONES = ('America/Edmonton', 'America/Vancouver', 'America/Toronto',
+              'America/Winnipeg', 'America/Halifax', 'America/Chicago')
+
+_ROUTES = (
+    (re.compile(r'^/v2/whoami$'), 'whoami'),
+    (re.compile(r'^/v2/companies(?:/(\d+))?$'), 'companies'),
+    (re.compile(r'^/v2/company/(\d+)/(locations|departments|roles|users|'
+                r'time_punches|shifts|receipts)(?:/([^/]+))?$'), 'collection'),
+    (re.compile(r'^/v2/company/(\d+)/users/(\d+)/(wages|assignments)$'),
+     'user_detail'),
+    (re.compile(r'^/v2/reports/(hours_and_wages|daily_sales_and_labor)$'),
+     'report'),
+)
+
+#: Routes accepting writes, by method
+_WRITE_ROUTES = {
+    'POST': re.compile(r'^/v2/company/(\d+)/receipts$'),
+    'PUT': re.compile(r'^/v2/company/(\d+)/receipts/([^/]+)$'),
+}
+
+
+class NotFound(Exception):
+    "Raised while handling a request for something that doesn't exist"
+
+
+class BadRequest(Exception):
+    "Raised while handling a request with invalid parameters"
+
+
+class Conflict(Exception):
+    "Raised while handling a request to create something that already exists"
+
+
+def _format(dt_obj):
+    "Format a datetime the way the API does"
+    return dt_obj.strftime(dates.DEFAULT_DATETIME_FORMAT)
+
+
+def _parse(value):
+    "Parse a date or ISO 8601 date-time filter into an aware datetime"
+    try:
+        return dates.from_iso8601_dt(value)
+    except ValueError:
+        raise BadRequest("invalid date: {}".format(value))
+
+
+def _query_value(value):
+    "Render a record value the way it would appear in a query string"
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _encode_cursor(position):
+    return base64.urlsafe_b64encode(
+        'position:{}'.format(position).encode('ascii')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(
+            cursor.encode('ascii')).decode('ascii').split(':', 1)[1])
+    except (ValueError, IndexError, UnicodeError):
+        raise BadRequest("invalid cursor")
+
+
+class MockData(object):
+    """A seeded, synthetic 7shifts account. Counts (other than `companies`)
+    are per company; departments are per location and roles per
+    department. Punches, shifts and receipts are spread evenly over `days`
+    days from `start`, in that order, so that date range filters select a
+    contiguous run of them."""
+
+    #: Per-kind attribute holding the number of records per company
+    COUNTS = {
+        'locations': 'locations', 'departments': 'departments_total',
+        'roles': 'roles_total', 'users': 'users', 'time_punches': 'punches',
+        'shifts': 'shifts', 'receipts': 'receipts',
+    }
+
+    #: The field of time-ordered kinds, and its range filters
+    TIME_FIELDS = {
+        'time_punches': 'clocked_in', 'shifts': 'start',
+        'receipts': 'receipt_date',
+    }
+
+    def __init__(self, seed=0, companies=1, locations=5, departments=2,
+                 roles=3, users=200, punches=100000, shifts=100000,
+                 receipts=100000, start=datetime.date(2023, 1, 1), days=365):
+        self.seed = seed
+        self.companies = companies
+        self.locations = locations
+        self.departments = departments
+        self.departments_total = locations * departments
+        self.roles = roles
+        self.roles_total = self.departments_total * roles
+        self.users = users
+        self.punches = punches
+        self.shifts = shifts
+        self.receipts = receipts
+        self.start = datetime.datetime(
+            start.year, start.month, start.day, tzinfo=datetime.timezone.utc)
+        self.days = days
+        self._receipt_mask = random.Random(
+            '{}:receipt-ids'.format(seed)).getrandbits(48)
+        self.created = _format(self.start - datetime.timedelta(days=30))
+
+    def __repr__(self):
+        return ("{}(seed={}, companies={}, locations={}, users={}, "
+                "punches={}, shifts={}, receipts={})").format(
+            self.__class__.__name__, self.seed, self.companies,
+            self.locations, self.users, self.punches, self.shifts,
+            self.receipts)
+
+    def count(self, kind):
+        "Returns the number of records of `kind` per company"
+        return getattr(self, self.COUNTS[kind])
+
+    def _rng(self, kind, company_id, index):
+        return random.Random('{}:{}:{}:{}'.format(
+            self.seed, kind, company_id, index))
+
+    def _id(self, kind, company_id, index):
+        return (company_id - 1) * self.count(kind) + index + 1
+
+    def _index(self, kind, company_id, item_id):
+        "The inverse of :meth:`_id`; raises NotFound for other companies"
+        index = item_id - 1 - (company_id - 1) * self.count(kind)
+        if not 0 <= index < self.count(kind):
+            raise NotFound()
+        return index
+
+    def _time(self, kind, index):
+        # whole seconds, like the API, using integer arithmetic so that
+        # :meth:`_positions` can invert it exactly
+        seconds = index * self.days * 86400 // max(1, self.count(kind))
+        return self.start + datetime.timedelta(seconds=seconds)
+
+    def check_company(self, company_id):
+        if not 1 <= company_id <= self.companies:
+            raise NotFound()
+
+    def company(self, company_id):
+        self.check_company(company_id)
+        return {
+            'id': company_id, 'name': 'Company {}'.format(company_id),
+            'country': 'CA', 'status': 'active', 'created': self.created,
+            'modified': self.created, 'meta': {},
+        }
+
+    def get(self, kind, company_id, item_id):
+        """Returns the record of `kind` with `item_id` (a UUID string for
+        receipts), or raises NotFound"""
+        self.check_company(company_id)
+        if kind == 'receipts':
+            try:
+                number = uuid.UUID(item_id).node ^ self._receipt_mask
+            except (AttributeError, TypeError, ValueError):
+                raise NotFound()
+            record = self.make(kind, company_id, self._index(
+                kind, company_id, number))
+            if record['id'] != item_id:
+                raise NotFound()
+            return record
+        try:
+            item_id = int(item_id)
+        except ValueError:
+            raise NotFound()
+        return self.make(kind, company_id, self._index(
+            kind, company_id, item_id))
+
+    def make(self, kind, company_id, index):
+        "Generate the `index`-th record of `kind` for a company"
+        return getattr(self, '_make_' + kind)(company_id, index)
+
+    def _make_locations(self, company_id, index):
+        return {
+            'id': self._id('locations', company_id, index),
+            'company_id': company_id,
+            'name': 'Location {}'.format(index + 1),
+            'address': '{} Main Street'.format(index + 1),
+            'city': 'Edmonton', 'state': 'AB', 'country': 'CA',
+            'timezone': _TIMEZONES[index % len(_TIMEZONES)],
+            'created': self.created, 'modified': self.created,
+        }
+
+    def _make_departments(self, company_id, index):
+        location = index // self.departments
+        return {
+            'id': self._id('departments', company_id, index),
+            'company_id': company_id,
+            'location_id': self._id('locations', company_id, location),
+            'name': 'Department {}'.format(index % self.departments + 1),
+            'default': index % self.departments == 0,
+            'created': self.created, 'modified': self.created,
+        }
+
+    def _make_roles(self, company_id, index):
+        department = index // self.roles
+        location = department // self.departments
+        return {
+            'id': self._id('roles', company_id, index),
+            'company_id': company_id,
+            'location_id': self._id('locations', company_id, location),
+            'department_id': self._id('departments', company_id, department),
+            'name': 'Role {}'.format(index % self.roles + 1),
+            'color': '#{:06x}'.format(
+                self._rng('roles', company_id, index).randrange(2 ** 24)),
+            'sort': index % self.roles, 'num_stations': 0, 'stations': [],
+            'created': self.created, 'modified': self.created,
+        }
+
+    def _make_users(self, company_id, index):
+        rng = self._rng('users', company_id, index)
+        first, last = rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+        return {
+            'id': self._id('users', company_id, index),
+            'company_id': company_id,
+            'first_name': first, 'last_name': last,
+            'email': '{}.{}{}@example.com'.format(
+                first.lower(), last.lower(), index),
+            'employee_id': 'E{:06d}'.format(index + 1),
+            'type': 'employee', 'active': index % 10 != 9,
+            'hire_date': (self.start - datetime.timedelta(
+                days=rng.randrange(1000))).strftime(dates.DEFAULT_DATE_FORMAT),
+            'created': self.created, 'modified': self.created,
+        }
+
+    def _staffing(self, rng, company_id):
+        "Pick a user and role, returning the ids of both and the role's parents"
+        role = self._make_roles(company_id, rng.randrange(self.roles_total))
+        return {
+            'user_id': self._id('users', company_id, rng.randrange(
+                self.users)),
+            'role_id': role['id'], 'department_id': role['department_id'],
+            'location_id': role['location_id'],
+        }
+
+    def _make_time_punches(self, company_id, index):
+        rng = self._rng('time_punches', company_id, index)
+        clocked_in = self._time('time_punches', index)
+        clocked_out = clocked_in + datetime.timedelta(
+            minutes=rng.randrange(180, 600))
+        punch = {
+            'id': self._id('time_punches', company_id, index),
+            'company_id': company_id,
+            'shift_id': self._id('shifts', company_id, index)
+            if index < self.shifts else None,
+            'clocked_in': _format(clocked_in),
+            'clocked_out': _format(clocked_out),
+            'approved': rng.random() > 0.05,
+            'tips': rng.randrange(0, 20000), 'hourly_wage': 1600,
+            'breaks': [], 'deleted': False,
+            'created': _format(clocked_in), 'modified': _format(clocked_out),
+        }
+        punch.update(self._staffing(rng, company_id))
+        return punch
+
+    def _make_shifts(self, company_id, index):
+        rng = self._rng('shifts', company_id, index)
+        start = self._time('shifts', index)
+        end = start + datetime.timedelta(hours=rng.randrange(3, 10))
+        shift = {
+            'id': self._id('shifts', company_id, index),
+            'company_id': company_id,
+            'start': _format(start), 'end': _format(end),
+            'open': False, 'status': 'normal', 'notes': '',
+            'hourly_wage': 1600, 'breaks': [], 'deleted': False,
+            'created': _format(start - datetime.timedelta(days=7)),
+            'modified': _format(start),
+        }
+        shift.update(self._staffing(rng, company_id))
+        return shift
+
+    def _make_receipts(self, company_id, index):
+        # shaped like the example in lib7shifts.list_receipts: 7shifts and
+        # POS UUIDs, and ISO 8601 date-times with an offset
+        rng = self._rng('receipts', company_id, index)
+        when = self._time('receipts', index)
+        created = when + datetime.timedelta(minutes=rng.randrange(1, 120))
+        net = rng.randrange(500, 30000)
+        discounts = rng.choice((0, 0, 0, rng.randrange(100, 500)))
+        return {
+            # the receipt's number is hidden in the node, for :meth:`get`
+            'id': str(uuid.UUID(int=rng.getrandbits(80) << 48 | (self._id(
+                'receipts', company_id, index) ^ self._receipt_mask),
+                version=4)),
+            'company_id': company_id,
+            'location_id': self._id(
+                'locations', company_id, index % self.locations),
+            'pos_id': 4,
+            'receipt_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'receipt_date': when.isoformat(), 'net_total': net,
+            'gross_total': int(net * 1.05) + discounts,
+            'tips': rng.randrange(0, 3000),
+            'total_receipt_discounts': discounts, 'total_item_discounts': 0,
+            'external_user_id': None, 'revenue_center': None,
+            'receipt_lines': [], 'tip_details': [], 'status': 'closed',
+            'created_date': created.isoformat(),
+            'modified_date': created.isoformat(),
+        }
+
+    def wages(self, company_id, user_id):
+        user = self.get('users', company_id, user_id)
+        rng = self._rng('wages', company_id, user_id)
+        staffing = self._staffing(rng, company_id)
+        return {
+            'current_wages': [{
+                'id': user_id, 'user_id': user_id,
+                'role_id': staffing['role_id'],
+                'effective_date': user['hire_date'],
+                'wage_type': 'hourly',
+                'wage_cents': rng.randrange(1500, 3000),
+            }],
+            'upcoming_wages': [],
+        }
+
+    def assignments(self, company_id, user_id):
+        self.get('users', company_id, user_id)
+        rng = self._rng('assignments', company_id, user_id)
+        role = self._make_roles(company_id, rng.randrange(self.roles_total))
+        department = self.get(
+            'departments', company_id, role['department_id'])
+        location = self.get('locations', company_id, role['location_id'])
+        return {
+            'locations': [{'id': location['id'], 'name': location['name']}],
+            'departments': [department],
+            'roles': [{
+                'id': role['id'], 'name': role['name'],
+                'location_id': role['location_id'],
+                'department_id': role['department_id'],
+                'is_primary': True, 'skill_level': 1}],
+        }
+
+    def page(self, kind, company_id, fields, limit):
+        """Returns a page of up to `limit` records of `kind` matching the
+        query `fields`, and the cursor of the next page (or None)."""
+        self.check_company(company_id)
+        start, stop, step = self._positions(kind, company_id, fields)
+        position = start
+        if fields.get('cursor'):
+            position = _decode_cursor(fields['cursor'])
+        # scanning for records matching selective filters is bounded, and a
+        # short page returned, so that one request never takes too long
+        budget = max(limit * 50, 10000)
+        items = []
+        while position < stop and len(items) < limit and budget:
+            item = self.make(kind, company_id, position)
+            if self._matches(kind, item, fields):
+                items.append(item)
+            position += step
+            budget -= 1
+        if position < stop:
+            return items, _encode_cursor(position)
+        return items, None
+
+    def _positions(self, kind, company_id, fields):
+        """Returns the (start, stop, step) of the record indexes that may
+        match the time range and location filters in `fields`."""
+        start, stop, step = 0, self.count(kind), 1
+        if kind in self.TIME_FIELDS:
+            # record i is at second (i * span) // count of the dataset
+            field = self.TIME_FIELDS[kind]
+            span, count = self.days * 86400, max(1, stop)
+            lower = [fields.get(field + '[gte]'), fields.get('modified_since')]
+            for value in filter(None, lower):
+                seconds = math.ceil(
+                    (_parse(value) - self.start).total_seconds())
+                start = max(start, -(-seconds * count // span))
+            if fields.get(field + '[lte]'):
+                seconds = math.floor((_parse(
+                    fields[field + '[lte]']) - self.start).total_seconds())
+                stop = min(stop, -(-(seconds + 1) * count // span))
+        if kind == 'receipts' and fields.get('location_id'):
+            # receipts rotate through the locations, so a location's
+            # receipts are every n-th one
+            location = self._index(
+                'locations', company_id, int(fields['location_id']))
+            start += (location - start) % self.locations
+            step = self.locations
+        return start, max(start, stop), step
+
+    def _matches(self, kind, item, fields):
+        for name, value in fields.items():
+            if name in _RESERVED_FIELDS or '[' in name:
+                continue
+            if name == 'status' and kind == 'users':
+                if value != ('active' if item['active'] else 'inactive'):
+                    return False
+            elif name in item and _query_value(item[name]) != value:
+                return False
+        if fields.get('modified_since') and kind not in self.TIME_FIELDS:
+            return item['modified'] >= _format(_parse(
+                fields['modified_since']))
+        return True
+
+    def hours_and_wages(self, fields):
+        "Build an hours and wages report for a company and range of days"
+        company_id = int(fields.get('company_id') or 1)
+        self.check_company(company_id)
+        try:
+            first = datetime.date.fromisoformat(fields['from_day'])
+            last = datetime.date.fromisoformat(fields['to_day'])
+        except (KeyError, ValueError):
+            raise BadRequest("from_day and to_day are required")
+        users = []
+        for index in range(self.users):
+            user = self._make_users(company_id, index)
+            rng = self._rng('hours_and_wages', company_id, index)
+            weeks = []
+            day = first
+            while day <= last:
+                week = {'week': day.isoformat(), 'shifts': []}
+                for offset in range(7):
+                    shift_day = day + datetime.timedelta(days=offset)
+                    if shift_day > last or rng.random() < 0.5:
+                        continue
+                    hours = rng.randrange(3, 10)
+                    week['shifts'].append({
+                        'user_id': user['id'],
+                        'date': shift_day.isoformat(),
+                        'role_id': self._staffing(
+                            rng, company_id)['role_id'],
+                        'regular_hours': hours, 'overtime_hours': 0,
+                        'total': {'hours': hours, 'cost': hours * 1600},
+                    })
+                week['total'] = {
+                    'hours': sum(s['regular_hours'] for s in week['shifts'])}
+                weeks.append(week)
+                day += datetime.timedelta(days=7)
+            users.append({
+                'user': {key: user[key] for key in (
+                    'id', 'first_name', 'last_name', 'employee_id')},
+                'weeks': weeks,
+                'total': {'hours': sum(
+                    week['total']['hours'] for week in weeks)},
+            })
+        return {
+            'users': users,
+            'total': {'hours': sum(user['total']['hours'] for user in users)},
+            'start': first.isoformat(), 'end': last.isoformat(),
+        }
+
+    def daily_sales_and_labor(self, fields):
+        "Build a daily sales and labour report for a location"
+        try:
+            location_id = int(fields['location_id'])
+            first = datetime.date.fromisoformat(fields['start_date'])
+            last = datetime.date.fromisoformat(fields['end_date'])
+        except (KeyError, ValueError):
+            raise BadRequest(
+                "location_id, start_date and end_date are required")
+        days = []
+        day = first
+        while day <= last:
+            rng = self._rng('daily_sales_and_labor', location_id, day)
+            sales = rng.randrange(100000, 1000000)
+            labor = int(sales * rng.uniform(0.2, 0.35))
+            days.append({
+                'date': day.isoformat(), 'actual_sales': sales,
+                'projected_sales': int(sales * rng.uniform(0.9, 1.1)),
+                'actual_labor_cost': labor,
+                'labor_minutes': labor // 27,
+                'labor_percent': labor / sales,
+            })
+            day += datetime.timedelta(days=1)
+        return days
+
+
+class MockServer(http.server.ThreadingHTTPServer):
+    """Serves :class:`MockData` over HTTP, on a background thread once
+    :meth:`start` is called (or when used as a context manager). Pass
+    port=0 to listen on any free port.
+
+    - rate_limit: requests per second allowed per access token, with bursts
+      of up to one second's worth (None for no limit)
+    - error_rate: the fraction of requests answered with a 5xx error
+    - latency: seconds to wait before answering each request
+    - item_latency: extra seconds to wait per record in a list page
+    - max_limit: list requests with a larger `limit` get a 422 response
+
+    The :attr:`stats` dictionary counts the responses sent by status, and
+    :attr:`receipts` holds the receipts written with POST and PUT requests,
+    by (company_id, receipt_id).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, data=None, host='127.0.0.1', port=0, rate_limit=None,
+                 error_rate=0.0, latency=0.0, item_latency=0.0,
+                 max_limit=500):
+        super(MockServer, self).__init__((host, port), _MockHandler)
+        self.data = data if data is not None else MockData()
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.latency = latency
+        self.item_latency = item_latency
+        self.max_limit = max_limit
+        self.stats = {}
+        self.receipts = {}
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._buckets = {}
+        self._random = random.Random(self.data.seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def url(self):
+        "The base URL of the API, for the client's `base_url` kwarg"
+        host, port = self.server_address[:2]
+        return 'http://{}:{}/v2'.format(host, port)
+
+    def start(self):
+        "Serve requests on a background thread; returns the server"
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        "Stop serving requests and close the socket"
+        self.shutdown()
+        self.server_close()
+
+    def get_client(self, access_token='mock', **kwargs):
+        "Returns an :class:`lib7shifts.APIClient7Shifts` using this server"
+        from . import get_client
+        return get_client(access_token=access_token, base_url=self.url,
+                          **kwargs)
+
+    def count(self, status):
+        with self._lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+
+    def check_rate_limit(self, token):
+        """Take a token from the bucket for `token`. Returns None if the
+        request may proceed, or the seconds until it may be retried, along
+        with the headers describing the remaining budget."""
+        if not self.rate_limit:
+            return None, {}
+        with self._lock:
+            bucket = self._buckets.get(token)
+            if bucket is None:
+                bucket = self._buckets[token] = TokenBucket(
+                    rate=self.rate_limit, capacity=max(1, self.rate_limit))
+        allowed = bucket.acquire(timeout=0)
+        headers = {
+            'x-ratelimit-limit': str(int(bucket.capacity)),
+            'x-ratelimit-remaining': str(int(bucket.tokens)),
+        }
+        if allowed:
+            return None, headers
+        return (1 - bucket.tokens) / self.rate_limit, headers
+
+    def should_fail(self):
+        "Returns a 5xx status to fail the request with, or None"
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() < self.error_rate:
+                return self._random.choice(ERROR_STATUSES)
+        return None
+
+
+class _MockHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'lib7shifts-mock/1.0'
+    # headers and body are written separately; without this, each response
+    # waits on the client's delayed ACK, adding ~40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        self.server.log.debug(format, *args)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def handle_request(self, method):
+        url = urlsplit(self.path)
+        fields = dict(parse_qsl(url.query))
+        # read the request body first, so the connection can be reused
+        # whatever the answer
+        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        token = self.headers.get('Authorization')
+        if not token:
+            return self.send_json(401, {'error': 'Unauthorized'})
+        delay, headers = self.server.check_rate_limit(token)
+        if delay is not None:
+            headers['Retry-After'] = str(int(math.ceil(delay)))
+            headers['x-ratelimit-reset'] = headers['Retry-After']
+            return self.send_json(
+                429, {'error': 'Too Many Requests'}, headers)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status = self.server.should_fail()
+        if status is not None:
+            return self.send_json(
+                status, {'error': 'Simulated failure'}, headers)
+        try:
+            if method == 'GET':
+                body = self.route(url.path, fields)
+            else:
+                body = self.write(method, url.path, data)
+        except NotFound:
+            return self.send_json(404, {'error': 'Not Found'}, headers)
+        except BadRequest as error:
+            return self.send_json(422, {'error': str(error)}, headers)
+        except Conflict as error:
+            return self.send_json(409, {'error': str(error)}, headers)
+        self.send_json(200, body, headers)
+
+    def write(self, method, path, data):
+        """Create (POST) or update (PUT) a receipt with the JSON request body
+        `data`, and return the response body"""
+        match = _WRITE_ROUTES[method].match(path)
+        if not match:
+            raise NotFound()
+        try:
+            receipt = json.loads(data or b'{}')
+        except ValueError:
+            raise BadRequest("invalid JSON body")
+        company_id = int(match.group(1))
+        if method == 'POST':
+            receipt_id = receipt.get('receipt_id')
+            if not receipt_id:
+                raise BadRequest("receipt_id is required")
+        else:
+            receipt_id = match.group(2)
+        key = (company_id, receipt_id)
+        receipts = self.server.receipts
+        with self.server._lock:
+            if method == 'POST' and key in receipts:
+                raise Conflict(
+                    "receipt {} already exists".format(receipt_id))
+            if method == 'PUT':
+                if key not in receipts:
+                    raise NotFound()
+                receipt = dict(receipts[key], **receipt)
+            receipt.update(
+                receipt_id=receipt_id, company_id=company_id,
+                id=str(uuid.uuid5(uuid.NAMESPACE_URL, '{}/{}'.format(
+                    company_id, receipt_id))))
+            receipts[key] = receipt
+        return {'data': {'uuid': receipt['id'], 'receipt_id': receipt_id},
+                'object': receipt}
+
+    def route(self, path, fields):
+        "Returns the response body for a GET of `path` with `fields`"
+        data = self.server.data
+        for pattern, name in _ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            raise NotFound()
+        if name == 'whoami':
+            return {'data': {'identity_id': 1, 'companies': [
+                data.company(i + 1) for i in range(data.companies)]}}
+        if name == 'companies':
+            if match.group(1):
+                return {'data': data.company(int(match.group(1)))}
+            return self.list_response([
+                data.company(i + 1) for i in range(data.companies)], None)
+        if name == 'collection':
+            company_id, kind, item_id = match.groups()
+            if item_id:
+                return {'data': data.get(kind, int(company_id), item_id)}
+            limit = int(fields.get('limit') or 20)
+            if limit > self.server.max_limit:
+                raise BadRequest(
+                    "limit must be at most {}".format(self.server.max_limit))
+            items, cursor = data.page(kind, int(company_id), fields, limit)
+            if self.server.item_latency:
+                time.sleep(self.server.item_latency * len(items))
+            return self.list_response(items, cursor, fields.get('cursor'))
+        if name == 'user_detail':
+            company_id, user_id, detail = match.groups()
+            return {'data': getattr(data, detail)(
+                int(company_id), int(user_id))}
+        if match.group(1) == 'hours_and_wages':
+            # the report isn't wrapped in 'data'
+            return data.hours_and_wages(fields)
+        return {'data': data.daily_sales_and_labor(fields)}
+
+    @staticmethod
+    def list_response(items, next_cursor, cursor=None):
+        return {'data': items, 'meta': {'cursor': {
+            'current': cursor, 'prev': None, 'next': next_cursor,
+            'count': len(items)}}}
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf8')
+        etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            status, data = 304, b''
+        self.server.count(status)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main(args):
+    "Run a mock server with the options parsed from the command line"
+    logging.basicConfig(
+        level=logging.DEBUG if args['--verbose'] else logging.INFO,
+        format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    data = MockData(
+        seed=int(args['--seed']), companies=int(args['--companies']),
+        locations=int(args['--locations']),
+        departments=int(args['--departments']), roles=int(args['--roles']),
+        users=int(args['--users']), punches=int(args['--punches']),
+        shifts=int(args['--shifts']), receipts=int(args['--receipts']),
+        start=datetime.date.fromisoformat(args['--start']),
+        days=int(args['--days']))
+    rate_limit = args['--rate-limit']
+    server = MockServer(
+        data, host=args['--host'], port=int(args['--port']),
+        rate_limit=float(rate_limit) if rate_limit else None,
+        error_rate=float(args['--error-rate']),
+        latency=float(args['--latency']),
+        item_latency=float(args['--item-latency']),
+        max_limit=int(args['--max-limit']))
+    server.log.info("serving %r at %s", data, server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    from docopt import docopt
+    raise SystemExit(main(docopt(__doc__)))
@@ -0,0 +1,190 @@
+"""
+Adaptive page sizes for paged list endpoints.
+
+Each list function starts from a sensible page size for its endpoint, but the
+best size depends on how the API is behaving. A :class:`PageSizer` attached
+to the client (``get_client(page_sizer=True)``) is consulted by
+:func:`lib7shifts.base.page_api_get_results` before every page, and adjusts
+the size per endpoint:
+
+- pages that come back full and quickly let the size grow, up to the largest
+  size the endpoint has been seen to accept
+- slow or very large responses shrink the size towards the latency and
+  payload targets
+- timeouts and server errors halve the size, and the page is tried again,
+  unless the client's retry policy covers them: then the client has already
+  retried the page for as long as its policy allows, and the error is raised
+- a 400/422 response that names the `limit` field, to a size larger than any
+  accepted before and larger than the endpoint's default, marks that size
+  as too large; the page is tried again with a smaller one, and growth then
+  bisects between the largest accepted and smallest rejected sizes. Any
+  other 400/422 is a real client error, and is raised at once
+
+A page is only tried again with a smaller size `max_retries` times before
+the error is raised.
+
+Sizes are remembered per endpoint template (IDs removed from the path) for
+the life of the sizer.
+"""
+import re
+import json
+import threading
+import urllib3
+from . import exceptions
+
+#: Path segments that identify a particular entity, replaced with '{id}'
+_ID_SEGMENT = re.compile(
+    r'/(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+    r'[0-9a-fA-F]{12})(?=/|$)')
+
+#: Statuses suggesting the request was rejected for asking too much
+REJECTED_STATUSES = frozenset([400, 422])
+
+#: Matches error messages that mention the page size field
+_NAMES_LIMIT = re.compile(r'\blimit\b', re.IGNORECASE)
+
+#: Statuses suggesting the server timed out building the response
+TIMEOUT_STATUSES = frozenset([500, 502, 504])
+
+
+def endpoint_template(path):
+    """Returns `path` with numeric and UUID segments replaced by '{id}', eg.
+    '/v2/company/1234/time_punches' becomes '/v2/company/{id}/time_punches',
+    so that statistics can be grouped by endpoint. Query strings are
+    dropped."""
+    return _ID_SEGMENT.sub('/{id}', path.split('?', 1)[0])
+
+
+def is_timeout(error):
+    """Returns True if `error` looks like the request timed out, either on our
+    side or in the 7shifts backend."""
+    if isinstance(error, urllib3.exceptions.MaxRetryError):
+        error = error.reason
+    if isinstance(error, urllib3.exceptions.TimeoutError):
+        return True
+    return isinstance(error, exceptions.APIError) and \
+        error.status in TIMEOUT_STATUSES
+
+
+def names_limit(error):
+    """Returns True if the body or message of `error` mentions the `limit`
+    field, suggesting the page size itself was rejected."""
+    if isinstance(error, exceptions.APIError):
+        return bool(_NAMES_LIMIT.search(json.dumps(error.response)))
+    return bool(_NAMES_LIMIT.search(str(error)))
+
+
+def _retried_by(retry, error):
+    """Returns True if the client's `retry` policy (if any) retries GET
+    requests that fail with `error`"""
+    if retry is None:
+        return False
+    if isinstance(error, exceptions.APIError):
+        return retry.retries('GET', status=error.status)
+    return retry.retries('GET', error=error)
+
+
+class PageSizer(object):
+    """Tracks a page size per endpoint template. Safe to share between
+    threads and clients."""
+
+    def __init__(self, min_size=10, max_size=1000, target_seconds=2.0,
+                 max_bytes=4 * 1024 * 1024, growth=1.5, max_retries=2):
+        """
+        - min_size: never use pages smaller than this
+        - max_size: never ask for pages larger than this
+        - target_seconds: responses slower than this shrink the page size,
+          responses faster than half of it allow growth
+        - max_bytes: responses larger than this shrink the page size
+        - growth: the factor to grow by after a fast, full page
+        - max_retries: the number of times a page is tried again with a
+          smaller size before its error is raised
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.growth = growth
+        self.max_retries = max_retries
+        self._sizes = {}
+        self._accepted = {}
+        self._rejected = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.sizes())
+
+    def sizes(self):
+        "Returns a dictionary of the current page size per endpoint template"
+        with self._lock:
+            return dict(self._sizes)
+
+    def get(self, endpoint, default):
+        """Returns the page size to use for the next page of `endpoint`,
+        starting at `default` for endpoints that haven't been seen yet."""
+        template = endpoint_template(endpoint)
+        with self._lock:
+            return self._sizes.setdefault(template, self._clamp(
+                template, default))
+
+    def record_page(self, endpoint, limit, rows, seconds, nbytes=None):
+        """Record a successful page of `rows` results (out of a requested
+        `limit`) which took `seconds` to fetch and was `nbytes` long."""
+        template = endpoint_template(endpoint)
+        with self._lock:
+            self._accepted[template] = max(
+                limit, self._accepted.get(template, 0))
+            size = limit
+            if seconds > self.target_seconds:
+                size = int(limit * self.target_seconds / seconds)
+            elif nbytes and nbytes > self.max_bytes:
+                size = int(limit * self.max_bytes / nbytes)
+            elif rows >= limit and seconds < self.target_seconds / 2:
+                size = int(limit * self.growth) + 1
+                if template in self._rejected:
+                    size = min(size, (
+                        self._accepted[template] + self._rejected[template])
+                        // 2)
+            self._sizes[template] = self._clamp(template, size)
+
+    def record_failure(self, endpoint, limit, error, default=None,
+                       succeeded=0, retries=0, retry=None):
+        """Record an error raised while fetching a page of `limit` results.
+        Returns True if a smaller page size has been chosen and the page
+        should be tried again, or False if the error should be raised.
+
+        - default: the endpoint's default page size; sizes at or below it
+          are never taken to be too large
+        - succeeded: the largest page size that the same listing (with the
+          same filters) has already fetched a page with
+        - retries: the number of times this page has already been tried
+          again
+        - retry: the client's :class:`lib7shifts.retry.RetryPolicy`, if it
+          has one; errors that it retries are not tried again here
+        """
+        if retries >= self.max_retries:
+            return False
+        template = endpoint_template(endpoint)
+        with self._lock:
+            accepted = self._accepted.get(template, 0)
+            if isinstance(error, exceptions.APIError) and \
+                    error.status in REJECTED_STATUSES:
+                if limit <= max(accepted, default or 0, self.min_size) or \
+                        not names_limit(error):
+                    return False
+                self._rejected[template] = min(
+                    limit, self._rejected.get(template, limit))
+                size = max(accepted, succeeded, limit // 2)
+            elif is_timeout(error) and limit > self.min_size and \
+                    not _retried_by(retry, error):
+                size = limit // 2
+            else:
+                return False
+            self._sizes[template] = self._clamp(template, size)
+            return self._sizes[template] < limit
+
+    def _clamp(self, template, size):
+        "Must be called with the lock held"
+        upper = min(self.max_size, self._rejected.get(
+            template, self.max_size + 1) - 1)
+        return max(self.min_size, min(upper, size))
@@ -0,0 +1,181 @@
+"""
+Native rate limiting for the 7shifts API client.
+
+The 7shifts API enforces a request budget per access token, and replies with
+HTTP 429 once that budget has been used up. :class:`TokenBucket` holds back
+requests on the client side so that the budget is never exceeded, and keeps
+itself in step with the server by reading the rate-limit headers that come
+back with each response. Pass one to the client like this::
+
+    import lib7shifts
+    client = lib7shifts.get_client(rate_limit=10)  # 10 requests per second
+
+    # or, to share one budget between several clients/threads:
+    bucket = lib7shifts.ratelimit.TokenBucket(rate=10)
+    client = lib7shifts.get_client(rate_limit_lock=bucket)
+
+"""
+import time
+import threading
+
+#: Header holding the number of requests allowed in the current window
+LIMIT_HEADER = 'x-ratelimit-limit'
+
+#: Header holding the number of requests left in the current window
+REMAINING_HEADER = 'x-ratelimit-remaining'
+
+#: Header holding the time at which the window resets, either as a number of
+#: seconds from now or as a unix timestamp
+RESET_HEADER = 'x-ratelimit-reset'
+
+#: Standard HTTP header sent with 429 responses, in seconds
+RETRY_AFTER_HEADER = 'retry-after'
+
+#: Reset header values above this are treated as unix timestamps rather than
+#: a number of seconds
+_EPOCH_THRESHOLD = 10 ** 9
+
+
+def get_header(headers, name):
+    """Case-insensitive lookup of `name` in a headers mapping. urllib3 and
+    aiohttp headers are already case-insensitive, but plain dictionaries
+    (eg. from tests or recorded responses) are not. Returns None if the header
+    is missing."""
+    if headers is None:
+        return None
+    value = headers.get(name)
+    if value is None:
+        for key, val in headers.items():
+            if key.lower() == name:
+                return val
+    return value
+
+
+def _parse_number(value):
+    "Parse a numeric header value, returning None if it isn't numeric"
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket. Tokens refill continuously at `rate` per
+    second up to `capacity`, and every request consumes one token through
+    :meth:`acquire`, which blocks until a token is available. A single bucket
+    may be shared by any number of threads and clients.
+
+    After each response the client calls :meth:`update_from_headers`, which
+    lets the server's view of the budget override the local one: if the
+    server reports fewer remaining requests than the bucket holds, the bucket
+    is drained to match, and once the server reports that nothing remains
+    (or sends a Retry-After), requests are held back until the window resets.
+    """
+
+    def __init__(self, rate=10.0, capacity=None, clock=time.monotonic):
+        """
+        - rate: the number of requests per second to allow
+        - capacity: the largest burst of requests to allow, defaults to
+          `rate` (ie. one second's worth of requests)
+        - clock: a monotonic clock function, replaceable for testing
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than zero")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(rate={}, capacity={})".format(
+            self.__class__.__name__, self.rate, self.capacity)
+
+    @property
+    def tokens(self):
+        "The number of tokens currently available (may be fractional)"
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self, tokens=1, timeout=None):
+        """Take `tokens` from the bucket, blocking until they are available.
+        Returns True once they have been taken, or False if `timeout` seconds
+        pass first."""
+        deadline = None
+        if timeout is not None:
+            deadline = self._clock() + timeout
+        while True:
+            with self._lock:
+                wait = self._try_take(tokens)
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """Synchronize the bucket with the rate-limit headers from an API
+        response. Unknown or malformed headers are ignored."""
+        limit = _parse_number(get_header(headers, LIMIT_HEADER))
+        remaining = _parse_number(get_header(headers, REMAINING_HEADER))
+        reset = _parse_number(get_header(headers, RESET_HEADER))
+        retry_after = _parse_number(get_header(headers, RETRY_AFTER_HEADER))
+        with self._lock:
+            self._refill()
+            if limit is not None and limit > 0:
+                self.capacity = min(self.capacity, limit)
+            if remaining is not None:
+                self._tokens = min(self._tokens, remaining)
+                if remaining <= 0 and reset is not None:
+                    self._block_for(self._seconds_until(reset))
+            if retry_after is not None:
+                self._block_for(retry_after)
+
+    def block(self, seconds):
+        """Hold back all requests for the given number of seconds, eg. after
+        the server has replied with a 429."""
+        with self._lock:
+            self._block_for(seconds)
+
+    def _block_for(self, seconds):
+        "Must be called with the lock held"
+        if seconds > 0:
+            self._tokens = min(self._tokens, 0.0)
+            self._blocked_until = max(
+                self._blocked_until, self._clock() + seconds)
+
+    @staticmethod
+    def _seconds_until(reset):
+        "Convert a reset header value into a number of seconds from now"
+        if reset > _EPOCH_THRESHOLD:
+            return reset - time.time()
+        return reset
+
+    def _refill(self):
+        "Must be called with the lock held"
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        if elapsed > 0:
+            self._tokens = min(
+                self.capacity, self._tokens + elapsed * self.rate)
+
+    def _try_take(self, tokens):
+        """Must be called with the lock held. Takes the tokens and returns 0
+        if possible, otherwise returns the number of seconds to wait before
+        trying again."""
+        self._refill()
+        now = self._clock()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0
+        return (tokens - self._tokens) / self.rate
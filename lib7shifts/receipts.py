@@ -5,12 +5,28 @@ receipts in 7shifts, which are used for sales projections and dashboards.
 See https://developers.7shifts.com/reference/listsalesreceipts for more
 details.
 """
+import time
+import collections
+import concurrent.futures
 from . import base
 from . import exceptions
 from . import dates
+from . import records
+from .retry import RetryPolicy
 
 ENDPOINT = '/v2/company/{company_id}/receipts'
 
+#: Statuses with which the API refuses to create a receipt because one with
+#: the same receipt_id already exists
+CONFLICT_STATUSES = frozenset([409])
+
+#: How the creates and updates of upserts are retried, where the client's
+#: own retry policy doesn't. That policy leaves POST alone, since it isn't
+#: idempotent, but an upsert is: a 429 means the receipt wasn't written, and
+#: a create that went through despite a 503 gets a 409 when tried again, and
+#: becomes an update.
+UPSERT_RETRY = RetryPolicy(statuses=(429, 503), methods=('POST', 'PUT'))
+
 
 def get_receipt(client, company_id, receipt_id):
     """Retrieve a single receipt from the 7shifts API."""
@@ -22,7 +38,8 @@ def get_receipt(client, company_id, receipt_id):
         raise exceptions.EntityNotFoundError('Receipt', receipt_id)
 
 
-def list_receipts(client, company_id, **kwargs):
+def list_receipts(client, company_id, shards=None, compact=False,
+                  raw=False, lazy=False, **kwargs):
     """List sales receipts from 7shifts. If no arguments are provided,
     the past 90 days' worth of receipts will be provided. Narrow that down with
     the following filter params, as kwargs:
@@ -42,6 +59,21 @@ def list_receipts(client, company_id, **kwargs):
     be cast to an ISO8601 date-time format supported by the API, using the
     local timezone for any timezone-unaware datetime objects.
 
+    To speed up large listings, pass `shards` (not an API parameter) to
+    split the receipt_date[gte] to receipt_date[lte] range (both required)
+    into that many time windows, fetched concurrently. Since the endpoint
+    has no sort parameter, receipts are then yielded window by window: in
+    receipt_date order from one window to the next, and in the order the
+    API lists them within each. See
+    :func:`lib7shifts.base.page_api_get_results_sharded`.
+
+    Set `compact` to get :class:`ReceiptRecord` objects, which take a
+    fraction of the memory, instead of :class:`Receipt` objects.
+
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`Receipt` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
+
     Data will be yielded out in an iterable format like this::
 
         [
@@ -88,10 +120,26 @@ def list_receipts(client, company_id, **kwargs):
         ]
 
     """
+    kwargs = _list_receipts_params(kwargs)
+    endpoint = ENDPOINT.format(company_id=company_id)
+    if shards:
+        results = base.page_api_get_results_sharded(
+            client, endpoint, 'receipt_date', shards=shards, **kwargs)
+    else:
+        results = base.page_api_get_results(client, endpoint, **kwargs)
+    if compact:
+        yield from map(ReceiptRecord.from_dict, results)
+        return
+    yield from base.iter_objects(results, Receipt, raw, lazy)
+
+
+def _list_receipts_params(kwargs):
+    """Validate the filters for the List Receipts endpoint, apply the default
+    page size and cast dates to iso8601 form. Returns the updated `kwargs`
+    dictionary."""
     if 'location_id' not in kwargs:
         raise RuntimeError("location_id must be provided as a kwarg")
-    if 'limit' not in kwargs:
-        kwargs['limit'] = 100
+    kwargs.setdefault('default_limit', 100)
     # modified date must be a full datetime string w/timezone for this endpoint
     try:
         kwargs['modified_since'] = dates.iso8601_dt(kwargs['modified_since'])
@@ -105,9 +153,7 @@ def list_receipts(client, company_id, **kwargs):
         # cast to iso8601 because the endpoint supports full date-time
         kwargs['receipt_date[gte]'] = dates.iso8601_dt(
             kwargs.get('receipt_date[gte]'))
-    for item in base.page_api_get_results(
-            client, ENDPOINT.format(company_id=company_id), **kwargs):
-        yield Receipt(**item)
+    return kwargs
 
 
 def create_receipt(client, company_id, **kwargs):
@@ -148,5 +194,145 @@ def update_receipt(client, company_id, receipt_id, **kwargs):
     return response
 
 
+class UpsertResult(collections.namedtuple(
+        'UpsertResult', 'index receipt_id action uuid error')):
+    """The outcome of upserting one receipt with
+    :func:`bulk_upsert_receipts`:
+
+    - index: the position of the receipt in the input
+    - receipt_id: its external receipt_id
+    - action: 'created' or 'updated' if it succeeded, else None
+    - uuid: the 7shifts UUID of the receipt, if it succeeded
+    - error: the exception raised if it failed, else None
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        "True if the receipt was created or updated"
+        return self.error is None
+
+
+def upsert_receipt(client, company_id, exists=False, retry=UPSERT_RETRY,
+                   **kwargs):
+    """Create the receipt described by `kwargs`, or update it if one with its
+    `receipt_id` (required) already exists. Pass `exists` as True if it's
+    known to exist, to go straight to the update. Returns a tuple of the
+    action taken ('created' or 'updated') and the receipt's 7shifts UUID.
+
+    The create and the update are each retried according to `retry` (a
+    :class:`lib7shifts.retry.RetryPolicy`, by default :data:`UPSERT_RETRY`,
+    or None not to retry), waiting as long as a Retry-After header asks.
+    A request whose method the client's own retry policy covers (eg. the
+    update, a PUT, with the default :class:`lib7shifts.retry.RetryPolicy`)
+    is left to the client to retry instead, so that the two don't
+    multiply."""
+    if not kwargs.get('receipt_id'):
+        raise RuntimeError("receipt_id must be provided as a kwarg")
+    if not exists:
+        try:
+            return 'created', _retried(
+                client, retry, 'POST', create_receipt, client, company_id,
+                **kwargs)
+        except exceptions.APIError as error:
+            if error.status not in CONFLICT_STATUSES:
+                raise
+    fields = dict(kwargs)
+    receipt_id = fields.pop('receipt_id')
+    response = _retried(
+        client, retry, 'PUT', update_receipt, client, company_id, receipt_id,
+        **fields)
+    return 'updated', response['data']['uuid']
+
+
+def _retried(client, retry, method, func, *args, **kwargs):
+    """Returns ``func(*args, **kwargs)``, calling it again after any
+    :class:`exceptions.APIError` that the `retry` policy allows for a
+    `method` request, unless `client` retries `method` requests itself"""
+    if client.retry is not None and method in client.retry.methods:
+        retry = None
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except exceptions.APIError as error:
+            if retry is None:
+                raise
+            delay = retry.get_delay(
+                method, attempt, time.monotonic() - started,
+                status=error.status, headers=error.headers)
+            if delay is None:
+                raise
+        time.sleep(delay)
+        attempt += 1
+
+
+def bulk_upsert_receipts(client, company_id, receipts, max_workers=8,
+                         existing=(), retry=UPSERT_RETRY):
+    """Upsert many receipts concurrently with :func:`upsert_receipt`, using
+    a pool of `max_workers` threads, and yield an :class:`UpsertResult` for
+    each as it finishes (not necessarily in input order). `receipts` is an
+    iterable of receipt dictionaries, each with a `receipt_id`; it is
+    consumed a few at a time, so it may be a generator of any length.
+    `existing` is a collection of receipt_ids known to exist already (eg.
+    from :func:`list_receipts`), which are updated without first trying to
+    create them.
+
+    A receipt that can't be upserted doesn't stop the others; its result
+    holds the error instead::
+
+        results = list(bulk_upsert_receipts(client, 1234, receipts))
+        failed = [result for result in results if not result.ok]
+
+    Requests go through the client's rate limiter and, if it has one, its
+    concurrency limiter, so `max_workers` only needs to be large enough to
+    make use of them. Creates and updates refused with a 429 or 503 are
+    retried, by the client or by `retry`, see :func:`upsert_receipt`.
+    """
+    existing = frozenset(existing)
+
+    def upsert(index, receipt):
+        receipt_id = receipt.get('receipt_id')
+        try:
+            action, uuid = upsert_receipt(
+                client, company_id, exists=receipt_id in existing,
+                retry=retry, **receipt)
+        except Exception as error:
+            return UpsertResult(index, receipt_id, None, None, error)
+        return UpsertResult(index, receipt_id, action, uuid, None)
+
+    receipts = enumerate(receipts)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        # only keep a couple of receipts per thread in hand at a time
+        pending = set()
+        for index, receipt in receipts:
+            pending.add(executor.submit(upsert, index, receipt))
+            if len(pending) >= 2 * max_workers:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
 class Receipt(base.APIObject):
     """Represents a 7shifts sales receipt object."""
+
+
+class ReceiptRecord(records.Record):
+    """A compact form of :class:`Receipt`, see :mod:`lib7shifts.records`.
+    Date-time fields are :class:`datetime.datetime` objects with the offset
+    the API sent."""
+    SCHEMA = (
+        ('id', str), ('company_id', int), ('location_id', int),
+        ('pos_id', int), ('receipt_id', str),
+        ('receipt_date', records.DateTime(iso=True)), ('net_total', int),
+        ('gross_total', int), ('tips', int),
+        ('total_receipt_discounts', int), ('total_item_discounts', int),
+        ('external_user_id', str), ('revenue_center', str),
+        ('receipt_lines', list), ('tip_details', list), ('status', str),
+        ('created_date', records.DateTime(iso=True)),
+        ('modified_date', records.DateTime(iso=True)),
+    )
@@ -0,0 +1,259 @@
+"""
+Compact, typed records for large listings.
+
+The objects returned by the ``list_`` functions are dictionaries, which
+is convenient but costly when millions of rows are held in memory at once.
+A record class declares the fields of an endpoint's rows in its `SCHEMA`
+and keeps each row in slots instead, with date-time fields parsed into
+:class:`datetime.datetime` objects as the row is loaded. Pass
+``compact=True`` to :func:`lib7shifts.list_punches`,
+:func:`lib7shifts.list_shifts` or :func:`lib7shifts.list_receipts` to get
+records rather than dictionaries::
+
+    for punch in lib7shifts.list_punches(client, 1234, compact=True):
+        print(punch.user_id, punch.clocked_in, punch['clocked_out'])
+
+Attributes hold the typed values. Item access and :meth:`Record.get` give a
+field as the API sent it, so code written for the dictionary objects keeps
+working, and :meth:`Record.to_dict` returns the whole row in that form
+(eg. to build the full object, ``TimePunch(**punch.to_dict())``). Fields
+that aren't in the schema are kept too, and are only available that way.
+
+See ``benchmarks/records_memory.py`` for the memory saved.
+"""
+import datetime
+from . import dates
+
+
+class DateTime(object):
+    """A date-time field. The API sends these as 'YYYY-MM-DD HH:MM:SS'
+    strings in `tzinfo` (UTC, unless `local` is set, in which case the local
+    timezone; None leaves them unaware, for the record class to set), or as
+    ISO 8601 strings if `iso` is set. Values are plain
+    :class:`datetime.datetime` objects, which take less memory than
+    :class:`lib7shifts.dates.DateTime7Shifts` ones.
+
+    Values that can't be parsed, like the '0000-00-00 00:00:00' of a punch
+    that is still open, are kept as the API sent them, so that the record
+    gives them back unchanged, but read as None from the record's
+    attribute."""
+
+    def __init__(self, tzinfo=datetime.timezone.utc, local=False, iso=False):
+        self.tzinfo = tzinfo
+        self.local = local
+        self.iso = iso
+
+    def __repr__(self):
+        return "{}(local={}, iso={})".format(
+            self.__class__.__name__, self.local, self.iso)
+
+    def load(self, value):
+        "Parse an API value"
+        if not value:
+            return value
+        try:
+            parsed = datetime.datetime.fromisoformat(
+                value.replace('Z', '+00:00') if self.iso else value)
+        except (TypeError, ValueError):
+            return value
+        if self.iso and parsed.tzinfo is not None:
+            return parsed
+        if self.local:
+            return parsed.replace(tzinfo=dates.get_local_tz())
+        return parsed.replace(tzinfo=self.tzinfo)
+
+    def dump(self, value):
+        "Format a parsed value as the API would send it"
+        if not isinstance(value, datetime.datetime):
+            return value
+        if self.iso:
+            return value.isoformat()
+        return value.replace(tzinfo=None).isoformat(' ', 'seconds')
+
+    @staticmethod
+    def typed(value):
+        "Returns the attribute value for a loaded `value`"
+        if isinstance(value, datetime.datetime):
+            return value
+        return None
+
+
+class Records(object):
+    "A field holding a list of nested records, of `record_class`"
+
+    def __init__(self, record_class):
+        self.record_class = record_class
+
+    def __repr__(self):
+        return "{}({})".format(
+            self.__class__.__name__, self.record_class.__name__)
+
+    def load(self, value):
+        "Load a list of API dictionaries"
+        if value is None:
+            return None
+        return [self.record_class.from_dict(item) for item in value]
+
+    def dump(self, value):
+        "Return the records as a list of API dictionaries"
+        if value is None:
+            return None
+        return [record.to_dict() for record in value]
+
+
+class _TypedField(object):
+    """The attribute of a field whose type has a `typed` method: the value
+    is kept in the slot `slot`, as loaded, and read through `typed`"""
+    __slots__ = ('slot', 'typed')
+
+    def __init__(self, slot, typed):
+        self.slot = slot
+        self.typed = typed
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        return self.typed(self.slot.__get__(record, owner))
+
+    def __set__(self, record, value):
+        self.slot.__set__(record, value)
+
+
+class _RecordType(type):
+    """Gives each record class a slot per field of its `SCHEMA`, and works out
+    which fields need loading and dumping"""
+
+    def __new__(mcs, name, bases, namespace):
+        if 'SCHEMA' not in namespace:
+            # a subclass adding methods only, sharing its parent's fields
+            namespace.setdefault('__slots__', ())
+            return super(_RecordType, mcs).__new__(
+                mcs, name, bases, namespace)
+        schema = tuple(namespace['SCHEMA'])
+        # fields read through a `typed` method keep their value in a slot
+        # of another name, with the field's attribute in front of it
+        slots = tuple(
+            '_' + field if hasattr(kind, 'typed') else field
+            for field, kind in schema)
+        namespace['__slots__'] = tuple(namespace.get('__slots__', ())) + \
+            slots
+        cls = super(_RecordType, mcs).__new__(mcs, name, bases, namespace)
+        for (field, kind), slot in zip(schema, slots):
+            if slot != field:
+                setattr(cls, field, _TypedField(
+                    cls.__dict__[slot], kind.typed))
+        cls._fields = tuple(field for field, _ in schema)
+        cls._slots = dict(zip(cls._fields, slots))
+        cls._field_set = frozenset(cls._fields)
+        cls._plain = tuple(
+            field for field, kind in schema if not hasattr(kind, 'load'))
+        cls._typed = tuple(
+            (field, kind) for field, kind in schema if hasattr(kind, 'load'))
+        cls._dumpers = dict(
+            (field, kind.dump) for field, kind in cls._typed)
+        return cls
+
+
+class Record(object, metaclass=_RecordType):
+    """
+    The base class of compact records. Subclasses list their fields in
+    `SCHEMA`, as ``(name, type)`` pairs, in the order the API sends them.
+    A type is either a plain Python type, for values that the JSON decoder
+    already produces (int, str, bool, list...), or an object with `load`
+    and `dump` methods, like :class:`DateTime` or :class:`Records`, to
+    convert the API value.
+    """
+    __slots__ = ('_extra',)
+    SCHEMA = ()
+
+    def __init__(self, **fields):
+        self._load(fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load a record from a dictionary of API data, without copying it
+        into kwargs first"""
+        record = cls.__new__(cls)
+        record._load(data)
+        return record
+
+    def _load(self, data):
+        for field in self._plain:
+            setattr(self, field, data.get(field))
+        for field, kind in self._typed:
+            setattr(self, field, kind.load(data.get(field)))
+        self._extra = None
+        if not self._field_set.issuperset(data):
+            self._extra = dict((key, value) for key, value in data.items()
+                               if key not in self._field_set)
+
+    def to_dict(self):
+        "Returns the record as a dictionary, in the form the API sent it"
+        data = {}
+        dumpers = self._dumpers
+        slots = self._slots
+        for field in self._fields:
+            value = getattr(self, slots[field])
+            if field in dumpers:
+                value = dumpers[field](value)
+            data[field] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            value = getattr(self, self._slots[key])
+            if key in self._dumpers:
+                value = self._dumpers[key](value)
+            return value
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        "As for :meth:`dict.get`, giving the value as the API sent it"
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        "Returns the names of all of the record's fields"
+        keys = list(self._fields)
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key):
+        return key in self._field_set or bool(
+            self._extra and key in self._extra)
+
+    def __len__(self):
+        return len(self._fields) + len(self._extra or ())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return dict(
+            (slot, getattr(self, slot))
+            for slot in tuple(self._slots.values()) + ('_extra',))
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, ", ".join(
+            "{}={!r}".format(field, getattr(self, field))
+            for field in self._fields))
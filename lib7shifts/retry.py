@@ -0,0 +1,130 @@
+"""
+Retry policies for the 7shifts API client.
+
+Long-running listings (such as a sync pulling hundreds of pages of punches)
+should not be aborted by a single 429 or 502. A :class:`RetryPolicy` tells
+:class:`lib7shifts.APIClient7Shifts` which failures may be retried, and how
+long to wait between attempts, eg::
+
+    import lib7shifts
+    from lib7shifts.retry import RetryPolicy
+    client = lib7shifts.get_client(
+        retry=RetryPolicy(total=8, backoff_factor=1, deadline=600))
+
+Because retries happen per request, a listing that hits an error part-way
+through resumes from the same pagination cursor rather than starting over.
+"""
+import time
+import random
+import datetime
+import email.utils
+from .ratelimit import get_header, RETRY_AFTER_HEADER
+
+#: HTTP methods that are safe to repeat
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+#: Response codes that indicate a transient failure
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header value, which may either be a number of
+    seconds or an HTTP date. Returns a number of seconds (never negative), or
+    None if the value can't be understood."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryPolicy(object):
+    """
+    Describes when and how failed requests are retried.
+
+    Delays grow exponentially with "full jitter": the n-th retry waits a
+    random time between 0 and ``backoff_factor * 2 ** n`` seconds, capped at
+    `max_backoff`. A Retry-After header from the server takes precedence over
+    the computed delay. No retry is attempted once `total` retries have been
+    made, or if waiting would carry the request past its `deadline`.
+    """
+
+    def __init__(self, total=5, backoff_factor=0.5, max_backoff=60.0,
+                 deadline=300.0, statuses=RETRY_STATUSES,
+                 methods=IDEMPOTENT_METHODS, respect_retry_after=True,
+                 jitter=True):
+        """
+        - total: the maximum number of retries for one request
+        - backoff_factor: base delay, in seconds, for the exponential backoff
+        - max_backoff: the longest delay between two attempts, in seconds
+        - deadline: the longest time, in seconds, to spend on one request
+          including all retries (None for no deadline)
+        - statuses: the HTTP status codes that should be retried
+        - methods: the HTTP methods that may be retried (POST is excluded by
+          default since it is not idempotent)
+        - respect_retry_after: whether to honour Retry-After headers
+        - jitter: randomize delays to avoid synchronized retry storms
+        """
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.respect_retry_after = respect_retry_after
+        self.jitter = jitter
+
+    def __repr__(self):
+        return "{}(total={}, backoff_factor={}, deadline={})".format(
+            self.__class__.__name__, self.total, self.backoff_factor,
+            self.deadline)
+
+    def backoff(self, attempt):
+        "Returns the backoff delay before retry number `attempt` (0-based)"
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def retries(self, method, status=None, error=None):
+        """Returns True if the policy retries failures of `method` requests
+        with `status` (or raising `error`) at all, however many attempts or
+        however long they take."""
+        if method.upper() not in self.methods:
+            return False
+        return error is not None or status in self.statuses
+
+    def get_delay(self, method, attempt, elapsed, status=None, headers=None,
+                  error=None):
+        """Decide whether a failed attempt should be retried.
+
+        - method: the HTTP method of the request
+        - attempt: the number of retries already made for this request
+        - elapsed: the seconds spent on this request so far
+        - status: the HTTP status of the response, if one was received
+        - headers: the headers of the response, if one was received
+        - error: the exception raised, if no response was received
+
+        Returns the number of seconds to sleep before retrying, or None if
+        the request should not be retried.
+        """
+        if method.upper() not in self.methods or attempt >= self.total:
+            return None
+        if error is None and status not in self.statuses:
+            return None
+        delay = None
+        if self.respect_retry_after:
+            delay = parse_retry_after(get_header(headers, RETRY_AFTER_HEADER))
+        if delay is None:
+            delay = self.backoff(attempt)
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
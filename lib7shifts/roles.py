@@ -20,7 +20,7 @@ def get_role(client, company_id, role_id):
         raise exceptions.EntityNotFoundError('Role', role_id)
 
 
-def list_roles(client, company_id, **kwargs):
+def list_roles(client, company_id, raw=False, lazy=False, **kwargs):
     """Implements the 'List' operation for 7shifts roles, returning all the
     roles associated with the company you've authenticated with (by default).
 
@@ -32,14 +32,16 @@ def list_roles(client, company_id, **kwargs):
     - modified_since:   a YYYY-MM-DD formatted date to find records changed
                         after
 
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`Role` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
+
     Returns an iterable of :class:`Role` objects.
     """
-    if 'limit' not in kwargs:
-        kwargs['limit'] = 200
-    for item in base.page_api_get_results(
-            client, ENDPOINT.format(company_id=company_id),
-            **kwargs):
-        yield Role(**item)
+    kwargs.setdefault('default_limit', 200)
+    yield from base.iter_objects(base.page_api_get_results(
+        client, ENDPOINT.format(company_id=company_id), **kwargs),
+        Role, raw, lazy)
 
 
 class Role(base.APIObject):
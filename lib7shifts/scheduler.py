@@ -0,0 +1,172 @@
+"""
+Fair scheduling of work across the companies (or other groups) of a job.
+
+When a job works through many companies strictly in order, one company with
+years of data holds up every company after it. A :class:`FairScheduler`
+runs units of work from several groups at once on a pool of threads, and
+whenever a thread is free it goes to the group that has had the least
+worker time so far (divided by its weight). Groups with little data finish
+early, while the big ones keep every spare thread busy::
+
+    scheduler = FairScheduler(max_workers=4)
+    for company_id in company_ids:
+        scheduler.add(company_id, 'shifts', sync_shifts, company_id)
+        for location_id in locations[company_id]:
+            scheduler.add(company_id, 'receipts {}'.format(location_id),
+                          sync_receipts, company_id, location_id)
+    for result in scheduler.run():
+        if not result.ok:
+            print(result.group, result.name, result.error)
+
+Units may add further units while the scheduler runs. A unit that raises
+doesn't stop the others; its :class:`UnitResult` holds the error.
+"""
+import time
+import logging
+import threading
+import collections
+import concurrent.futures
+
+
+class UnitResult(collections.namedtuple(
+        'UnitResult', 'group name result error seconds')):
+    """The outcome of a unit of work: its `group` and `name`, the `result`
+    it returned or the `error` it raised, and the `seconds` it took"""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        "True if the unit finished without raising"
+        return self.error is None
+
+
+class _Group(object):
+    "The pending units of one group, and the worker time it has had"
+    __slots__ = ('key', 'weight', 'pending', 'running', 'seconds', 'order')
+
+    def __init__(self, key, weight, order):
+        self.key = key
+        self.weight = weight
+        self.pending = collections.deque()
+        #: Start times of the group's running units
+        self.running = []
+        self.seconds = 0.0
+        self.order = order
+
+    def share(self, now):
+        """The worker time used so far, including by running units, relative
+        to the group's weight"""
+        return (self.seconds + sum(
+            now - started for started in self.running)) / self.weight
+
+
+class FairScheduler(object):
+    """Runs units of work from several groups on `max_workers` threads,
+    giving each free thread to the group with the least weighted worker
+    time so far. Within a group, units run in the order they were added.
+
+    - max_per_group: the most units of one group allowed to run at once
+      (by default, a group may use every thread no other group needs)
+    - weights: a dictionary of group weights; a group with weight 2 gets
+      twice the worker time of a group with the default weight of 1
+    - on_progress: called with each :class:`UnitResult` and the scheduler
+      as units finish; by default, progress is logged
+    """
+
+    def __init__(self, max_workers=4, max_per_group=None, weights=None,
+                 on_progress=None, clock=time.monotonic):
+        self.max_workers = max_workers
+        self.max_per_group = max_per_group
+        self.weights = dict(weights or {})
+        self.on_progress = on_progress or self.log_progress
+        #: Units added, and units finished
+        self.total = 0
+        self.done = 0
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._clock = clock
+        self._groups = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(done={}, total={})".format(
+            self.__class__.__name__, self.done, self.total)
+
+    def add(self, group, name, func, *args, **kwargs):
+        """Add a unit of work to `group`, named `name` for progress reports,
+        which calls ``func(*args, **kwargs)``. May be called from a running
+        unit, in which case the new unit can start once that one is
+        finished."""
+        with self._lock:
+            entry = self._groups.get(group)
+            if entry is None:
+                entry = self._groups[group] = _Group(
+                    group, self.weights.get(group, 1), len(self._groups))
+            entry.pending.append((name, func, args, kwargs))
+            self.total += 1
+
+    def pending(self):
+        "Returns a dictionary of the number of units left to start per group"
+        with self._lock:
+            return {key: len(group.pending)
+                    for key, group in self._groups.items() if group.pending}
+
+    def run(self):
+        """Run units until there are none left, yielding a
+        :class:`UnitResult` for each as it finishes"""
+        running = set()
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as pool:
+            while True:
+                while len(running) < self.max_workers:
+                    unit = self._next_unit()
+                    if unit is None:
+                        break
+                    running.add(pool.submit(self._run_unit, *unit))
+                if not running:
+                    return
+                finished, running = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    self.on_progress(result, self)
+                    yield result
+
+    def _next_unit(self):
+        """Take the next unit to run, from the eligible group with the least
+        weighted worker time, or return None if no group may start one"""
+        with self._lock:
+            eligible = [group for group in self._groups.values()
+                        if group.pending and (
+                            self.max_per_group is None or
+                            len(group.running) < self.max_per_group)]
+            if not eligible:
+                return None
+            now = self._clock()
+            group = min(eligible,
+                        key=lambda group: (group.share(now), group.order))
+            group.running.append(now)
+            return (group, now) + group.pending.popleft()
+
+    def _run_unit(self, group, started, name, func, args, kwargs):
+        result = error = None
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            error = exc
+        with self._lock:
+            seconds = self._clock() - started
+            group.running.remove(started)
+            group.seconds += seconds
+            self.done += 1
+        return UnitResult(group.key, name, result, error, seconds)
+
+    def log_progress(self, result, scheduler):
+        "The default progress report: log each unit as it finishes"
+        if result.ok:
+            self.log.info("[%d/%d] %s: %s finished in %.1fs", self.done,
+                          self.total, result.group, result.name,
+                          result.seconds)
+        else:
+            self.log.error("[%d/%d] %s: %s failed after %.1fs: %s",
+                           self.done, self.total, result.group, result.name,
+                           result.seconds, result.error,
+                           exc_info=result.error)
@@ -7,6 +7,8 @@ supported operations.
 from . import base
 from . import dates
 from . import exceptions
+from . import records
+from . import timezones
 
 ENDPOINT = '/v2/company/{company_id}/shifts'
 
@@ -25,7 +27,8 @@ def get_shift(client, company_id, shift_id, **params):
         raise exceptions.EntityNotFoundError('Shift', shift_id)
 
 
-def list_shifts(client, company_id, **kwargs):
+def list_shifts(client, company_id, shards=None, compact=False,
+                raw=False, lazy=False, **kwargs):
     """Implements the 'List' operation for 7shifts Shifts, returning the
     shifts associated with the company you've authenticated with based on your
     filter parameters.
@@ -60,10 +63,41 @@ def list_shifts(client, company_id, **kwargs):
     `modified_since` paramter can only be cast to YYYY-MM-DD format based on
     API limitations.
 
+    To speed up large backfills, pass `shards` (not an API parameter) to
+    split the start[gte] to start[lte] range (both required) into that many
+    time windows, fetched concurrently. Results are ordered by the sort_by
+    field, if given. See :func:`lib7shifts.base.page_api_get_results_sharded`.
+
+    Set `compact` to get :class:`ShiftRecord` objects, which take a fraction
+    of the memory, instead of :class:`Shift` objects.
+
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`Shift` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
+
     Returns a :class:`ShiftList` object containing :class:`Shift` objects.
     """
-    if 'limit' not in kwargs:
-        kwargs['limit'] = 500
+    kwargs = _list_shifts_params(kwargs)
+    endpoint = ENDPOINT.format(company_id=company_id)
+    if shards:
+        sort_key, reverse = base.sort_order(
+            kwargs.get('sort_by'), kwargs.get('sort_dir'))
+        results = base.page_api_get_results_sharded(
+            client, endpoint, 'start', shards=shards,
+            sort_key=sort_key, reverse=reverse, **kwargs)
+    else:
+        results = base.page_api_get_results(client, endpoint, **kwargs)
+    if compact:
+        yield from ShiftRecord.from_dicts(results)
+        return
+    yield from base.iter_objects(results, Shift, raw, lazy)
+
+
+def _list_shifts_params(kwargs):
+    """Apply the default page size and cast any start/end filters to the
+    iso8601 form the List Shifts endpoint expects. Returns the updated
+    `kwargs` dictionary."""
+    kwargs.setdefault('default_limit', 500)
     if kwargs.get('start[lte]'):
         # cast to iso8601 because the endpoint supports full date-time
         kwargs['start[lte]'] = dates.iso8601_dt(
@@ -80,10 +114,7 @@ def list_shifts(client, company_id, **kwargs):
         # cast to iso8601 because the endpoint supports full date-time
         kwargs['end[gte]'] = dates.iso8601_dt(
             kwargs.get('end[gte]'))
-    for item in base.page_api_get_results(
-            client, ENDPOINT.format(company_id=company_id),
-            **kwargs):
-        yield Shift(**item)
+    return kwargs
 
 
 class Shift(base.APIObject):
@@ -101,19 +132,26 @@ class Shift(base.APIObject):
 
     @property
     def start(self):
-        "Returns a :class:`datetime.datetime` object for the start time"
-        # for some reason, shifts are returned in the local timezone
-        # in the API (perhapse the timezone of the location)
-        return dates.to_datetime(
-            self._api_data('start'), dates.get_local_tz())
+        """Returns a :class:`datetime.datetime` object for the start time, in
+        the timezone of the shift's location. See :meth:`get_timezone`: the
+        first read for a company may make an API call."""
+        return self._parse_date('start', self.get_timezone())
 
     @property
     def end(self):
-        "Returns a :class:`datetime.datetime` object for the end time"
-        # for some reason, shifts are returned in the local timezone
-        # in the API (perhapse the timezone of the location)
-        return dates.to_datetime(
-            self._api_data('end'), dates.get_local_tz())
+        """Returns a :class:`datetime.datetime` object for the end time, in
+        the timezone of the shift's location. See :meth:`get_timezone`: the
+        first read for a company may make an API call."""
+        return self._parse_date('end', self.get_timezone())
+
+    def get_timezone(self):
+        """Returns the timezone of the shift's location, which the API gives
+        the start and end times in, see :mod:`lib7shifts.timezones`. If the
+        location isn't known yet and the resolver has a client, the
+        locations of the shift's company are listed (with one API call per
+        company, even if it fails)."""
+        return timezones.resolver.get(
+            self.get('location_id'), self.get('company_id'))
 
     def was_sick(self):
         "Returns True if the shift has a Sick status flag"
@@ -170,3 +208,46 @@ class Shift(base.APIObject):
             self._department = departments.get_department(
                 self.department_id, client=client)
         return self._department
+
+
+class ShiftRecord(records.Record):
+    """A compact form of :class:`Shift`, see :mod:`lib7shifts.records`.
+    As with :class:`Shift`, `start` and `end` are in the timezone of the
+    shift's location, while `created` and `modified` are in UTC."""
+    SCHEMA = (
+        ('id', int), ('company_id', int), ('location_id', int),
+        ('department_id', int), ('role_id', int), ('user_id', int),
+        ('start', records.DateTime(tzinfo=None)),
+        ('end', records.DateTime(tzinfo=None)), ('open', bool),
+        ('status', str), ('attendance_status', str), ('notes', str),
+        ('hourly_wage', int), ('breaks', list), ('draft', bool),
+        ('deleted', bool), ('created', records.DateTime()),
+        ('modified', records.DateTime()),
+    )
+
+    @classmethod
+    def from_dicts(cls, rows):
+        """Yield a record for each dictionary of API data in `rows`, looking
+        up the timezone of each location only once"""
+        zones = {}
+        for data in rows:
+            record = cls.__new__(cls)
+            record._load(data, zones)
+            yield record
+
+    def _load(self, data, zones=None):
+        """Load `data`, giving `start` and `end` the timezone of the
+        location. `zones` maps (location_id, company_id) keys to the
+        timezones already looked up, and is added to."""
+        super(ShiftRecord, self)._load(data)
+        key = (self.location_id, self.company_id)
+        try:
+            tzinfo = zones[key]
+        except (KeyError, TypeError):
+            tzinfo = timezones.resolver.get(*key)
+            if zones is not None:
+                zones[key] = tzinfo
+        if self.start is not None:
+            self.start = self.start.replace(tzinfo=tzinfo)
+        if self.end is not None:
+            self.end = self.end.replace(tzinfo=tzinfo)
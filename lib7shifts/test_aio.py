@@ -0,0 +1,137 @@
+"Test the asyncio client against the mock API server."
+import json
+import unittest
+import contextlib
+from lib7shifts.base import LazyObject
+from lib7shifts.exceptions import APIError
+from lib7shifts.mockserver import MockServer, MockData
+from lib7shifts.ratelimit import TokenBucket
+from lib7shifts.retry import RetryPolicy
+
+try:
+    from lib7shifts import aio
+except ImportError:  # aiohttp isn't installed
+    aio = None
+
+
+@unittest.skipIf(aio is None, "aiohttp is not installed")
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(MockData(users=45)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def get_client(self, server=None, **kwargs):
+        return aio.get_client(
+            access_token='mock', base_url=(server or self.server).url,
+            **kwargs)
+
+    async def test_paging(self):
+        async with self.get_client() as client:
+            users = [user async for user in aio.list_users(
+                client, 1, limit=10)]
+        self.assertEqual([user['id'] for user in users], list(range(1, 46)))
+        self.assertIsInstance(users[0], aio.users.User)
+
+    async def test_raw_and_lazy(self):
+        async with self.get_client() as client:
+            raw = [user async for user in aio.list_users(
+                client, 1, raw=True)]
+            lazy = [user async for user in aio.list_users(
+                client, 1, lazy=True)]
+        self.assertIs(type(raw[0]), dict)
+        self.assertIsInstance(lazy[0], LazyObject)
+        self.assertEqual([dict(user) for user in lazy], raw)
+        self.assertIsInstance(lazy[0].materialize(), aio.users.User)
+
+    async def test_unsupported_list_kwargs(self):
+        async with self.get_client() as client:
+            with self.assertRaises(TypeError) as context:
+                async for _ in aio.list_users(client, 1, shards=4):
+                    pass
+            self.assertIn('shards', str(context.exception))
+            users = [user async for user in aio.list_users(
+                client, 1, compact=False, prefetch=0)]
+        self.assertEqual(len(users), 45)
+
+    async def test_stream_endpoint(self):
+        async with self.get_client() as client:
+            chunks = [chunk async for chunk in client.stream_endpoint(
+                '/v2/company/1/users', chunk_size=256,
+                fields={'limit': 45})]
+            self.assertGreater(len(chunks), 1)
+            data = json.loads(b''.join(chunks))
+            self.assertEqual(len(data['data']), 45)
+            with self.assertRaises(APIError) as context:
+                async for _ in client.stream_endpoint('/v2/company/1/users/46'):
+                    pass
+            self.assertEqual(context.exception.status, 404)
+            # stopping early frees the connection
+            async with contextlib.aclosing(client.stream_endpoint(
+                    '/v2/company/1/users', chunk_size=16)) as stream:
+                async for _ in stream:
+                    break
+            await client.get_endpoint('/v2/whoami')
+
+    async def test_errors_are_raised(self):
+        async with self.get_client() as client:
+            with self.assertRaises(APIError) as context:
+                await client.read('/v2/company/1/users', 46)
+            self.assertEqual(context.exception.status, 404)
+            with self.assertRaises(APIError) as context:
+                async for _ in aio.list_users(client, 1, limit=501):
+                    pass
+            self.assertEqual(context.exception.status, 422)
+
+    async def test_rate_limited_requests_are_retried(self):
+        with MockServer(rate_limit=2) as server:
+            async with self.get_client(server, retry=RetryPolicy(
+                    total=5, backoff_factor=0)) as client:
+                for _ in range(4):
+                    await client.get_endpoint('/v2/whoami')
+            self.assertTrue(server.stats.get(429))
+            self.assertEqual(server.stats[200], 4)
+
+    async def test_rate_limit_without_retries(self):
+        with MockServer(rate_limit=0.1) as server:
+            async with self.get_client(server) as client:
+                await client.get_endpoint('/v2/whoami')
+                with self.assertRaises(APIError) as context:
+                    await client.get_endpoint('/v2/whoami')
+            self.assertEqual(context.exception.status, 429)
+
+    async def test_rate_limit_lock(self):
+        with MockServer(rate_limit=5) as server:
+            bucket = TokenBucket(rate=1000)
+            async with self.get_client(
+                    server, rate_limit_lock=bucket) as client:
+                await client.get_endpoint('/v2/whoami')
+            # the bucket adopts the budget the server reports
+            self.assertEqual(bucket.capacity, 5)
+
+    async def test_close(self):
+        client = self.get_client()
+        await client.get_endpoint('/v2/whoami')
+        session = client._session
+        await client.close()
+        self.assertTrue(session.closed)
+        self.assertIsNone(client._session)
+        # a new session is created if the client is used again
+        await client.get_endpoint('/v2/whoami')
+        self.assertFalse(client._session.closed)
+        await client.close()
+
+    def test_unsupported_kwargs(self):
+        with self.assertRaises(TypeError) as context:
+            self.get_client(cache=object(), hedge=True)
+        self.assertIn('cache, hedge', str(context.exception))
+        client = self.get_client(coalesce=False, page_sizer=None)
+        self.assertIsNone(client.single_flight)
+
+
+if __name__ == '__main__':
+    unittest.main()
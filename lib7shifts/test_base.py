@@ -0,0 +1,338 @@
+"Test the paging helpers in the base module."
+import time
+import unittest
+import datetime
+import threading
+from lib7shifts import base, dates
+from lib7shifts.exceptions import APIError
+from lib7shifts.pagesize import PageSizer, endpoint_template
+from lib7shifts.retry import RetryPolicy
+from lib7shifts.testing import FakeResponse
+
+START = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeListClient(object):
+    """Serves rows with a 'ts' field (one per hour for 30 days, with a busy
+    spell in the middle), honouring ts[gte]/ts[lte], limit and cursor."""
+
+    def __init__(self):
+        self.rows = []
+        for hour in range(24 * 30):
+            stamp = START + datetime.timedelta(hours=hour)
+            copies = 10 if 300 <= hour < 340 else 1
+            for copy in range(copies):
+                self.rows.append({
+                    'id': len(self.rows),
+                    'ts': stamp.strftime('%Y-%m-%d %H:%M:%S')})
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def list(self, endpoint, fields):
+        with self.lock:
+            self.calls += 1
+        rows = self.rows
+        if 'ts[gte]' in fields:
+            low = dates.from_iso8601_dt(fields['ts[gte]'])
+            high = dates.from_iso8601_dt(fields['ts[lte]'])
+            rows = [row for row in rows
+                    if low <= dates.to_datetime(row['ts']) <= high]
+        offset = int(fields.get('cursor') or 0)
+        page = rows[offset:offset + fields['limit']]
+        next = None
+        if offset + fields['limit'] < len(rows):
+            next = str(offset + fields['limit'])
+        return {'data': page, 'meta': {'cursor': {'next': next}}}
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_prefetch_matches_serial(self):
+        client = FakeListClient()
+        rows = list(base.page_api_get_results(
+            client, '/x', prefetch=2, limit=100))
+        self.assertEqual(rows, client.rows)
+
+    def test_prefetch_is_bounded(self):
+        client = FakeListClient()
+        results = base.page_api_get_results(
+            client, '/x', prefetch=2, limit=10)
+        next(results)
+        time.sleep(0.2)
+        # first page consumed, two buffered and one blocked in the worker
+        self.assertLessEqual(client.calls, 4)
+        results.close()
+
+    def test_prefetch_errors_carry_cursor(self):
+        client = FakeListClient()
+        real_list = client.list
+
+        def flaky(endpoint, fields):
+            if fields.get('cursor') == '20':
+                raise ValueError('boom')
+            return real_list(endpoint, fields)
+        client.list = flaky
+        results = base.page_api_get_results(
+            client, '/x', prefetch=3, limit=10)
+        with self.assertRaises(ValueError) as context:
+            list(results)
+        self.assertEqual(context.exception.cursor, '20')
+
+
+#: The body of the API's answer to a page size over the endpoint's limit
+TOO_LARGE = b'{"message": "limit too large"}'
+
+
+class TestPageSizer(unittest.TestCase):
+
+    def test_endpoint_template(self):
+        self.assertEqual(
+            endpoint_template('/v2/company/12/users/34/wages'),
+            '/v2/company/{id}/users/{id}/wages')
+        self.assertEqual(
+            endpoint_template(
+                '/v2/company/1/receipts/2811d1f2-de7b-4ed5-9b4b-f6e21332eafe'),
+            '/v2/company/{id}/receipts/{id}')
+
+    def test_grows_on_fast_full_pages_and_shrinks_on_slow(self):
+        sizer = PageSizer(max_size=1000)
+        self.assertEqual(sizer.get('/v2/company/1/x', 100), 100)
+        sizer.record_page('/v2/company/1/x', 100, 100, 0.1)
+        self.assertEqual(sizer.get('/v2/company/2/x', 100), 151)
+        sizer.record_page('/v2/company/1/x', 151, 40, 0.1)
+        self.assertEqual(sizer.get('/v2/company/1/x', 100), 151)
+        sizer.record_page('/v2/company/1/x', 151, 151, 6.0)
+        self.assertEqual(sizer.get('/v2/company/1/x', 100), 50)
+        sizer.record_page('/v2/company/1/x', 50, 50, 0.1, nbytes=8 << 20)
+        self.assertEqual(sizer.get('/v2/company/1/x', 100), 25)
+
+    def test_rejected_size_becomes_ceiling(self):
+        sizer = PageSizer()
+        sizer.record_page('/x', 400, 400, 0.1)
+        error = APIError(400, response=FakeResponse(400, TOO_LARGE))
+        self.assertTrue(sizer.record_failure('/x', 601, error))
+        self.assertEqual(sizer.get('/x', 100), 400)
+        for _ in range(5):
+            sizer.record_page('/x', 600, 600, 0.1)
+        self.assertEqual(sizer.get('/x', 100), 600)
+        # sizes that have worked before are not rejected for being too large
+        self.assertFalse(sizer.record_failure('/x', 600, error))
+
+    def test_paging_adapts_to_client(self):
+        client = FakeListClient()
+        client.page_sizer = PageSizer(min_size=10, max_size=300)
+        real_list = client.list
+        limits = []
+
+        def tracking(endpoint, fields):
+            limits.append(fields['limit'])
+            if fields['limit'] > 250:
+                raise APIError(422, response=FakeResponse(422, TOO_LARGE))
+            return real_list(endpoint, fields)
+        client.list = tracking
+        rows = list(base.page_api_get_results(
+            client, '/x', default_limit=50))
+        self.assertEqual(rows, client.rows)
+        self.assertEqual(limits[0], 50)
+        self.assertEqual(max(limits), 260)
+        # the rejected size is only tried once, then growth bisects below it
+        self.assertEqual(len([limit for limit in limits if limit > 250]), 1)
+        self.assertGreater(limits[-1], 200)
+
+
+    def test_client_errors_are_not_size_rejections(self):
+        client = FakeListClient()
+        client.page_sizer = PageSizer()
+        calls = []
+
+        class BadFilter(object):
+            data = b'{"message": "location_id is required"}'
+
+        def failing(endpoint, fields):
+            calls.append(fields['limit'])
+            raise APIError(400, response=BadFilter())
+        client.list = failing
+        with self.assertRaises(APIError):
+            list(base.page_api_get_results(client, '/x', default_limit=50))
+        self.assertEqual(calls, [50])
+        self.assertEqual(client.page_sizer.get('/x', 50), 50)
+        # nor above the default, even if a smaller page worked, unless the
+        # error names the limit
+        client.page_sizer.record_page('/y', 50, 50, 0.1)
+        error = APIError(400, response=BadFilter())
+        self.assertFalse(client.page_sizer.record_failure(
+            '/y', 76, error, default=50))
+        self.assertFalse(client.page_sizer.record_failure(
+            '/y', 76, error, default=50, succeeded=50))
+        too_large = APIError(400, response=FakeResponse(400, TOO_LARGE))
+        self.assertTrue(client.page_sizer.record_failure(
+            '/y', 76, too_large, default=50, succeeded=50))
+        self.assertFalse(client.page_sizer.record_failure(
+            '/z', 50, too_large, default=50))
+        self.assertNotIn('/z', client.page_sizer.sizes())
+
+    def test_size_retries_are_capped(self):
+        client = FakeListClient()
+        client.page_sizer = PageSizer(max_retries=2)
+        client.page_sizer.get('/x', 400)
+        calls = []
+
+        def rejecting(endpoint, fields):
+            calls.append(fields['limit'])
+            raise APIError(422, response=FakeResponse(422, TOO_LARGE))
+        client.list = rejecting
+        with self.assertRaises(APIError):
+            list(base.page_api_get_results(client, '/x', default_limit=10))
+        self.assertEqual(calls, [400, 200, 100])
+
+    def test_client_retries_are_not_stacked(self):
+        client = FakeListClient()
+        client.page_sizer = PageSizer()
+        calls = []
+
+        def timing_out(endpoint, fields):
+            calls.append(fields['limit'])
+            raise APIError(504, response=FakeResponse(504, TOO_LARGE))
+        client.list = timing_out
+        with self.assertRaises(APIError):
+            list(base.page_api_get_results(client, '/x', default_limit=400))
+        self.assertEqual(calls, [400, 200, 100])
+        # a client whose policy retries 504s has already retried the page
+        client.retry = RetryPolicy()
+        client.page_sizer = PageSizer()
+        del calls[:]
+        with self.assertRaises(APIError):
+            list(base.page_api_get_results(client, '/x', default_limit=400))
+        self.assertEqual(calls, [400])
+        self.assertEqual(client.page_sizer.get('/x', 400), 400)
+        # unless its policy leaves them alone
+        client.retry = RetryPolicy(statuses=(429,))
+        del calls[:]
+        with self.assertRaises(APIError):
+            list(base.page_api_get_results(client, '/x', default_limit=400))
+        self.assertEqual(calls, [400, 200, 100])
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeListClient()
+        self.kwargs = {
+            'ts[gte]': dates.iso8601_dt(START),
+            'ts[lte]': dates.iso8601_dt(
+                START + datetime.timedelta(days=30, seconds=-1)),
+            'limit': 50}
+
+    def test_unsharded_baseline(self):
+        rows = list(base.page_api_get_results(
+            self.client, '/x', **self.kwargs))
+        self.assertEqual(len(rows), len(self.client.rows))
+
+    def test_sharded_stream_is_complete_and_ordered(self):
+        rows = list(base.page_api_get_results_sharded(
+            self.client, '/x', 'ts', shards=3, **self.kwargs))
+        self.assertEqual([row['id'] for row in rows],
+                         [row['id'] for row in self.client.rows])
+
+    def test_sort_order(self):
+        self.assertEqual(base.sort_order(), (None, False))
+        self.assertEqual(base.sort_order('user_id.desc'), ('user_id', True))
+        self.assertEqual(base.sort_order('user_id.asc'), ('user_id', False))
+        self.assertEqual(base.sort_order('start', 'desc'), ('start', True))
+        self.assertEqual(base.sort_order('start'), ('start', False))
+
+    def test_sharded_merge_by_sort_key(self):
+        rows = list(base.page_api_get_results_sharded(
+            self.client, '/x', 'ts', shards=4, sort_key='ts',
+            **self.kwargs))
+        self.assertEqual(len(rows), len(self.client.rows))
+        self.assertEqual(rows, sorted(rows, key=lambda row: row['ts']))
+
+    def test_rows_on_window_boundaries_are_fetched_once(self):
+        # windows of exactly 10 days, split down to 15 minutes: every
+        # boundary falls on an hourly row
+        rows = list(base.page_api_get_results_sharded(
+            self.client, '/x', 'ts', shards=3, max_workers=8,
+            **self.kwargs))
+        ids = [row['id'] for row in rows]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(ids, [row['id'] for row in self.client.rows])
+        for days in (10, 20):
+            boundary = (START + datetime.timedelta(days=days)).strftime(
+                '%Y-%m-%d %H:%M:%S')
+            self.assertEqual(
+                len([row for row in rows if row['ts'] == boundary]), 1)
+
+    def test_fractional_bounds_match_unsharded(self):
+        half = datetime.timedelta(microseconds=500000)
+        self.kwargs['ts[gte]'] = (START + half).isoformat()
+        self.kwargs['ts[lte]'] = (
+            START + datetime.timedelta(hours=320) + half).isoformat()
+        unsharded = list(base.page_api_get_results(
+            self.client, '/x', **self.kwargs))
+        sharded = list(base.page_api_get_results_sharded(
+            self.client, '/x', 'ts', shards=4, **self.kwargs))
+        self.assertEqual(sharded, unsharded)
+        self.assertEqual(sharded[0]['ts'], '2023-01-01 01:00:00')
+        self.assertEqual(sharded[-1]['ts'], '2023-01-14 08:00:00')
+
+    def test_range_required(self):
+        del self.kwargs['ts[lte]']
+        with self.assertRaises(RuntimeError):
+            list(base.page_api_get_results_sharded(
+                self.client, '/x', 'ts', **self.kwargs))
+
+    def test_worker_errors_propagate(self):
+        def broken(endpoint, fields):
+            raise ValueError('boom')
+        self.client.list = broken
+        with self.assertRaises(ValueError):
+            list(base.page_api_get_results_sharded(
+                self.client, '/x', 'ts', **self.kwargs))
+
+
+class CountingObject(base.APIObject):
+    "Counts how many objects are built"
+    built = 0
+
+    def __init__(self, **kwargs):
+        super(CountingObject, self).__init__(**kwargs)
+        CountingObject.built += 1
+
+    def double(self):
+        return self['id'] * 2
+
+
+class TestIterObjects(unittest.TestCase):
+
+    def setUp(self):
+        CountingObject.built = 0
+        self.rows = [{'id': 1, 'created': '2023-01-01 10:00:00'},
+                     {'id': 2, 'created': None}]
+
+    def test_raw(self):
+        rows = list(base.iter_objects(self.rows, CountingObject, raw=True))
+        self.assertIs(rows[0], self.rows[0])
+        self.assertEqual(CountingObject.built, 0)
+
+    def test_lazy(self):
+        rows = list(base.iter_objects(self.rows, CountingObject, lazy=True))
+        self.assertEqual(rows[0]['id'], 1)
+        self.assertEqual(dict(rows[1]), self.rows[1])
+        self.assertEqual(rows, self.rows)
+        self.assertEqual(CountingObject.built, 0)
+        self.assertEqual(rows[0].double(), 2)
+        self.assertEqual(rows[0].created.year, 2023)
+        self.assertIsInstance(rows[0].materialize(), CountingObject)
+        self.assertEqual(CountingObject.built, 1)
+        with self.assertRaises(AttributeError):
+            rows[1].missing
+
+    def test_default(self):
+        rows = list(base.iter_objects(self.rows, CountingObject))
+        self.assertIsInstance(rows[0], CountingObject)
+        self.assertEqual(CountingObject.built, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"Test the cache module and the client's cached requests."
+import os
+import shutil
+import tempfile
+import unittest
+from lib7shifts.cache import MemoryCache, SQLiteCache
+from lib7shifts.testing import FakeResponse, get_client
+
+COMPANY = b'{"data": {"id": 1, "name": "Acme"}}'
+
+
+class TestClientCache(unittest.TestCase):
+
+    def test_revalidates_with_etag(self):
+        client, pool = get_client([
+            FakeResponse(200, COMPANY, {'ETag': '"v1"'}),
+            FakeResponse(304, b'', {}),
+        ], cache=MemoryCache())
+        first = client.read('/v2/companies', 1)
+        second = client.read('/v2/companies', 1)
+        self.assertEqual(first, second)
+        self.assertNotIn('If-None-Match', pool.requests[0][2].get(
+            'headers') or {})
+        headers = pool.requests[1][2]['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        self.assertIn('Authorization', headers)
+        self.assertEqual(client.cache.revalidations, 1)
+
+    def test_ttl_without_validators(self):
+        client, pool = get_client([
+            FakeResponse(200, COMPANY),
+            FakeResponse(200, COMPANY),
+            FakeResponse(200, COMPANY),
+        ], cache=MemoryCache(ttl=60))
+        client.read('/v2/companies', 1)
+        self.assertEqual(client.read('/v2/companies', 1)['data']['id'], 1)
+        self.assertEqual(len(pool.requests), 1)
+        client.cache.ttl = 0
+        client.cache.clear()
+        client.read('/v2/companies', 1)
+        client.read('/v2/companies', 1)
+        self.assertEqual(len(pool.requests), 3)
+
+    def test_only_reference_endpoints(self):
+        client, pool = get_client([
+            FakeResponse(200, COMPANY),
+            FakeResponse(200, COMPANY),
+        ], cache=MemoryCache())
+        client.read('/v2/company/1/time_punches', 5)
+        client.read('/v2/company/1/time_punches', 5)
+        self.assertEqual(len(pool.requests), 2)
+
+    def test_no_store_and_errors(self):
+        client, pool = get_client([
+            FakeResponse(200, COMPANY, {'Cache-Control': 'no-store'}),
+            FakeResponse(404, b'{}'),
+        ], cache=MemoryCache())
+        client.read('/v2/companies', 1)
+        with self.assertRaises(Exception):
+            client.read('/v2/companies', 1)
+        self.assertEqual(len(client.cache), 0)
+
+
+class TestSQLiteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_persists_between_instances(self):
+        cache = SQLiteCache(self.path)
+        key = cache.make_key('/v2/companies/1', {'b': 2, 'a': 1}, 'token')
+        self.assertNotIn('token', key)
+        cache.store(key, {'Last-Modified': 'Mon, 03 Jul 2023 00:00:00 GMT'},
+                    COMPANY)
+        cache.close()
+        cache = SQLiteCache(self.path)
+        entry = cache.get(key)
+        self.assertEqual(entry.data, COMPANY)
+        self.assertFalse(entry.is_fresh())
+        self.assertEqual(entry.conditional_headers(), {
+            'If-Modified-Since': 'Mon, 03 Jul 2023 00:00:00 GMT'})
+        self.assertEqual(len(cache), 1)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"Test the circuitbreaker module and the client's use of it."
+import unittest
+from unittest.mock import patch
+from lib7shifts import circuitbreaker
+from lib7shifts.circuitbreaker import CircuitBreaker
+from lib7shifts.exceptions import APIError, CircuitOpenError
+from lib7shifts.instrumentation import MetricsCollector
+from lib7shifts.retry import RetryPolicy
+from lib7shifts.test_ratelimit import FakeClock
+from lib7shifts.testing import FakeResponse, get_client
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_threshold=3, recovery_timeout=10, clock=self.clock)
+
+    def fail(self, endpoint='/v2/company/1/shifts', times=1):
+        for _ in range(times):
+            self.breaker.before_request(endpoint)
+            self.breaker.record(endpoint, status=500)
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(times=2)
+        self.breaker.record('/v2/company/1/shifts', status=200)
+        self.fail(times=2)
+        self.assertEqual(self.breaker.state('/v2/company/1/shifts'),
+                         circuitbreaker.CLOSED)
+        self.fail()
+        self.assertTrue(self.breaker.is_open('/v2/company/2/shifts'))
+        with self.assertRaises(CircuitOpenError) as context:
+            self.breaker.before_request('/v2/company/7/shifts')
+        self.assertEqual(context.exception.retry_after, 10)
+        # other endpoints are unaffected, and 4xx responses don't count
+        self.breaker.before_request('/v2/company/1/users')
+        self.breaker.record('/v2/company/1/users', status=404)
+        self.assertFalse(self.breaker.is_open('/v2/company/1/users'))
+
+    def test_half_open_probe(self):
+        self.fail(times=3)
+        self.clock.now += 10
+        self.assertEqual(self.breaker.before_request('/v2/company/1/shifts'),
+                         circuitbreaker.HALF_OPEN)
+        # only one probe at a time
+        self.assertRaises(CircuitOpenError, self.breaker.before_request,
+                          '/v2/company/1/shifts')
+        self.assertEqual(self.breaker.record(
+            '/v2/company/1/shifts', error=IOError()), circuitbreaker.OPEN)
+        self.clock.now += 10
+        self.breaker.before_request('/v2/company/1/shifts')
+        self.assertEqual(self.breaker.record(
+            '/v2/company/1/shifts', status=200), circuitbreaker.CLOSED)
+
+    def test_late_success_does_not_close_open_circuit(self):
+        endpoint = '/v2/company/1/shifts'
+        self.breaker.before_request(endpoint)  # still in flight
+        self.fail(times=3)
+        self.assertIsNone(self.breaker.record(endpoint, status=200))
+        self.assertTrue(self.breaker.is_open(endpoint))
+        self.clock.now += 10
+        self.breaker.before_request(endpoint)
+        self.assertEqual(self.breaker.record(endpoint, status=200),
+                         circuitbreaker.CLOSED)
+
+
+class TestClientCircuitBreaker(unittest.TestCase):
+
+    @patch('lib7shifts.time.sleep')
+    def test_fails_fast_and_reports_state(self, sleep):
+        metrics = MetricsCollector()
+        client, pool = get_client(
+            [FakeResponse(503)] * 3, retry=RetryPolicy(total=5),
+            circuit_breaker=CircuitBreaker(failure_threshold=3),
+            hooks=[metrics])
+        with self.assertRaises(CircuitOpenError):
+            client.get_endpoint('/v2/reports/hours_and_wages')
+        self.assertEqual(len(pool.requests), 3)
+        self.assertEqual(metrics.circuits(), {
+            '/v2/reports/hours_and_wages': circuitbreaker.OPEN})
+        self.assertEqual(
+            metrics.dump()['/v2/reports/hours_and_wages']['circuit'], 'open')
+        with self.assertRaises(CircuitOpenError):
+            client.get_endpoint('/v2/reports/hours_and_wages')
+        self.assertEqual(len(pool.requests), 3)
+
+    def test_without_retries_errors_still_raised(self):
+        client, _ = get_client([FakeResponse(500)], circuit_breaker=True)
+        self.assertRaises(APIError, client.get_endpoint, '/v2/whoami')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+"Test the concurrency module, and request coalescing and pooling in the client."
+import os
+import threading
+import unittest
+import concurrent.futures
+import lib7shifts
+from lib7shifts.concurrency import SingleFlight, AIMDLimiter, fan_out
+from lib7shifts.test_hedging import event
+from lib7shifts.test_ratelimit import FakeClock
+from lib7shifts.testing import FakeResponse
+
+
+class SlowPool(object):
+    "Answers every request after the test releases it, counting requests"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.requests = []
+
+    def request(self, method, path, **urlopen_kw):
+        self.requests.append((method, path))
+        self.release.wait(5)
+        return FakeResponse(200, b'{"data": {"id": 7}}')
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_error_shared_then_forgotten(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('boom')
+        self.assertRaises(ValueError, flight.do, 'k', fail)
+        self.assertEqual(flight.do('k', lambda: 1), 1)
+        self.assertEqual(flight.coalesced, 0)
+
+    def test_client_coalesces_identical_reads(self):
+        client = lib7shifts.get_client(access_token='test')
+        pool = SlowPool()
+        client._set_pool(pool)
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(
+                lib7shifts.get_user, client, 1, 7) for _ in range(8)]
+            futures.append(executor.submit(client.read, '/v2/whoami', 2))
+            while client.single_flight.coalesced < 7:
+                threading.Event().wait(0.01)
+            pool.release.set()
+            results = [future.result() for future in futures]
+        self.assertEqual(len(pool.requests), 2)
+        self.assertTrue(all(user['id'] == 7 for user in results[:8]))
+
+    def test_waiters_get_copies(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return {'data': [1, 2]}
+        with concurrent.futures.ThreadPoolExecutor(3) as executor:
+            leader = executor.submit(flight.do, 'k', slow)
+            started.wait(5)
+            waiters = [executor.submit(flight.do, 'k', slow)
+                       for _ in range(2)]
+            while flight.coalesced < 2:
+                threading.Event().wait(0.01)
+            release.set()
+            results = [leader.result()] + [
+                waiter.result() for waiter in waiters]
+        results[0]['data'].append(3)
+        self.assertEqual(results[1], {'data': [1, 2]})
+        self.assertIsNot(results[1], results[2])
+
+    def test_clients_with_different_tokens_are_not_coalesced(self):
+        flight = SingleFlight()
+        pools = []
+        clients = []
+        for token in ('tenant-a', 'tenant-b'):
+            client = lib7shifts.get_client(access_token=token, coalesce=flight)
+            pool = SlowPool()
+            client._set_pool(pool)
+            pools.append(pool)
+            clients.append(client)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            futures = [executor.submit(client.get_endpoint, '/v2/whoami')
+                       for client in clients]
+            for _ in range(200):
+                if all(pool.requests for pool in pools):
+                    break
+                threading.Event().wait(0.01)
+            for pool in pools:
+                pool.release.set()
+            for future in futures:
+                future.result()
+        self.assertEqual(flight.coalesced, 0)
+        self.assertEqual([len(pool.requests) for pool in pools], [1, 1])
+
+    def test_coalescing_disabled(self):
+        client = lib7shifts.get_client(access_token='test', coalesce=False)
+        self.assertIsNone(client.single_flight)
+
+
+class TestAIMDLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AIMDLimiter(initial=4, max_limit=6, clock=self.clock)
+
+    def finish(self, **kwargs):
+        "Report a request taking 0.1s, that used the whole limit"
+        self.limiter.in_flight = int(self.limiter.limit)
+        self.limiter.record(event(duration=0.1, **kwargs))
+
+    def test_additive_increase(self):
+        for _ in range(5):
+            self.finish()
+        self.assertEqual(int(self.limiter.limit), 5)
+        for _ in range(100):
+            self.finish()
+        self.assertEqual(self.limiter.limit, 6)
+        # no growth while the limit isn't being used
+        self.limiter.limit = 3.0
+        self.limiter.in_flight = 1
+        self.limiter.record(event(duration=0.1))
+        self.assertEqual(self.limiter.limit, 3.0)
+
+    def test_multiplicative_decrease_once_per_round_trip(self):
+        self.finish(status=429)
+        self.assertEqual(self.limiter.limit, 2)
+        # requests already in flight when the limit was cut don't cut it
+        self.finish(status=503)
+        self.assertEqual(self.limiter.limit, 2)
+        self.clock.now += 1
+        self.finish(status=503)
+        self.assertEqual(self.limiter.limit, 1)
+        self.clock.now += 1
+        self.finish(status=500)
+        self.assertEqual((self.limiter.limit, self.limiter.decreases), (1, 3))
+
+    def test_rising_latency_decreases(self):
+        for _ in range(5):
+            self.finish()
+        before = self.limiter.limit
+        for _ in range(3):
+            self.clock.now += 10
+            self.limiter.record(event(duration=1.0))
+        self.assertLess(self.limiter.limit, before)
+
+    def test_acquire_waits_for_a_slot(self):
+        limiter = AIMDLimiter(initial=1)
+        limiter.acquire()
+        acquired = threading.Event()
+        def acquire():
+            with limiter:
+                acquired.set()
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release()
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_fan_out_in_order(self):
+        self.assertEqual(list(fan_out(lambda n: n * 2, range(20), 4)),
+                         [n * 2 for n in range(20)])
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def test_pool_options(self):
+        client = lib7shifts.get_client(
+            access_token='test', pool_maxsize=4, pool_block=True, timeout=2.5)
+        pool = client._connection_pool
+        self.assertEqual(pool.pool.maxsize, 4)
+        self.assertTrue(pool.block)
+        self.assertEqual(pool.timeout.read_timeout, 2.5)
+
+    def test_pool_created_once_by_concurrent_threads(self):
+        client = lib7shifts.get_client(access_token='test')
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            pools = list(executor.map(
+                lambda _: client._connection_pool, range(32)))
+        self.assertTrue(all(pool is pools[0] for pool in pools))
+
+    def test_pool_replaced_after_fork(self):
+        client = lib7shifts.get_client(access_token='test')
+        pool = client._connection_pool
+        self.assertIs(client._connection_pool, pool)
+        # what a forked child sees: a pool created by its parent
+        client._APIClient7Shifts__pid = os.getpid() + 1
+        self.assertIsNot(client._connection_pool, pool)
+
+    def test_hedge_executor_replaced_after_fork(self):
+        client = lib7shifts.get_client(access_token='test', hedge=True)
+        executor = client._hedge_executor
+        self.assertIs(client._hedge_executor, executor)
+        # a forked child, whose parent held the lock as it forked
+        client._pool_lock.acquire()
+        client._APIClient7Shifts__pid = os.getpid() + 1
+        child_executor = client._hedge_executor
+        self.assertIsNot(child_executor, executor)
+        self.assertEqual(child_executor.submit(lambda: 1).result(1), 1)
+        self.assertIsNot(client._connection_pool, None)
+        executor.shutdown()
+        child_executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,13 @@
 import unittest
 from unittest.mock import patch
 import datetime
+import zoneinfo
 from lib7shifts.dates import *
+from lib7shifts import dates, Shift, TimePunch
+try:
+    import pandas
+except ImportError:
+    pandas = None
 
 #: This TZ is used for testing anytime the "Current" timezone should be used
 TEST_TZ1 = datetime.timezone(-datetime.timedelta(hours=8), name='TestTZ1')
@@ -32,6 +38,89 @@ class TestDateUtils(unittest.TestCase):
         with self.assertRaises(AssertionError):
             iso8601_dt('1999-04-10')
 
+    def test_to_datetime(self):
+        for value in ('2022-07-03 09:03:00', '1999-12-31 23:59:59'):
+            expected = DateTime7Shifts.strptime(
+                value, DEFAULT_DATETIME_FORMAT).replace(tzinfo=TEST_TZ2)
+            parsed = to_datetime(value, TEST_TZ2)
+            self.assertEqual(parsed, expected)
+            self.assertEqual(parsed.tzinfo, TEST_TZ2)
+            self.assertIsInstance(parsed, DateTime7Shifts)
+        self.assertEqual(to_date('2022-07-03'),
+                         datetime.datetime(2022, 7, 3, tzinfo=TEST_TZ3))
+        # other ISO 8601 forms that fromisoformat would accept are rejected,
+        # as strptime always has
+        for value in ('2022-07-03T09:03:00', '2022-07-03 09:03', '',
+                      '2022-07-03', '2022-07-03 09:03+01', '20220703 09:03:00',
+                      '2022-W27-1 09:03:00', '2022-07-03_09:03:00',
+                      '2022-07-03 09:03:00Z'):
+            with self.assertRaises(ValueError):
+                to_datetime(value)
+        for value in ('2022-W27-1', '20220703', '2022-07-03 00:00:00'):
+            with self.assertRaises(ValueError):
+                to_date(value)
+
+    def test_local_tz_cached(self):
+        local_tz = datetime.datetime.utcnow().astimezone().tzinfo
+        with patch('lib7shifts.dates._local_tz', (100.0, TEST_TZ1)):
+            with patch('time.monotonic', return_value=99.0):
+                self.assertIs(get_local_tz(), TEST_TZ1)
+            with patch('time.monotonic', return_value=100.0):
+                self.assertEqual(get_local_tz(), local_tz)
+            self.assertEqual(dates._local_tz, (100.0 + LOCAL_TZ_TTL, local_tz))
+
+
+@unittest.skipIf(pandas is None, "pandas is not installed")
+class TestVectorized(unittest.TestCase):
+
+    def test_to_datetimes(self):
+        values = ['2022-07-03 09:03:00', OPEN_PUNCH, None]
+        parsed = to_datetimes(values, TEST_TZ1)
+        self.assertIsInstance(parsed, pandas.DatetimeIndex)
+        self.assertEqual(parsed[0], to_datetime(values[0], TEST_TZ1))
+        self.assertTrue(parsed[1:].isna().all())
+        column = pandas.Series(values[:2], index=[10, 11])
+        parsed = to_datetimes(column)
+        self.assertEqual(list(parsed.index), [10, 11])
+        self.assertEqual(str(parsed.dt.tz), 'UTC')
+        self.assertEqual(to_dates(['2022-07-03'])[0],
+                         to_date('2022-07-03'))
+        with self.assertRaises(ValueError):
+            to_datetimes(['2022-07-03'])
+
+    def test_iso8601_dts(self):
+        edmonton = zoneinfo.ZoneInfo('America/Edmonton')
+        values = [datetime.datetime(2022, 1, 1, 9, tzinfo=TEST_TZ2),
+                  datetime.datetime(2022, 7, 1, 9, tzinfo=TEST_TZ3)]
+        for tzinfo in (None, edmonton):
+            self.assertEqual(
+                list(iso8601_dts(values, tzinfo)),
+                [iso8601_dt(value, tzinfo) for value in values])
+        column = to_datetimes(pandas.Series(
+            ['2022-07-03 09:03:00', OPEN_PUNCH]))
+        self.assertEqual(list(iso8601_dts(column)),
+                         ['2022-07-03T09:03:00Z', None])
+        with patch('lib7shifts.dates.get_local_tz', return_value=TEST_TZ1):
+            self.assertEqual(
+                list(iso8601_dts([datetime.datetime(1999, 9, 1, 7, 11)])),
+                ['1999-09-01T15:11:00Z'])
+
+
+class TestDateProperties(unittest.TestCase):
+    """Check that the date properties of objects are parsed once. See
+    benchmarks/date_parse.py for how much that saves."""
+
+    def test_cached_until_changed(self):
+        punch = TimePunch(clocked_in='2022-07-03 09:03:00')
+        self.assertIs(punch.clocked_in, punch.clocked_in)
+        punch['clocked_in'] = '2022-07-04 09:03:00'
+        self.assertEqual(punch.clocked_in.day, 4)
+        shift = Shift(start='2022-07-03 09:03:00')
+        with patch('lib7shifts.dates.get_local_tz', return_value=TEST_TZ1):
+            self.assertEqual(shift.start.tzinfo, TEST_TZ1)
+        with patch('lib7shifts.dates.get_local_tz', return_value=TEST_TZ2):
+            self.assertEqual(shift.start.tzinfo, TEST_TZ2)
+
 
 if __name__ == '__main__':
     unittest.main()
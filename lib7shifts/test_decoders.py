@@ -0,0 +1,132 @@
+"Test the decoders module."
+import json
+import unittest
+import lib7shifts
+from lib7shifts.decoders import get_decoder, iter_json_array
+from lib7shifts.exceptions import APIError
+from lib7shifts.mockserver import MockServer, MockData
+
+
+def chunked(data, size):
+    "Split `data` into byte chunks of `size`"
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestGetDecoder(unittest.TestCase):
+
+    def test_stdlib_decoder(self):
+        decode = get_decoder('json')
+        self.assertEqual(decode(b'{"a": [1, 2.5]}'), {'a': [1, 2.5]})
+
+    def test_unknown_decoder(self):
+        self.assertRaises(RuntimeError, get_decoder, 'nope')
+
+
+class TestIterJsonArray(unittest.TestCase):
+
+    document = {
+        'total': {'hours': 1.5},
+        'users': [{'user': {'id': i, 'name': u'Né'}, 'wage': i / 3.0}
+                  for i in range(25)],
+        'end': '2022-07-09',
+    }
+
+    def test_any_chunk_size(self):
+        data = json.dumps(self.document, ensure_ascii=False).encode('utf8')
+        for size in (1, 2, 3, 7, 64, len(data)):
+            rest = {}
+            users = list(iter_json_array(chunked(data, size), 'users', rest))
+            self.assertEqual(users, self.document['users'])
+            self.assertEqual(rest, {'total': {'hours': 1.5},
+                                    'end': '2022-07-09'})
+
+    def test_empty(self):
+        self.assertEqual(list(iter_json_array([b'{}'], 'users')), [])
+        self.assertEqual(
+            list(iter_json_array([b'{"users": []}'], 'users')), [])
+
+    def test_truncated(self):
+        data = json.dumps(self.document).encode('utf8')[:-20]
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(chunked(data, 10), 'users'))
+
+
+class TestStreamEndpoint(unittest.TestCase):
+    "Stream the hours and wages report through a client and its pool"
+
+    report = {'company_id': 1, 'from_day': '2023-01-01',
+              'to_day': '2023-01-14'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(MockData(users=30)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def get_client(self, server=None):
+        "Returns a client whose pool records the kwargs of each request"
+        client = (server or self.server).get_client(coalesce=False)
+        pool = client._connection_pool
+        client.requests = []
+        real_request = pool.request
+
+        def request(method, path, **urlopen_kw):
+            client.requests.append(urlopen_kw)
+            return real_request(method, path, **urlopen_kw)
+        pool.request = request
+        return client, pool
+
+    def assertReleased(self, pool):
+        "Every connection taken from `pool` has been given back"
+        self.assertEqual(pool.pool.qsize(), pool.pool.maxsize)
+
+    def test_users_and_shifts(self):
+        client, pool = self.get_client()
+        full = lib7shifts.get_hours_and_wages_report(client, **self.report)
+        summary = {}
+        users = list(lib7shifts.iter_hours_and_wages_users(
+            client, summary=summary, **self.report))
+        self.assertEqual(users, full['users'])
+        self.assertEqual(summary, dict(
+            (key, value) for key, value in full.items() if key != 'users'))
+        self.assertFalse(client.requests[1]['preload_content'])
+        self.assertReleased(pool)
+        shifts = list(lib7shifts.iter_hours_and_wages_shifts(
+            client, **self.report))
+        self.assertEqual(len(shifts), sum(
+            len(week['shifts']) for user in full['users']
+            for week in user['weeks']))
+        self.assertEqual(shifts[0]['user'], full['users'][0]['user'])
+        self.assertReleased(pool)
+        # all requests went over the one connection
+        self.assertEqual(pool.num_connections, 1)
+
+    def test_stopping_early_releases_the_connection(self):
+        # a report large enough not to arrive in the first chunk
+        with MockServer(MockData(users=300)) as server:
+            client, pool = self.get_client(server)
+            users = lib7shifts.iter_hours_and_wages_users(
+                client, **self.report)
+            next(users)
+            self.assertEqual(pool.pool.qsize(), pool.pool.maxsize - 1)
+            users.close()
+            self.assertReleased(pool)
+            self.assertEqual(len(list(lib7shifts.iter_hours_and_wages_users(
+                client, **self.report))), 300)
+
+    def test_error_status(self):
+        with MockServer(error_rate=1.0) as server:
+            client, pool = self.get_client(server)
+            with self.assertRaises(APIError) as context:
+                next(lib7shifts.iter_hours_and_wages_users(
+                    client, **self.report))
+            self.assertGreaterEqual(context.exception.status, 500)
+            self.assertIn('error', context.exception.response)
+            self.assertFalse(client.requests[0]['preload_content'])
+            self.assertReleased(pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
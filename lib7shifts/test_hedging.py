@@ -0,0 +1,88 @@
+"Test the hedging module and hedged requests in the client."
+import threading
+import unittest
+import lib7shifts
+from lib7shifts.hedging import HedgePolicy
+from lib7shifts.instrumentation import RequestEvent
+from lib7shifts.testing import FakeResponse
+
+
+def event(path='/v2/company/1/shifts', duration=0.2, status=200,
+          method='GET'):
+    result = RequestEvent(method, path)
+    result.duration = duration
+    result.status = status
+    return result
+
+
+class SlowFirstPool(object):
+    """Answers the first request only when released, and others at once,
+    with the number of the request as the body"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, path, **urlopen_kw):
+        with self._lock:
+            self.requests += 1
+            number = self.requests
+        if number == 1:
+            self.release.wait(5)
+        return FakeResponse(200, str(number).encode())
+
+
+class TestHedgePolicy(unittest.TestCase):
+
+    def test_delay_from_recent_latencies(self):
+        policy = HedgePolicy(percentile=0.9, min_samples=10, min_delay=0.05)
+        for duration in range(1, 10):
+            policy.record(event(duration=duration / 10))
+        self.assertIsNone(policy.get_delay('/v2/company/2/shifts'))
+        policy.record(event(duration=1.0))
+        # failures and other methods aren't latencies to learn from
+        policy.record(event(duration=60, status=500))
+        policy.record(event(duration=60, method='POST'))
+        self.assertEqual(policy.get_delay('/v2/company/2/shifts'), 1.0)
+        self.assertIsNone(policy.get_delay('/v2/company/2/users'))
+
+    def test_extra_load_capped(self):
+        policy = HedgePolicy(max_extra=0.1)
+        for _ in range(20):
+            policy.record(event())
+        self.assertTrue(policy.allow())
+        self.assertTrue(policy.allow())
+        self.assertFalse(policy.allow())
+        self.assertEqual(policy.hedged, 2)
+
+
+class TestClientHedging(unittest.TestCase):
+
+    def test_slow_request_hedged(self):
+        policy = HedgePolicy(min_samples=1, min_delay=0.01, max_extra=1)
+        policy.record(event('/v2/whoami', duration=0.01))
+        client = lib7shifts.get_client(
+            access_token='test', hedge=policy, coalesce=False)
+        pool = SlowFirstPool()
+        client._set_pool(pool)
+        try:
+            self.assertEqual(client.get_endpoint('/v2/whoami'), 2)
+        finally:
+            pool.release.set()
+        self.assertEqual((policy.hedged, policy.won), (1, 1))
+        self.assertEqual(client.last_response_bytes, 1)
+
+    def test_not_hedged_over_cap(self):
+        policy = HedgePolicy(min_samples=1, min_delay=0.01, max_extra=0)
+        policy.record(event('/v2/whoami', duration=0.01))
+        client = lib7shifts.get_client(access_token='test', hedge=policy)
+        pool = SlowFirstPool()
+        client._set_pool(pool)
+        threading.Timer(0.1, pool.release.set).start()
+        self.assertEqual(client.get_endpoint('/v2/whoami'), 1)
+        self.assertEqual((pool.requests, policy.hedged), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"Test the instrumentation module and the client's request hooks."
+import unittest
+from unittest.mock import patch
+import urllib3
+from lib7shifts.instrumentation import MetricsCollector, RequestEvent
+from lib7shifts.retry import RetryPolicy
+from lib7shifts.testing import FakeResponse, get_client
+
+
+class RecordingHook(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def before_request(self, event):
+        self.calls.append(('before', event.endpoint, event.status))
+
+    def after_request(self, event):
+        self.calls.append(('after', event.endpoint, event.status))
+
+
+class TestHooks(unittest.TestCase):
+
+    @patch('lib7shifts.time.sleep')
+    def test_hooks_see_every_attempt(self, sleep):
+        metrics = MetricsCollector()
+        hook = RecordingHook()
+        client, _ = get_client([
+            FakeResponse(503),
+            urllib3.exceptions.ProtocolError('reset'),
+            FakeResponse(200, b'{"data": {}}'),
+        ], retry=RetryPolicy(), hooks=[hook, metrics])
+        client.read('/v2/company/12/users', 34)
+        endpoint = '/v2/company/{id}/users/{id}'
+        self.assertEqual(hook.calls, [
+            ('before', endpoint, None), ('after', endpoint, 503),
+            ('before', endpoint, None), ('after', endpoint, None),
+            ('before', endpoint, None), ('after', endpoint, 200)])
+        stats = metrics.dump()[endpoint]
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['bytes'], len(b'{"data": {}}') + 2)
+        self.assertIn(endpoint, metrics.report())
+
+    def test_broken_hook_does_not_break_request(self):
+        class Broken(object):
+            def after_request(self, event):
+                raise ValueError('oops')
+        client, _ = get_client([FakeResponse(200)], hooks=[Broken()])
+        with self.assertLogs(client.log, 'ERROR'):
+            self.assertEqual(client.get_endpoint('/v2/whoami'), {})
+
+
+class TestMetricsCollector(unittest.TestCase):
+
+    def test_percentiles(self):
+        metrics = MetricsCollector()
+        for duration in [0.01] * 90 + [0.3] * 9 + [45.0]:
+            event = RequestEvent('GET', '/v2/whoami')
+            event.status, event.duration = 200, duration
+            metrics.after_request(event)
+        stats = metrics.get('/v2/whoami')
+        self.assertEqual(stats.percentile(0.5), 0.025)
+        self.assertEqual(stats.percentile(0.95), 0.5)
+        self.assertEqual(stats.percentile(1.0), 45.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
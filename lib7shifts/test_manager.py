@@ -0,0 +1,106 @@
+"Test the manager module."
+import unittest
+from lib7shifts.manager import ClientManager, TenantRateLimit
+from lib7shifts.test_ratelimit import FakeClock
+from lib7shifts.testing import FakeResponse
+
+
+class RecordingPool(object):
+    "Answers every request, recording its headers"
+
+    def __init__(self, url):
+        self.url = url
+        self.headers = []
+        self.closed = False
+
+    def request(self, method, path, headers=None, **urlopen_kw):
+        self.headers.append(headers)
+        return FakeResponse(200, b'{"data": {}}')
+
+    def close(self):
+        self.closed = True
+
+
+class FakeManager(ClientManager):
+
+    def __init__(self, **kwargs):
+        super(FakeManager, self).__init__(**kwargs)
+        self.created = []
+
+    def _create_pool(self, url):
+        self.created.append(RecordingPool(url))
+        return self.created[-1]
+
+
+class FakeBucket(object):
+
+    def __init__(self):
+        self.acquired = 0
+        self.headers = []
+
+    def acquire(self):
+        self.acquired += 1
+
+    def update_from_headers(self, headers):
+        self.headers.append(headers)
+
+
+class TestClientManager(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.manager = FakeManager(
+            max_clients=2, idle_timeout=60, clock=self.clock)
+
+    def test_clients_reused_and_evicted(self):
+        first = self.manager.get('a')
+        self.assertIs(self.manager.get('a'), first)
+        self.manager.get('b')
+        self.manager.get('a')
+        self.manager.get('c')  # 'b' is the least recently used
+        self.assertEqual(len(self.manager), 2)
+        self.assertIs(self.manager.get('a'), first)
+        self.assertEqual(first.access_token, 'a')
+
+    def test_pool_shared_by_tokens(self):
+        for token in ('a', 'b'):
+            self.manager.get(token).get_endpoint('/v2/whoami')
+        self.assertEqual(len(self.manager.created), 1)
+        self.assertEqual(
+            [headers['Authorization'] for headers in
+             self.manager.created[0].headers], ['Bearer a', 'Bearer b'])
+
+    def test_idle_pools_closed(self):
+        client = self.manager.get('a')
+        client.get_endpoint('/v2/whoami')
+        self.clock.now += 30
+        self.manager.get('b')
+        self.clock.now += 31
+        self.manager.close_idle()
+        pool = self.manager.created[0]
+        self.assertTrue(pool.closed)
+        self.assertEqual(list(self.manager._clients), ['b'])
+        # a client that is still held on to gets a new pool
+        client.get_endpoint('/v2/whoami')
+        self.assertEqual(len(self.manager.created), 2)
+
+    def test_rate_budgets(self):
+        manager = ClientManager(tenant_rate=5, global_rate=20)
+        first, second = manager.get('a'), manager.get('b')
+        self.assertIsNot(first.rate_limit_lock.tenant,
+                         second.rate_limit_lock.tenant)
+        self.assertIs(first.rate_limit_lock.shared,
+                      second.rate_limit_lock.shared)
+        self.assertIsNone(ClientManager().get('a').rate_limit_lock)
+
+    def test_tenant_rate_limit(self):
+        tenant, shared = FakeBucket(), FakeBucket()
+        limit = TenantRateLimit(tenant, shared)
+        limit.acquire()
+        limit.update_from_headers({'x-ratelimit-remaining': '0'})
+        self.assertEqual((tenant.acquired, shared.acquired), (1, 1))
+        self.assertEqual((len(tenant.headers), len(shared.headers)), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
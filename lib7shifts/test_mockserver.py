@@ -0,0 +1,116 @@
+"Test the mock API server against the client."
+import datetime
+import unittest
+import lib7shifts
+from lib7shifts.exceptions import APIError
+from lib7shifts.mockserver import MockServer, MockData
+from lib7shifts.retry import RetryPolicy
+
+UTC = datetime.timezone.utc
+
+
+class TestMockServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(MockData(
+            locations=4, users=30, punches=20000, receipts=2000)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_time_range_and_filters(self):
+        client = self.server.get_client()
+        window = {'clocked_in[gte]': datetime.datetime(2023, 2, 1, tzinfo=UTC),
+                  'clocked_in[lte]': datetime.datetime(2023, 2, 3, tzinfo=UTC)}
+        punches = list(lib7shifts.list_punches(
+            client, 1, approved=True, limit=50, **window))
+        self.assertTrue(punches)
+        self.assertTrue(all(punch['approved'] for punch in punches))
+        self.assertGreaterEqual(punches[0]['clocked_in'], '2023-02-01')
+        self.assertLessEqual(punches[-1]['clocked_in'], '2023-02-03 00:00:00')
+        sharded = list(lib7shifts.list_punches(
+            client, 1, approved=True, limit=50, shards=3,
+            sort_by='clocked_in.asc', **window))
+        self.assertEqual([punch['id'] for punch in sharded],
+                         [punch['id'] for punch in punches])
+
+    def test_receipts_by_location(self):
+        client = self.server.get_client()
+        receipts = list(lib7shifts.list_receipts(
+            client, 1, location_id=3, limit=20))
+        self.assertEqual(len(receipts), 500)
+        self.assertEqual({receipt['location_id'] for receipt in receipts}, {3})
+
+    def test_receipts_look_like_the_api(self):
+        client = self.server.get_client()
+        window = {
+            'receipt_date[gte]': datetime.datetime(2023, 3, 1, tzinfo=UTC),
+            'receipt_date[lte]': datetime.datetime(2023, 3, 10, tzinfo=UTC)}
+        receipts = list(lib7shifts.list_receipts(
+            client, 1, location_id=2, compact=True, limit=10, **window))
+        self.assertTrue(receipts)
+        for receipt in receipts:
+            self.assertEqual(receipt.to_dict(), dict(receipt))
+            self.assertEqual(receipt.receipt_date.utcoffset(),
+                             datetime.timedelta(0))
+            self.assertTrue(window['receipt_date[gte]'] <=
+                            receipt.receipt_date <=
+                            window['receipt_date[lte]'])
+            self.assertGreater(receipt.created_date, receipt.receipt_date)
+        self.assertEqual(len({receipt.receipt_id for receipt in receipts}),
+                         len(receipts))
+        sharded = list(lib7shifts.list_receipts(
+            client, 1, location_id=2, compact=True, limit=10, shards=3,
+            **window))
+        self.assertEqual(sharded, receipts)
+        receipt = lib7shifts.get_receipt(client, 1, receipts[0].id)
+        self.assertEqual(receipt, receipts[0].to_dict())
+        with self.assertRaises(APIError) as context:
+            lib7shifts.get_receipt(
+                client, 1, '2811d1f2-de7b-4ed5-9b4b-f6e21332eafe')
+        self.assertEqual(context.exception.status, 404)
+
+    def test_reads_and_reports(self):
+        client = self.server.get_client()
+        self.assertEqual(lib7shifts.get_user(client, 1, 7)['id'], 7)
+        self.assertEqual(len(lib7shifts.list_user_wages(client, 1, 7)[0]), 1)
+        with self.assertRaises(APIError) as context:
+            lib7shifts.get_user(client, 1, 31)
+        self.assertEqual(context.exception.status, 404)
+        users = list(lib7shifts.iter_hours_and_wages_users(
+            client, company_id=1, from_day='2023-01-01',
+            to_day='2023-01-14'))
+        self.assertEqual(len(users), 30)
+        self.assertEqual(len(users[0]['weeks']), 2)
+
+
+class TestMockFailures(unittest.TestCase):
+
+    def test_errors_are_retried(self):
+        with MockServer(MockData(users=100), error_rate=0.3) as server:
+            client = server.get_client(retry=RetryPolicy(
+                total=20, backoff_factor=0))
+            users = list(lib7shifts.list_users(client, 1, limit=10))
+            self.assertEqual(len(users), 100)
+            self.assertTrue(any(status >= 500 for status in server.stats))
+
+    def test_page_size_limit(self):
+        with MockServer(max_limit=100) as server:
+            client = server.get_client()
+            with self.assertRaises(APIError) as context:
+                list(lib7shifts.list_users(client, 1, limit=101))
+            self.assertEqual(context.exception.status, 422)
+
+    def test_rate_limit(self):
+        with MockServer(rate_limit=0.1) as server:
+            client = server.get_client(retry=RetryPolicy(total=0))
+            client.get_endpoint('/v2/whoami')
+            with self.assertRaises(APIError) as context:
+                client.get_endpoint('/v2/whoami')
+            self.assertEqual(context.exception.status, 429)
+
+
+if __name__ == '__main__':
+    unittest.main()
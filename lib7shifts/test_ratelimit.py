@@ -0,0 +1,83 @@
+"Test the ratelimit module."
+import unittest
+import threading
+from lib7shifts.ratelimit import TokenBucket, get_header
+
+
+class FakeClock(object):
+    "A manually-advanced clock for deterministic bucket tests"
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2, capacity=4, clock=self.clock)
+
+    def test_burst_then_refill(self):
+        for _ in range(4):
+            self.assertTrue(self.bucket.acquire(timeout=0))
+        self.assertFalse(self.bucket.acquire(timeout=0))
+        self.clock.now += 0.5  # one token at 2/sec
+        self.assertTrue(self.bucket.acquire(timeout=0))
+        self.assertFalse(self.bucket.acquire(timeout=0))
+        self.clock.now += 100
+        self.assertEqual(self.bucket.tokens, 4)
+
+    def test_remaining_header_drains_bucket(self):
+        self.bucket.update_from_headers({'X-RateLimit-Remaining': '1'})
+        self.assertTrue(self.bucket.acquire(timeout=0))
+        self.assertFalse(self.bucket.acquire(timeout=0))
+
+    def test_exhausted_budget_blocks_until_reset(self):
+        self.bucket.update_from_headers(
+            {'x-ratelimit-remaining': '0', 'x-ratelimit-reset': '3'})
+        self.clock.now += 2
+        self.assertFalse(self.bucket.acquire(timeout=0))
+        self.clock.now += 1
+        self.assertTrue(self.bucket.acquire(timeout=0))
+
+    def test_retry_after_blocks(self):
+        self.bucket.update_from_headers({'Retry-After': '5'})
+        self.clock.now += 4.9
+        self.assertFalse(self.bucket.acquire(timeout=0))
+        self.clock.now += 0.1
+        self.assertTrue(self.bucket.acquire(timeout=0))
+
+    def test_limit_header_caps_capacity(self):
+        self.bucket.update_from_headers({'x-ratelimit-limit': '2'})
+        self.clock.now += 100
+        self.assertEqual(self.bucket.tokens, 2)
+
+    def test_garbage_headers_ignored(self):
+        self.bucket.update_from_headers({'x-ratelimit-remaining': 'lots'})
+        self.assertEqual(self.bucket.tokens, 4)
+
+    def test_shared_between_threads(self):
+        bucket = TokenBucket(rate=1, capacity=50, clock=self.clock)
+        taken = []
+
+        def worker():
+            while bucket.acquire(timeout=0):
+                taken.append(1)
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(taken), 50)
+
+    def test_get_header_case_insensitive(self):
+        self.assertEqual(get_header({'Retry-After': '1'}, 'retry-after'), '1')
+        self.assertIsNone(get_header({}, 'retry-after'))
+        self.assertIsNone(get_header(None, 'retry-after'))
+
+
+if __name__ == '__main__':
+    unittest.main()
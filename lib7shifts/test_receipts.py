@@ -0,0 +1,160 @@
+"Test bulk receipt upserts."
+import json
+import threading
+import unittest
+import lib7shifts
+from lib7shifts.mockserver import MockServer
+from lib7shifts.retry import RetryPolicy
+from lib7shifts.testing import get_client
+
+#: Retry upserts at once, for the tests
+NO_WAIT = RetryPolicy(statuses=(429, 503), methods=('POST', 'PUT'),
+                      backoff_factor=0, respect_retry_after=False)
+
+
+class ReceiptStore(object):
+    """Answers a :class:`lib7shifts.testing.FakePool`'s requests by storing
+    receipts by receipt_id, refusing to create one twice, and failing any
+    receipt with a negative total"""
+
+    def __init__(self, existing=()):
+        self.receipts = {receipt_id: {} for receipt_id in existing}
+        #: receipt_ids whose first create is stored, but answered with 503
+        self.flaky = set()
+        #: a status to refuse every request with, if set
+        self.refuse = None
+        self._lock = threading.Lock()
+
+    def __call__(self, method, path, body=None, **urlopen_kw):
+        receipt = json.loads(body)
+        with self._lock:
+            if self.refuse:
+                return self.refuse, {'error': 'refused'}
+            if receipt['net_total'] < 0:
+                return 422, {'error': 'invalid total'}
+            if method == 'POST':
+                receipt_id = receipt['receipt_id']
+                if receipt_id in self.receipts:
+                    return 409, {'error': 'exists'}
+                if receipt_id in self.flaky:
+                    self.flaky.discard(receipt_id)
+                    self.receipts[receipt_id] = receipt
+                    return 503, {'error': 'unavailable'}
+            else:
+                receipt_id = path.rsplit('/', 1)[1]
+            self.receipts[receipt_id] = receipt
+        return 200, {'data': {'uuid': 'uuid-{}'.format(receipt_id)}}
+
+
+class TestBulkUpsert(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ReceiptStore(existing=['r1', 'r2'])
+        self.client, self.pool = get_client(self.store)
+
+    def test_creates_updates_and_failures(self):
+        receipts = ({'receipt_id': 'r{}'.format(n), 'net_total': n * 100}
+                    for n in range(1, 21))
+        receipts = list(receipts) + [{'receipt_id': 'bad', 'net_total': -1}]
+        results = sorted(lib7shifts.bulk_upsert_receipts(
+            self.client, 1, receipts, max_workers=4, existing=['r2']))
+        self.assertEqual(len(results), 21)
+        self.assertEqual([result.index for result in results],
+                         list(range(21)))
+        self.assertEqual([result.action for result in results[:3]],
+                         ['updated', 'updated', 'created'])
+        self.assertEqual(results[2].uuid, 'uuid-r3')
+        failed = [result for result in results if not result.ok]
+        self.assertEqual([result.receipt_id for result in failed], ['bad'])
+        self.assertEqual(failed[0].error.status, 422)
+        self.assertEqual(self.store.receipts['r20']['net_total'], 2000)
+        # one create per receipt, except r2 which was known to exist, and
+        # an update for each existing one
+        self.assertEqual(self.pool.calls().count(
+            ('POST', '/v2/company/1/receipts')), 20)
+        self.assertEqual(sorted(path for method, path in self.pool.calls()
+                                if method == 'PUT'),
+                         ['/v2/company/1/receipts/r1',
+                          '/v2/company/1/receipts/r2'])
+
+    def test_unavailable_create_is_retried_as_update(self):
+        self.store.flaky.add('r9')
+        results = list(lib7shifts.bulk_upsert_receipts(
+            self.client, 1, [{'receipt_id': 'r9', 'net_total': 900}],
+            retry=NO_WAIT))
+        self.assertEqual(results[0].action, 'updated')
+        self.assertEqual(self.pool.calls(), [
+            ('POST', '/v2/company/1/receipts'),
+            ('POST', '/v2/company/1/receipts'),
+            ('PUT', '/v2/company/1/receipts/r9')])
+        # without retries, the 503 is the result
+        self.store.flaky.add('r10')
+        results = list(lib7shifts.bulk_upsert_receipts(
+            self.client, 1, [{'receipt_id': 'r10', 'net_total': 1}],
+            retry=None))
+        self.assertEqual(results[0].error.status, 503)
+
+    def test_retries_are_not_stacked_on_the_client_policy(self):
+        self.store.refuse = 503
+        client, pool = get_client(self.store, retry=RetryPolicy(
+            total=2, backoff_factor=0, respect_retry_after=False))
+        # the client retries the update (a PUT) twice, and nothing else does
+        results = list(lib7shifts.bulk_upsert_receipts(
+            client, 1, [{'receipt_id': 'r1', 'net_total': 1}],
+            existing=['r1'], retry=NO_WAIT))
+        self.assertEqual(results[0].error.status, 503)
+        self.assertEqual(len(pool.requests), 3)
+        # the client doesn't retry the create (a POST), so the upsert does
+        del pool.requests[:]
+        results = list(lib7shifts.bulk_upsert_receipts(
+            client, 1, [{'receipt_id': 'r5', 'net_total': 1}],
+            retry=NO_WAIT))
+        self.assertEqual(results[0].error.status, 503)
+        self.assertEqual(pool.calls(),
+                         [('POST', '/v2/company/1/receipts')] * 6)
+
+    def test_receipt_id_required(self):
+        results = list(lib7shifts.bulk_upsert_receipts(
+            self.client, 1, [{'net_total': 1}]))
+        self.assertIsInstance(results[0].error, RuntimeError)
+        self.assertEqual(self.pool.requests, [])
+
+
+class TestBulkUpsertMockServer(unittest.TestCase):
+    "Upsert receipts through the client's real write path"
+
+    @staticmethod
+    def receipts(count, total):
+        return [{'receipt_id': 'POS-{}'.format(n), 'location_id': 1,
+                 'net_total': total} for n in range(count)]
+
+    def test_conflict_then_update(self):
+        with MockServer() as server:
+            client = server.get_client()
+            results = list(lib7shifts.bulk_upsert_receipts(
+                client, 1, self.receipts(10, 100), max_workers=4))
+            self.assertEqual({result.action for result in results},
+                             {'created'})
+            self.assertEqual(len(server.receipts), 10)
+            results = sorted(lib7shifts.bulk_upsert_receipts(
+                client, 1, self.receipts(12, 250), max_workers=4))
+            self.assertEqual([result.action for result in results],
+                             ['updated'] * 10 + ['created'] * 2)
+            self.assertEqual(server.stats[409], 10)
+            self.assertEqual(results[0].uuid, server.receipts[
+                (1, 'POS-0')]['id'])
+            self.assertEqual({receipt['net_total'] for receipt in
+                              server.receipts.values()}, {250})
+
+    def test_rate_limited_writes_are_retried(self):
+        with MockServer(rate_limit=5) as server:
+            client = server.get_client()
+            results = list(lib7shifts.bulk_upsert_receipts(
+                client, 1, self.receipts(8, 100), max_workers=4))
+            self.assertTrue(all(result.ok for result in results))
+            self.assertTrue(server.stats.get(429))
+            self.assertEqual(len(server.receipts), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"Test the compact record classes."
+import pickle
+import datetime
+import unittest
+import lib7shifts
+from lib7shifts.testing import get_client, page
+
+UTC = datetime.timezone.utc
+
+PUNCH = {
+    'id': 1, 'company_id': 2, 'location_id': 3, 'department_id': 4,
+    'role_id': 5, 'user_id': 6, 'shift_id': None,
+    'clocked_in': '2022-07-03 09:03:00',
+    'clocked_out': '0000-00-00 00:00:00', 'approved': True,
+    'hourly_wage': 1525, 'tips': 0,
+    'breaks': [{'id': 7, 'in': '2022-07-03 12:00:00',
+                'out': '2022-07-03 12:30:00', 'paid': False,
+                'deleted': False}],
+    'deleted': False, 'created': '2022-07-03 09:03:00',
+    'modified': '2022-07-03 15:06:00', 'notes': 'not in the schema'}
+
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.punch = lib7shifts.TimePunchRecord.from_dict(PUNCH)
+
+    def test_typed_attributes(self):
+        self.assertEqual(self.punch.user_id, 6)
+        self.assertEqual(self.punch.clocked_in,
+                         datetime.datetime(2022, 7, 3, 9, 3, tzinfo=UTC))
+        self.assertIsNone(self.punch.clocked_out)
+        self.assertEqual(self.punch.breaks[0].out_time,
+                         datetime.datetime(2022, 7, 3, 12, 30, tzinfo=UTC))
+        self.assertFalse(hasattr(self.punch, '__dict__'))
+
+    def test_api_form(self):
+        self.assertEqual(self.punch['clocked_in'], '2022-07-03 09:03:00')
+        self.assertEqual(self.punch.get('notes'), 'not in the schema')
+        self.assertIsNone(self.punch.get('missing'))
+        with self.assertRaises(KeyError):
+            self.punch['missing']
+        self.assertEqual(self.punch['clocked_out'], '0000-00-00 00:00:00')
+
+    def test_round_trip(self):
+        self.assertEqual(self.punch.to_dict(), PUNCH)
+        self.assertEqual(dict(self.punch), PUNCH)
+        punch = lib7shifts.TimePunch(**self.punch.to_dict())
+        expected = lib7shifts.TimePunch(**PUNCH)
+        # an open punch reads as clocked out now, as from the API's data
+        self.assertAlmostEqual(punch.clocked_out, expected.clocked_out,
+                               delta=datetime.timedelta(seconds=5))
+        self.assertEqual(punch.clocked_in, expected.clocked_in)
+        self.assertEqual(punch.breaks[0].out_time,
+                         expected.breaks[0].out_time)
+        self.assertEqual(punch, expected)
+
+    def test_unparseable_dates_are_kept(self):
+        punch = lib7shifts.TimePunchRecord.from_dict(
+            dict(PUNCH, clocked_in='not a date', clocked_out=''))
+        self.assertIsNone(punch.clocked_in)
+        self.assertIsNone(punch.clocked_out)
+        self.assertEqual(punch['clocked_in'], 'not a date')
+        self.assertEqual(punch.to_dict()['clocked_out'], '')
+        self.assertEqual(pickle.loads(pickle.dumps(punch)), punch)
+
+    def test_pickle(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.punch)), self.punch)
+
+    def test_receipt_iso_dates(self):
+        receipt = lib7shifts.ReceiptRecord(
+            id='abc', receipt_date='2022-12-31T21:00:43+00:00',
+            modified_date='2023-01-01T00:25:28Z')
+        self.assertEqual(receipt.receipt_date.tzinfo, UTC)
+        self.assertEqual(receipt['receipt_date'], '2022-12-31T21:00:43+00:00')
+        self.assertEqual(receipt.modified_date.hour, 0)
+
+    def test_list_compact(self):
+        client, _ = get_client([(200, page([PUNCH]))])
+        punches = list(lib7shifts.list_punches(client, 2, compact=True))
+        self.assertIsInstance(punches[0], lib7shifts.TimePunchRecord)
+        self.assertEqual(punches, [self.punch])
+
+
+if __name__ == '__main__':
+    unittest.main()
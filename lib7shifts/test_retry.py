@@ -0,0 +1,92 @@
+"Test the retry module and the client's retry handling."
+import unittest
+from unittest.mock import patch
+import urllib3
+from lib7shifts import base
+from lib7shifts.exceptions import APIError
+from lib7shifts.retry import RetryPolicy, parse_retry_after
+from lib7shifts.testing import FakeResponse, get_client
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_non_idempotent_not_retried(self):
+        policy = RetryPolicy()
+        self.assertIsNone(policy.get_delay('POST', 0, 0, status=503))
+        self.assertIsNotNone(policy.get_delay('PUT', 0, 0, status=503))
+
+    def test_status_and_attempts(self):
+        policy = RetryPolicy(total=2)
+        self.assertIsNone(policy.get_delay('GET', 0, 0, status=404))
+        self.assertIsNotNone(policy.get_delay('GET', 1, 0, status=429))
+        self.assertIsNone(policy.get_delay('GET', 2, 0, status=429))
+
+    def test_backoff_is_capped_and_jittered(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5)
+        for attempt in range(10):
+            self.assertLessEqual(policy.backoff(attempt), 5)
+        policy.jitter = False
+        self.assertEqual(policy.backoff(2), 4)
+        self.assertEqual(policy.backoff(9), 5)
+
+    def test_retry_after_and_deadline(self):
+        policy = RetryPolicy(deadline=10)
+        self.assertEqual(policy.get_delay(
+            'GET', 0, 0, status=429, headers={'Retry-After': '7'}), 7)
+        self.assertIsNone(policy.get_delay(
+            'GET', 0, 5, status=429, headers={'Retry-After': '7'}))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+
+@patch('lib7shifts.time.sleep')
+class TestClientRetries(unittest.TestCase):
+
+    def test_retries_until_success(self, mock_sleep):
+        client, pool = get_client([
+            FakeResponse(502), urllib3.exceptions.ProtocolError('reset'),
+            FakeResponse(200, b'{"data": 1}')], retry=3)
+        self.assertEqual(client.get_endpoint('/v2/whoami'), {'data': 1})
+        self.assertEqual(len(pool.requests), 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_gives_up_after_total(self, mock_sleep):
+        client, pool = get_client([FakeResponse(503)] * 3, retry=2)
+        with self.assertRaises(APIError) as context:
+            client.get_endpoint('/v2/whoami')
+        self.assertEqual(context.exception.status, 503)
+        self.assertEqual(len(pool.requests), 3)
+
+    def test_no_retry_by_default(self, mock_sleep):
+        client, pool = get_client([FakeResponse(503)])
+        with self.assertRaises(APIError):
+            client.get_endpoint('/v2/whoami')
+        mock_sleep.assert_not_called()
+
+    def test_paging_resumes_cursor(self, mock_sleep):
+        page1 = b'{"data": [1, 2], "meta": {"cursor": {"next": "abc"}}}'
+        page2 = b'{"data": [3], "meta": {"cursor": {"next": null}}}'
+        client, pool = get_client([
+            FakeResponse(200, page1), FakeResponse(429),
+            FakeResponse(200, page2)], retry=1)
+        self.assertEqual(
+            list(base.page_api_get_results(client, '/v2/x')), [1, 2, 3])
+        self.assertEqual(pool.requests[1][2]['fields']['cursor'], 'abc')
+        self.assertEqual(pool.requests[2][2]['fields']['cursor'], 'abc')
+
+    def test_failed_page_reports_cursor(self, mock_sleep):
+        page1 = b'{"data": [1], "meta": {"cursor": {"next": "abc"}}}'
+        client, pool = get_client([FakeResponse(200, page1), FakeResponse(500)])
+        results = base.page_api_get_results(client, '/v2/x')
+        self.assertEqual(next(results), 1)
+        with self.assertRaises(APIError) as context:
+            next(results)
+        self.assertEqual(context.exception.cursor, 'abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
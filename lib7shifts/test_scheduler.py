@@ -0,0 +1,84 @@
+"Test the scheduler module."
+import threading
+import unittest
+from lib7shifts.scheduler import FairScheduler
+from lib7shifts.test_ratelimit import FakeClock
+
+
+class TestFairScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.order = []
+
+    def scheduler(self, **kwargs):
+        kwargs.setdefault('max_workers', 1)
+        return FairScheduler(
+            clock=self.clock, on_progress=lambda *args: None, **kwargs)
+
+    def unit(self, name, seconds):
+        "A unit of work that takes `seconds` of the fake clock"
+        self.order.append(name)
+        self.clock.now += seconds
+        return name
+
+    def test_small_groups_go_first(self):
+        scheduler = self.scheduler()
+        for number in range(4):
+            scheduler.add('big', 'big', self.unit, 'big{}'.format(number), 10)
+        for number in range(2):
+            scheduler.add(
+                'small', 'small', self.unit, 'small{}'.format(number), 1)
+        results = list(scheduler.run())
+        self.assertEqual(self.order,
+                         ['big0', 'small0', 'small1', 'big1', 'big2', 'big3'])
+        self.assertEqual([result.result for result in results], self.order)
+        self.assertEqual(results[0].seconds, 10)
+        self.assertEqual((scheduler.done, scheduler.total), (6, 6))
+
+    def test_weights(self):
+        scheduler = self.scheduler(weights={'a': 2})
+        for number in range(3):
+            scheduler.add('a', 'a', self.unit, 'a{}'.format(number), 1)
+            scheduler.add('b', 'b', self.unit, 'b{}'.format(number), 1)
+        list(scheduler.run())
+        self.assertEqual(self.order, ['a0', 'b0', 'a1', 'a2', 'b1', 'b2'])
+
+    def test_errors_and_added_units(self):
+        scheduler = self.scheduler()
+
+        def fail():
+            scheduler.add('a', 'added', self.unit, 'added', 1)
+            raise ValueError('boom')
+
+        scheduler.add('a', 'fail', fail)
+        results = list(scheduler.run())
+        self.assertEqual([result.name for result in results],
+                         ['fail', 'added'])
+        self.assertIsInstance(results[0].error, ValueError)
+        self.assertTrue(results[1].ok)
+
+    def test_max_per_group(self):
+        scheduler = FairScheduler(
+            max_workers=4, max_per_group=2, on_progress=lambda *args: None)
+        lock = threading.Lock()
+        running = [0, 0]
+        release = threading.Event()
+
+        def unit():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+
+        for _ in range(6):
+            scheduler.add('a', 'unit', unit)
+        threading.Timer(0.1, release.set).start()
+        self.assertEqual(len(list(scheduler.run())), 6)
+        self.assertEqual(running[1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"Test the timezones module."
+import datetime
+import unittest
+import zoneinfo
+from unittest.mock import patch
+import lib7shifts
+from lib7shifts.timezones import TimezoneResolver
+from lib7shifts.testing import get_client, page
+
+EDMONTON = zoneinfo.ZoneInfo('America/Edmonton')
+HALIFAX = zoneinfo.ZoneInfo('America/Halifax')
+DEFAULT = datetime.timezone(datetime.timedelta(hours=-8), name='Default')
+LOCATIONS = [{'id': 1, 'timezone': 'America/Edmonton'},
+             {'id': 2, 'timezone': 'America/Halifax'},
+             {'id': 3, 'timezone': 'Not/AZone'}]
+
+
+class TestTimezoneResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.status = 200
+        self.client, self.pool = get_client(self.locations)
+        self.resolver = TimezoneResolver(self.client, default=DEFAULT)
+
+    def locations(self, method, path, **urlopen_kw):
+        "Serves the locations of a company, or fails with :attr:`status`"
+        if self.status != 200:
+            return self.status, {'error': 'forbidden'}
+        return 200, page(LOCATIONS)
+
+    def test_loaded_once_per_company(self):
+        self.assertIs(self.resolver.get(1, company_id=10), EDMONTON)
+        self.assertIs(self.resolver.get(2, company_id=10), HALIFAX)
+        self.assertIs(self.resolver.get(3, company_id=10), DEFAULT)
+        self.assertIs(self.resolver.get(4, company_id=10), DEFAULT)
+        self.assertEqual(len(self.pool.requests), 1)
+
+    def test_failures_are_not_retried(self):
+        self.status = 403
+        with self.assertLogs('TimezoneResolver', 'WARNING'):
+            self.assertIs(self.resolver.get(1, company_id=10), DEFAULT)
+        self.assertIs(self.resolver.get(2, company_id=10), DEFAULT)
+        with self.assertRaises(lib7shifts.exceptions.APIError):
+            self.resolver.load(11)
+        self.assertEqual(self.resolver.load(11), 0)
+        self.assertEqual(len(self.pool.requests), 2)
+        self.status = 200
+        self.resolver.forget(10)
+        self.assertIs(self.resolver.get(1, company_id=10), EDMONTON)
+        self.assertEqual(len(self.pool.requests), 3)
+
+    def test_without_client(self):
+        resolver = TimezoneResolver(default=DEFAULT)
+        self.assertIs(resolver.get(1, company_id=10), DEFAULT)
+        resolver.add_locations([{'id': 1, 'timezone': 'America/Halifax'}])
+        self.assertIs(resolver.get(1), HALIFAX)
+
+    def test_shift_dates(self):
+        row = {'location_id': 2, 'company_id': 10,
+               'start': '2023-07-01 09:00:00', 'end': '2023-07-01 17:00:00'}
+        with patch('lib7shifts.timezones.resolver', self.resolver):
+            shift = lib7shifts.Shift(**row)
+            record = lib7shifts.ShiftRecord.from_dict(row)
+            starts = (shift.start, record.start)
+        for start in starts:
+            self.assertEqual(start.tzinfo, HALIFAX)
+            self.assertEqual(start.utcoffset(), datetime.timedelta(hours=-3))
+        self.assertEqual(record['end'], row['end'])
+
+    def test_records_resolve_each_location_once(self):
+        rows = [{'id': n, 'location_id': n % 2 + 1, 'company_id': 10,
+                 'start': '2023-07-01 09:00:00'} for n in range(10)]
+        with patch('lib7shifts.timezones.resolver', self.resolver), \
+                patch.object(self.resolver, 'get',
+                             wraps=self.resolver.get) as get:
+            records = list(lib7shifts.ShiftRecord.from_dicts(rows))
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual([record.start.tzinfo for record in records[:2]],
+                         [EDMONTON, HALIFAX])
+
+
+if __name__ == '__main__':
+    unittest.main()
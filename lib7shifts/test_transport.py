@@ -0,0 +1,87 @@
+"Test recording and replaying API traffic."
+import os
+import shutil
+import tempfile
+import unittest
+import lib7shifts
+from lib7shifts.exceptions import ReplayMissError
+from lib7shifts.mockserver import MockServer, MockData
+from lib7shifts.transport import RecordingTransport, ReplayTransport
+from lib7shifts.testing import FakePool, page
+
+
+def three_pages(method, path, **urlopen_kw):
+    "Serves three pages of locations, following the cursor"
+    number = int(urlopen_kw['fields'].get('cursor') or 0)
+    return 200, page([{'id': number * 10 + i} for i in range(2)],
+                     next=str(number + 1) if number < 2 else None)
+
+
+class TestRecordReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cassette.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def record(self):
+        client = lib7shifts.get_client(access_token='secret')
+        with RecordingTransport(self.path) as recorder:
+            client._set_pool(recorder.wrap(FakePool(three_pages)))
+            return [loc['id'] for loc in lib7shifts.list_locations(
+                client, 1, limit=2)]
+
+    def test_replay_follows_cursor_chain(self):
+        recorded = self.record()
+        self.assertEqual(recorded, [0, 1, 10, 11, 20, 21])
+        with open(self.path) as cassette:
+            self.assertNotIn('secret', cassette.read())
+        replay = ReplayTransport(self.path)
+        self.assertEqual(len(replay), 3)
+        client = lib7shifts.get_client(
+            access_token='other', transport=replay, coalesce=False)
+        replayed = [loc['id'] for loc in lib7shifts.list_locations(
+            client, 1, limit=2)]
+        self.assertEqual(replayed, recorded)
+        with self.assertRaises(ReplayMissError):
+            list(lib7shifts.list_locations(client, 2, limit=2))
+
+    def test_recorded_latency(self):
+        self.record()
+        replay = ReplayTransport(self.path, latency='recorded', speed=2)
+        interaction = {'response': {'duration': 0.5}}
+        self.assertEqual(replay.get_latency(interaction), 0.25)
+        self.assertEqual(ReplayTransport(
+            self.path, latency=0.1).get_latency(interaction), 0.1)
+
+    def test_streamed_responses_are_streamed_and_recorded(self):
+        report = {'company_id': 1, 'from_day': '2023-01-01',
+                  'to_day': '2023-01-14'}
+        with MockServer(MockData(users=300)) as server, \
+                RecordingTransport(self.path) as recorder:
+            client = server.get_client(transport=recorder)
+            stream = client.stream_endpoint(
+                lib7shifts.hours_wages.ENDPOINT, chunk_size=4096,
+                fields=report)
+            chunks = [next(stream)]
+            # the body is still being received, so nothing's recorded yet
+            self.assertEqual(os.path.getsize(self.path), 0)
+            chunks.extend(stream)
+            self.assertGreater(len(chunks), 1)
+            # abandoned streams aren't recorded
+            users = lib7shifts.iter_hours_and_wages_users(client, **report)
+            next(users)
+            users.close()
+        with open(self.path) as cassette:
+            self.assertEqual(len(cassette.readlines()), 1)
+        client = lib7shifts.get_client(
+            access_token='replay', transport=ReplayTransport(self.path))
+        replayed = list(client.stream_endpoint(
+            lib7shifts.hours_wages.ENDPOINT, fields=report))
+        self.assertEqual(b''.join(replayed), b''.join(chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
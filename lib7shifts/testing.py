@@ -0,0 +1,76 @@
+"""
+Fakes shared by the test modules, standing in for the client's connection
+pool so that tests can answer its requests without a server::
+
+    client = lib7shifts.get_client(access_token='test')
+    pool = FakePool([(503, {}), (200, page([{'id': 1}]))])
+    client._set_pool(pool)
+
+For tests that need the API's behaviour (paging through filtered data,
+rate limits, failures), use :class:`lib7shifts.mockserver.MockServer`
+instead.
+"""
+import json
+import threading
+import lib7shifts
+
+
+class FakeResponse(object):
+    "The parts of a :class:`urllib3.response.HTTPResponse` the client uses"
+
+    def __init__(self, status, data=b'{}', headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+
+def page(data, next=None):
+    "Returns the body of a page of a listing holding `data`"
+    return {'data': data, 'meta': {'cursor': {'next': next}}}
+
+
+class FakePool(object):
+    """Answers each request with `respond`, which is either a list of
+    outcomes, used in order, or a function called with the method, path and
+    urlopen kwargs of each request to return its outcome. An outcome is a
+    :class:`FakeResponse`, a (status, body) tuple whose body is sent as
+    JSON, or an exception to raise.
+
+    Each request is recorded in :attr:`requests`, as a tuple of its method,
+    path and urlopen kwargs. Safe to share between threads.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond if callable(respond) else list(respond)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def request(self, method, path, **urlopen_kw):
+        with self._lock:
+            self.requests.append((method, path, urlopen_kw))
+            if not callable(self.respond):
+                outcome = self.respond.pop(0)
+        if callable(self.respond):
+            outcome = self.respond(method, path, **urlopen_kw)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, tuple):
+            status, body = outcome
+            return FakeResponse(status, json.dumps(body).encode('utf8'),
+                                {'Content-Type': 'application/json'})
+        return outcome
+
+    def calls(self):
+        "Returns the (method, path) of each request made so far"
+        with self._lock:
+            return [request[:2] for request in self.requests]
+
+
+def get_client(respond, **kwargs):
+    """Returns a client whose requests are answered by a :class:`FakePool`
+    with `respond`, and the pool. Other kwargs go to
+    :func:`lib7shifts.get_client`."""
+    client = lib7shifts.get_client(access_token='test', **kwargs)
+    pool = FakePool(respond)
+    client._set_pool(pool)
+    return client, pool
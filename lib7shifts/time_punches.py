@@ -4,6 +4,7 @@ This library is used for all time-punch related code and objects.
 from . import base
 from . import dates
 from . import exceptions
+from . import records
 
 ENDPOINT = '/v2/company/{company_id}/time_punches'
 
@@ -20,7 +21,8 @@ def get_punch(client, company_id, punch_id):
         raise exceptions.EntityNotFoundError('Time Punch', punch_id)
 
 
-def list_punches(client, company_id, **kwargs):
+def list_punches(client, company_id, shards=None, compact=False,
+                 raw=False, lazy=False, **kwargs):
     """Implements the 'List' method for Time Punches as outlined in the API,
     and returns a TimePunchList object representing all the punches. Provide a
     'client' parameter with an active :class:`lib7shifts.APIClient`
@@ -50,11 +52,42 @@ def list_punches(client, company_id, **kwargs):
     Note that datetime objects may be passed in for the clocked_in/clocked_out
     parameters, as well as modified_since.
 
+    To speed up large backfills, pass `shards` (not an API parameter) to
+    split the clocked_in[gte] to clocked_in[lte] range (both required) into
+    that many time windows, fetched concurrently. Results are ordered by the
+    sort_by field, if given. See
+    :func:`lib7shifts.base.page_api_get_results_sharded`.
+
+    Set `compact` to get :class:`TimePunchRecord` objects, which take a
+    fraction of the memory, instead of :class:`TimePunch` objects.
+
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`TimePunch` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
+
     See https://developers.7shifts.com/reference/gettimepunches for
     details.
     """
-    if 'limit' not in kwargs:
-        kwargs['limit'] = 500
+    kwargs = _list_punches_params(kwargs)
+    endpoint = ENDPOINT.format(company_id=company_id)
+    if shards:
+        sort_key, reverse = base.sort_order(kwargs.get('sort_by'))
+        results = base.page_api_get_results_sharded(
+            client, endpoint, 'clocked_in', shards=shards,
+            sort_key=sort_key, reverse=reverse, **kwargs)
+    else:
+        results = base.page_api_get_results(client, endpoint, **kwargs)
+    if compact:
+        yield from map(TimePunchRecord.from_dict, results)
+        return
+    yield from base.iter_objects(results, TimePunch, raw, lazy)
+
+
+def _list_punches_params(kwargs):
+    """Apply the default page size and cast any clocked_in/clocked_out
+    filters to the iso8601 form the List Time Punches endpoint expects.
+    Returns the updated `kwargs` dictionary."""
+    kwargs.setdefault('default_limit', 500)
     if kwargs.get('clocked_in[gte]'):
         # cast to iso8601 because the endpoint supports full date-time
         kwargs['clocked_in[gte]'] = dates.iso8601_dt(
@@ -71,10 +104,7 @@ def list_punches(client, company_id, **kwargs):
         # cast to iso8601 because the endpoint supports full date-time
         kwargs['clocked_out[lte]'] = dates.iso8601_dt(
             kwargs.get('clocked_out[lte]'))
-    for item in base.page_api_get_results(
-            client, ENDPOINT.format(company_id=company_id),
-            **kwargs):
-        yield TimePunch(**item)
+    return kwargs
 
 
 class TimePunch(base.APIObject):
@@ -115,7 +145,7 @@ class TimePunch(base.APIObject):
         if self._shift is None:
             from . import shifts
             self._shift = shifts.get_shift(
-                client, self.company_id, self.shift_id)
+                client, self['company_id'], self['shift_id'])
         return self._shift
 
     def get_user(self, client):
@@ -125,7 +155,7 @@ class TimePunch(base.APIObject):
         if self._user is None:
             from . import users
             self._user = users.get_user(
-                client, self.company_id, self.user_id)
+                client, self['company_id'], self['user_id'])
         return self._user
 
     def get_role(self, client):
@@ -135,7 +165,7 @@ class TimePunch(base.APIObject):
         if self._role is None:
             from . import roles
             self._role = roles.get_role(
-                client, self.company_id, self.role_id)
+                client, self['company_id'], self['role_id'])
         return self._role
 
     def get_location(self, client):
@@ -146,7 +176,7 @@ class TimePunch(base.APIObject):
         if self._location is None:
             from . import locations
             self._location = locations.get_location(
-                client, self.company, self.location_id)
+                client, self['company_id'], self['location_id'])
         return self._location
 
     def get_department(self, client):
@@ -157,33 +187,32 @@ class TimePunch(base.APIObject):
         if self._department is None:
             from . import departments
             self._department = departments.get_department(
-                client, self.company, self.department_id)
+                client, self['company_id'], self['department_id'])
         return self._department
 
     @property
     def clocked_in(self):
         "Returns a :class:`datetime.datetime` object for the punch-in time"
-        return dates.to_datetime(self.get('clocked_in'))
+        return self._parse_date('clocked_in')
 
     @property
     def clocked_out(self):
         "Returns a :class:`datetime.datetime` object for the punch-out time"
-        if self._api_data()['clocked_out'] \
-                == '0000-00-00 00:00:00':
+        if self.get('clocked_out') == '0000-00-00 00:00:00':
             # currently logged in shift, return now
             return dates.DateTime7Shifts.now()
-        return dates.to_datetime(self.get('clocked_out'))
+        return self._parse_date('clocked_out')
 
     @property
     def created(self):
         "Returns a :class:`datetime.datetime` object for punch creation time"
-        return dates.to_datetime(self.get('created'))
+        return self._parse_date('created')
 
     @property
     def modified(self):
         """Returns a :class:`datetime.datetime` object corresponding to the
         last time this punch was modified"""
-        return dates.to_datetime(self.get('modified'))
+        return self._parse_date('modified')
 
     @property
     def breaks(self):
@@ -206,13 +235,13 @@ class TimePunchBreak(base.APIObject):
     def in_time(self):
         """Returns a :class:`datetime.datetime` object corresponding to the
         time the break started"""
-        return dates.to_datetime(self.get('in'))
+        return self._parse_date('in')
 
     @property
     def out_time(self):
         """Returns a :class:`datetime.datetime` object corresponding to the
         time the break ended"""
-        return dates.to_datetime(self.get('out'))
+        return self._parse_date('out')
 
     @property
     def paid(self):
@@ -250,3 +279,39 @@ class TimePunchBreakList(list):
         for item in data:
             obj_list.append(TimePunchBreak(**item))
         return cls(obj_list)
+
+
+class TimePunchBreakRecord(records.Record):
+    """A compact, read-only form of :class:`TimePunchBreak`, see
+    :mod:`lib7shifts.records`"""
+    SCHEMA = (
+        ('id', int), ('in', records.DateTime()), ('out', records.DateTime()),
+        ('paid', bool), ('deleted', bool),
+    )
+
+    @property
+    def in_time(self):
+        "The time the break started"
+        return getattr(self, 'in')
+
+    @property
+    def out_time(self):
+        "The time the break ended"
+        return getattr(self, 'out')
+
+
+class TimePunchRecord(records.Record):
+    """A compact form of :class:`TimePunch`, see :mod:`lib7shifts.records`.
+    Date-time fields are :class:`datetime.datetime` objects in UTC, except
+    that `clocked_out` is None while the user is still clocked in, and
+    `breaks` is a list of :class:`TimePunchBreakRecord` objects."""
+    SCHEMA = (
+        ('id', int), ('company_id', int), ('location_id', int),
+        ('department_id', int), ('role_id', int), ('user_id', int),
+        ('shift_id', int), ('clocked_in', records.DateTime()),
+        ('clocked_out', records.DateTime()), ('approved', bool),
+        ('hourly_wage', int), ('tips', int),
+        ('breaks', records.Records(TimePunchBreakRecord)),
+        ('deleted', bool), ('created', records.DateTime()),
+        ('modified', records.DateTime()),
+    )
@@ -0,0 +1,128 @@
+"""
+Resolve the timezone of each 7shifts location.
+
+Some API fields, like the start and end of shifts, are in the local time of
+their location rather than in UTC. A :class:`TimezoneResolver` loads the
+locations of a company with one :func:`lib7shifts.list_locations` call, the
+first time one of them is asked for, and keeps a :class:`zoneinfo.ZoneInfo`
+for each location ID from then on::
+
+    resolver = TimezoneResolver(client)
+    tzinfo = resolver.get(location_id, company_id)
+
+The module's :data:`resolver` is the one used by the date properties of
+objects like :class:`lib7shifts.Shift`. It has no client until one is
+given, so it only knows the locations it is told about by :meth:`load`
+or :meth:`add_locations`; any other location is taken to be in the local
+timezone of the machine, as before::
+
+    lib7shifts.timezones.resolver.client = client
+"""
+import logging
+import threading
+import zoneinfo
+from . import dates
+
+
+class TimezoneResolver(object):
+    """Maps location IDs to timezones, loading them from the API once per
+    company.
+
+    - client: the :class:`lib7shifts.APIClient7Shifts` used to list the
+      locations of a company that isn't known yet (if None, locations are
+      only known once added with :meth:`load` or :meth:`add_locations`)
+    - default: the timezone of locations that aren't known or don't have a
+      valid timezone (by default, the local timezone of the machine, see
+      :func:`lib7shifts.dates.get_local_tz`)
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, client=None, default=None):
+        self.client = client
+        self.default = default
+        self.log = logging.getLogger(self.__class__.__name__)
+        #: Location IDs to timezones, or to None where the default is used
+        self._zones = {}
+        self._companies = set()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(locations={}, companies={})".format(
+            self.__class__.__name__, len(self._zones), len(self._companies))
+
+    def get(self, location_id, company_id=None):
+        """Returns the timezone of `location_id`. If the location isn't
+        known yet and the resolver has a client, the locations of
+        `company_id` are loaded first (once). If they can't be loaded, the
+        error is logged and the default timezone is used."""
+        try:
+            return self._zones[location_id] or self.get_default()
+        except KeyError:
+            pass
+        if company_id is not None and self.client is not None and \
+                company_id not in self._companies:
+            try:
+                self.load(company_id)
+            except Exception as error:
+                self.log.warning(
+                    "Can't list the locations of company %s, using the "
+                    "default timezone: %s", company_id, error)
+        return self._zones.get(location_id) or self.get_default()
+
+    def get_default(self):
+        "Returns the timezone of locations that aren't known"
+        return self.default or dates.get_local_tz()
+
+    def load(self, company_id, client=None):
+        """List the locations of `company_id`, using `client` (or the
+        resolver's), and add their timezones. Companies are only loaded
+        once; returns the number of locations added.
+
+        Errors listing the locations are raised, but the company isn't tried
+        again, so that a company the client can't read (eg. a 403) doesn't
+        cost a request every time one of its locations is looked up. Call
+        :meth:`forget` to try it again."""
+        with self._lock:
+            if company_id in self._companies:
+                return 0
+            # marked first, so that a failed listing counts as loaded
+            self._companies.add(company_id)
+            from .locations import list_locations
+            locations = list(list_locations(
+                client or self.client, company_id, raw=True))
+            return self.add_locations(locations)
+
+    def forget(self, company_id):
+        """Let the locations of `company_id` be listed again, the next time
+        one that isn't known is asked for"""
+        with self._lock:
+            self._companies.discard(company_id)
+
+    def add_locations(self, locations):
+        """Add the timezones of `locations`, an iterable of location
+        dictionaries (or objects) with 'id' and 'timezone' fields. Returns
+        the number added."""
+        count = 0
+        for location in locations:
+            self.add(location['id'], location.get('timezone'))
+            count += 1
+        return count
+
+    def add(self, location_id, timezone):
+        """Set the timezone of `location_id` from its IANA name (eg.
+        'America/Edmonton'). Unknown names are logged, and the default
+        timezone is used for the location."""
+        zone = None
+        if timezone:
+            try:
+                zone = zoneinfo.ZoneInfo(timezone)
+            except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+                self.log.warning(
+                    "Unknown timezone %r for location %s, using the default",
+                    timezone, location_id)
+        self._zones[location_id] = zone
+
+
+#: The resolver used by the date properties of objects
+resolver = TimezoneResolver()
@@ -0,0 +1,300 @@
+"""
+Record and replay API traffic, to run code that uses lib7shifts without the
+live 7shifts API (eg. for benchmarks and tests in CI).
+
+A transport is given to the client with the `transport` kwarg. It wraps the
+client's connection pool, so every request the client makes goes through it.
+First, record a cassette against the real API::
+
+    from lib7shifts.transport import RecordingTransport, ReplayTransport
+    with RecordingTransport('punches.jsonl') as recorder:
+        client = lib7shifts.get_client(transport=recorder)
+        punches = list(lib7shifts.list_punches(client, 1234, **filters))
+
+Then replay it, as many times as needed, with no network access and no
+access token::
+
+    client = lib7shifts.get_client(
+        access_token='replay', transport=ReplayTransport('punches.jsonl'))
+    punches = list(lib7shifts.list_punches(client, 1234, **filters))
+
+Cassettes are JSON Lines files, with one request and its response per line.
+Request headers (and so the access token) are never recorded. Pages of a
+listing are separate requests distinguished by their cursor, so a replayed
+listing follows the same cursor chain as the recording.
+
+Replays answer instantly by default. Pass `latency` to :class:`ReplayTransport`
+to reproduce the timing of production instead: 'recorded' sleeps for as long
+as each response took when it was recorded, a number sleeps that many seconds
+for every response, and a function of the interaction dictionary returns the
+seconds to sleep.
+
+Streamed responses (see :meth:`lib7shifts.APIClient7Shifts.stream_endpoint`)
+are still streamed to the caller while recording, but a copy of the body is
+kept as it is read, since a cassette line holds the whole body. Recording a
+large streamed report therefore holds it in memory until it has been read to
+the end and written out. A stream that is abandoned part-way is not recorded.
+
+Transports only apply to :class:`lib7shifts.APIClient7Shifts`, not to the
+asyncio client.
+"""
+import io
+import json
+import time
+import base64
+import threading
+import collections
+import urllib3
+from . import exceptions
+
+
+def request_key(method, path, fields=None, body=None):
+    """Returns the key used to match a replayed request to a recorded one.
+    Fields are compared as strings, regardless of order."""
+    fields = tuple(sorted(
+        (str(name), str(value)) for name, value in (fields or {}).items()))
+    if isinstance(body, bytes):
+        body = body.decode('utf8')
+    return (method.upper(), path, fields, body or None)
+
+
+def _encode_body(data):
+    "Returns a JSON-safe form of a response body"
+    try:
+        return {'text': data.decode('utf8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(data).decode('ascii')}
+
+
+def _decode_body(body):
+    "Reverses :func:`_encode_body`"
+    if 'base64' in body:
+        return base64.b64decode(body['base64'])
+    return body['text'].encode('utf8')
+
+
+class ReplayResponse(object):
+    """A response served from memory, with the parts of the interface of
+    :class:`urllib3.response.HTTPResponse` that the client uses."""
+
+    def __init__(self, status, data, headers=None):
+        self.status = status
+        self.data = data
+        self.headers = urllib3.HTTPHeaderDict(headers or {})
+        self._body = io.BytesIO(data)
+
+    def stream(self, amt=2 ** 16):
+        "Yield the body in chunks of up to `amt` bytes"
+        while True:
+            chunk = self._body.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def release_conn(self):
+        pass
+
+    def drain_conn(self):
+        self._body.read()
+
+    def close(self):
+        self._body.close()
+
+
+class RecordingTransport(object):
+    """Records every request made through it, with its response, to the
+    cassette file at `path`. Interactions are appended as they happen, so a
+    cassette can be extended by recording to it again. Use as a context
+    manager, or call :meth:`close` once recording is finished."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf8')
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def wrap(self, pool):
+        """Returns a stand-in for the connection `pool` which records the
+        requests made through it. Called by the client."""
+        return _RecordingPool(self, pool)
+
+    def record(self, method, path, urlopen_kw, response, duration,
+               data=None):
+        """Append one interaction to the cassette. The response body is
+        `data`, if given, rather than ``response.data``."""
+        if data is None:
+            data = response.data
+        interaction = {
+            'request': {
+                'method': method.upper(),
+                'path': path,
+                'fields': {str(name): str(value) for name, value in (
+                    urlopen_kw.get('fields') or {}).items()},
+                'body': request_key(
+                    method, path, body=urlopen_kw.get('body'))[3],
+            },
+            'response': {
+                'status': response.status,
+                'headers': dict(response.headers),
+                'body': _encode_body(data or b''),
+                'duration': round(duration, 6),
+            },
+        }
+        line = json.dumps(interaction, sort_keys=True) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        "Close the cassette file"
+        with self._lock:
+            self._file.close()
+
+
+class _RecordingPool(object):
+    "Passes requests on to a connection pool, recording each one"
+
+    def __init__(self, recorder, pool):
+        self.recorder = recorder
+        self.pool = pool
+
+    def request(self, method, path, **urlopen_kw):
+        started = time.monotonic()
+        response = self.pool.request(method, path, **urlopen_kw)
+        if not urlopen_kw.get('preload_content', True):
+            return _RecordingResponse(
+                self.recorder, method, path, urlopen_kw, response, started)
+        self.recorder.record(
+            method, path, urlopen_kw, response, time.monotonic() - started)
+        return response
+
+
+class _RecordingResponse(object):
+    """Wraps a streamed response, keeping a copy of the body as it is read,
+    and records the interaction once the whole body has been read"""
+
+    def __init__(self, recorder, method, path, urlopen_kw, response,
+                 started):
+        self.recorder = recorder
+        self.method = method
+        self.path = path
+        self.urlopen_kw = urlopen_kw
+        self.response = response
+        self.started = started
+        self._chunks = []
+        self._data = None
+
+    @property
+    def status(self):
+        return self.response.status
+
+    @property
+    def headers(self):
+        return self.response.headers
+
+    @property
+    def data(self):
+        "Read the rest of the body, and return the whole of it"
+        if self._data is None:
+            self._chunks.append(self.response.read())
+            self._finish()
+        return self._data
+
+    def stream(self, amt=2 ** 16):
+        "Yield the body in chunks of up to `amt` bytes, as it is received"
+        for chunk in self.response.stream(amt):
+            self._chunks.append(chunk)
+            yield chunk
+        self._finish()
+
+    def release_conn(self):
+        self.response.release_conn()
+
+    def drain_conn(self):
+        self.data
+        self.response.drain_conn()
+
+    def close(self):
+        self.response.close()
+
+    def _finish(self):
+        "Record the interaction, once the body has been read to the end"
+        if self._data is not None:
+            return
+        self._data = b''.join(self._chunks)
+        self._chunks = None
+        self.recorder.record(
+            self.method, self.path, self.urlopen_kw, self.response,
+            time.monotonic() - self.started, data=self._data)
+
+
+class ReplayTransport(object):
+    """Answers requests from the cassette file at `path` instead of the API.
+
+    Requests are matched on their method, path, fields and body. If the same
+    request was recorded several times, the recorded responses are served in
+    order, and the last one is repeated once they run out. A request that
+    wasn't recorded raises :class:`lib7shifts.exceptions.ReplayMissError`.
+    See the module documentation for `latency`; `speed` divides recorded
+    latencies (eg. 2 replays twice as fast as recorded).
+    """
+
+    def __init__(self, path, latency=None, speed=1.0):
+        self.path = path
+        self.latency = latency
+        self.speed = speed
+        self._interactions = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        with open(path, encoding='utf8') as cassette:
+            for line in cassette:
+                if line.strip():
+                    self.add(json.loads(line))
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._interactions.values())
+
+    def add(self, interaction):
+        "Add an interaction dictionary, in the cassette format, to replay"
+        request = interaction['request']
+        key = request_key(request['method'], request['path'],
+                          request.get('fields'), request.get('body'))
+        with self._lock:
+            self._interactions[key].append(interaction)
+
+    def wrap(self, pool):
+        "Called by the client; the real connection pool is never used"
+        return self
+
+    def request(self, method, path, **urlopen_kw):
+        "Returns the recorded response to a request"
+        key = request_key(method, path, urlopen_kw.get('fields'),
+                          urlopen_kw.get('body'))
+        with self._lock:
+            queue = self._interactions.get(key)
+            if not queue:
+                raise exceptions.ReplayMissError(method.upper(), path)
+            interaction = queue[0]
+            if len(queue) > 1:
+                queue.popleft()
+        delay = self.get_latency(interaction)
+        if delay:
+            time.sleep(delay)
+        response = interaction['response']
+        return ReplayResponse(
+            response['status'], _decode_body(response['body']),
+            response['headers'])
+
+    def get_latency(self, interaction):
+        "Returns the seconds to wait before answering with `interaction`"
+        if self.latency is None:
+            return 0
+        if self.latency == 'recorded':
+            return interaction['response'].get('duration', 0) / self.speed
+        if callable(self.latency):
+            return self.latency(interaction)
+        return self.latency
@@ -20,7 +20,7 @@ def get_user(client, company_id, user_id, **urlopen_kw):
         raise exceptions.EntityNotFoundError('User', user_id)
 
 
-def list_users(client, company_id, **kwargs):
+def list_users(client, company_id, raw=False, lazy=False, **kwargs):
     """Implements the 'List' operation for 7shifts users, returning all the
     users associated with the company you've authenticated with (by default).
 
@@ -34,14 +34,16 @@ def list_users(client, company_id, **kwargs):
     - status: either 'active' or 'inactive'
     - name: filter by full or partial employee name
 
+    Set `raw` to get the API's dictionaries as they are, or `lazy` to get
+    rows that only become :class:`User` objects when used (see
+    :func:`lib7shifts.base.iter_objects`).
+
     Returns a :class:`UserList` object containing :class:`User` objects.
     """
-    if 'limit' not in kwargs:
-        kwargs['limit'] = 200
-    for item in base.page_api_get_results(
-            client, ENDPOINT.format(company_id=company_id),
-            **kwargs):
-        yield User(**item)
+    kwargs.setdefault('default_limit', 200)
+    yield from base.iter_objects(base.page_api_get_results(
+        client, ENDPOINT.format(company_id=company_id), **kwargs),
+        User, raw, lazy)
 
 
 class User(base.APIObject):